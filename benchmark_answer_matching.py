@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Answer Matching
+Compares the shared answer checker (modules/answer_matching.py) with the
+two matchers it replaced: the practice answers_match() and the one nested
+in /student/assignments/<id>/submit.
+
+For each run this script:
+1. Lists the corpus cases (test_answer_matching.py) where the old
+   matchers disagreed with each other or with the new one
+2. Times single comparisons over a mix of realistic answers
+3. Regrades a synthetic class (students x questions) the old way - one
+   matcher call per answer per accepted answer - and with
+   build_answer_key() + grade_many(), and checks the scores agree on
+   the answers both versions handle the same way
+
+Usage:
+    python3 benchmark_answer_matching.py                  # 30 students x 40 questions
+    python3 benchmark_answer_matching.py --students 200 --questions 60 --rounds 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from modules.answer_matching import answers_match, build_answer_key, grade_many
+from test_answer_matching import CORPUS
+
+
+# ============================================================
+# PREVIOUS MATCHERS
+# ============================================================
+# Copied from app.py as they were before the shared module.
+
+def _normalize_numeric_token(text):
+    if not text:
+        return ""
+    t = text.lower().strip()
+    for word in ["percent", "perc", "per cent", "dollars", "dollar", "usd", "the answer is", "answer:", "="]:
+        t = t.replace(word, "")
+    t = t.replace(",", "")
+    for ch in ["%", "$"]:
+        t = t.replace(ch, "")
+    return t.strip()
+
+
+def _try_float(val):
+    if not val:
+        return None
+    try:
+        return float(val)
+    except Exception:
+        return None
+
+
+def legacy_practice_match(user_raw, expected_raw):
+    if user_raw is None or expected_raw is None:
+        return False
+    u_norm = user_raw.strip().lower()
+    e_norm = expected_raw.strip().lower()
+    if u_norm == e_norm and u_norm != "":
+        return True
+    u_num_str = _normalize_numeric_token(user_raw)
+    e_num_str = _normalize_numeric_token(expected_raw)
+    if u_num_str and e_num_str and u_num_str == e_num_str:
+        return True
+    u_num = _try_float(u_num_str)
+    e_num = _try_float(e_num_str)
+    if u_num is not None and e_num is not None and abs(u_num - e_num) < 1e-6:
+        return True
+    u_direct = _try_float(user_raw.strip())
+    e_direct = _try_float(expected_raw.strip())
+    if u_direct is not None and e_direct is not None and abs(u_direct - e_direct) < 1e-6:
+        return True
+    return False
+
+
+def legacy_submit_match(student_answer, expected_answer):
+    if not student_answer or not expected_answer:
+        return False
+    student = str(student_answer).strip().lower()
+    expected = str(expected_answer).strip().lower()
+    if student == expected:
+        return True
+    import re
+    if len(student) == 1 and student.isalpha():
+        if expected.startswith(student + '.') or expected.startswith(student + ' '):
+            return True
+        if expected == student:
+            return True
+    if len(expected) == 1 and expected.isalpha():
+        if student.startswith(expected + '.') or student.startswith(expected + ' '):
+            return True
+    if re.match(r'^[a-z]\.?\s*', expected):
+        expected_without_letter = re.sub(r'^[a-z]\.?\s*', '', expected).strip()
+        if student == expected_without_letter:
+            return True
+    if re.match(r'^[a-z]\.?\s*', student):
+        student_without_letter = re.sub(r'^[a-z]\.?\s*', '', student).strip()
+        if student_without_letter == expected:
+            return True
+    student_clean = re.sub(r'[%$,\s]', '', student)
+    expected_clean = re.sub(r'[%$,\s]', '', expected)
+    if student_clean == expected_clean:
+        return True
+    try:
+        student_num = float(student_clean)
+        expected_num = float(expected_clean)
+        if abs(student_num - expected_num) < 0.01:
+            return True
+        if abs(student_num * 100 - expected_num) < 0.01:
+            return True
+        if abs(student_num - expected_num * 100) < 0.01:
+            return True
+    except (ValueError, TypeError):
+        pass
+    return False
+
+
+def legacy_grade(steps, answers):
+    """The grading loop of the submit route, minus its logging"""
+    correct = gradable = 0
+    for idx, question in enumerate(steps):
+        raw = answers.get(str(idx), "")
+        expected = [e for e in question.get("expected", []) if e and str(e).strip()]
+        if question.get("type") in ("multiple_choice", None) and expected:
+            gradable += 1
+            if any(legacy_submit_match(raw, e) for e in expected):
+                correct += 1
+    return correct, gradable
+
+
+# ============================================================
+# DATA
+# ============================================================
+
+def make_class(students, questions, seed=7):
+    rng = random.Random(seed)
+    steps = []
+    for q in range(questions):
+        kind = q % 4
+        if kind == 0:
+            letter = rng.choice("abcd")
+            steps.append({"type": "multiple_choice", "expected": [f"{letter.upper()}. {rng.randint(1, 99)}"]})
+        elif kind == 1:
+            steps.append({"type": "multiple_choice", "expected": [str(rng.randint(1, 5000))]})
+        elif kind == 2:
+            steps.append({"type": "multiple_choice", "expected": [f"{rng.randint(1, 99)}%"]})
+        else:
+            steps.append({"type": "multiple_choice", "expected": [rng.choice(["photosynthesis", "Paris", "mitochondria"])]})
+
+    answer_sets = []
+    for _ in range(students):
+        answers = {}
+        for idx, step in enumerate(steps):
+            expected = step["expected"][0]
+            roll = rng.random()
+            if roll < 0.6:
+                answers[str(idx)] = expected  # same text
+            elif roll < 0.75:
+                answers[str(idx)] = expected.split(".")[0].lower() if ". " in expected else f"  {expected.upper()} "
+            elif roll < 0.85:
+                answers[str(idx)] = expected.replace("%", "") if "%" in expected else expected
+            else:
+                answers[str(idx)] = str(rng.randint(1, 99))  # wrong (usually)
+        answer_sets.append(answers)
+    return steps, answer_sets
+
+
+# ============================================================
+# BENCHMARK
+# ============================================================
+
+def report_disagreements():
+    print("🔍 Corpus cases where the matchers disagree")
+    rows = 0
+    for student, expected, should_match, category in CORPUS:
+        practice = legacy_practice_match(student, expected)
+        submit = legacy_submit_match(student, expected)
+        new = answers_match(student, expected)
+        if len({practice, submit, new}) > 1 or new != should_match:
+            rows += 1
+            print(f"   {category:<34} {student!r:>14} vs {expected!r:<12} practice={practice!s:<5} submit={submit!s:<5} new={new}")
+    print(f"   {rows} of {len(CORPUS)} cases differ\n")
+
+
+def time_single(rounds):
+    pairs = [(s, e) for s, e, _, _ in CORPUS] * 50
+    results = {}
+    for name, fn in (("practice (old)", legacy_practice_match),
+                     ("submit (old)", legacy_submit_match),
+                     ("shared", answers_match)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for s, e in pairs:
+                fn(s, e)
+        elapsed = time.perf_counter() - start
+        results[name] = elapsed / (rounds * len(pairs)) * 1e6
+    print("⏱️  Single comparison (µs per call)")
+    for name, micros in results.items():
+        print(f"   {name:<16} {micros:7.2f}")
+    print()
+
+
+def time_regrade(students, questions, rounds):
+    steps, answer_sets = make_class(students, questions)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        legacy_scores = [legacy_grade(steps, answers) for answers in answer_sets]
+    legacy_seconds = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        key = build_answer_key(steps)
+        new_scores = [(r.correct, r.gradable) for r in grade_many(key, answer_sets)]
+    new_seconds = (time.perf_counter() - start) / rounds
+
+    differing = sum(1 for old, new in zip(legacy_scores, new_scores) if old != new)
+    answers = students * questions
+    print(f"📚 Regrade {students} students x {questions} questions ({answers} answers)")
+    print(f"   old loop:   {legacy_seconds * 1000:8.2f} ms  ({answers / legacy_seconds:,.0f} answers/s)")
+    print(f"   grade_many: {new_seconds * 1000:8.2f} ms  ({answers / new_seconds:,.0f} answers/s)")
+    print(f"   speedup:    {legacy_seconds / new_seconds:8.1f}x")
+    print(f"   students whose score changed: {differing} (matching rule differences, see above)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the shared answer checker")
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("ANSWER MATCHING BENCHMARK")
+    print("=" * 70 + "\n")
+    report_disagreements()
+    time_single(args.rounds)
+    time_regrade(args.students, args.questions, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Arcade Submit
+Compares the single-transaction submit pipeline (modules/arcade_submit.py)
+with the previous commit-per-step flow of /arcade/submit, on a throwaway
+SQLite database file (so every commit pays for a real fsync).
+
+For each run this script:
+1. Seeds students, the arcade badges and today's daily challenge
+2. Submits the same sequence of games through both flows (separate students)
+3. Checks both flows produced the same results, then prints latency
+   percentiles, commits and queries per submit
+
+Usage:
+    python3 benchmark_arcade_submit.py                 # 300 submits
+    python3 benchmark_arcade_submit.py 1000 --students 20
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date
+
+from flask import Flask
+from sqlalchemy import event
+
+from models import db, ActivityLog, DailyChallenge, GameSession, Student, StudentBadge
+from modules.achievement_helper import log_activity
+from modules.arcade_enhancements import (
+    check_and_award_badges,
+    check_daily_challenge_completion,
+    initialize_badges,
+    update_game_streak,
+)
+from modules.arcade_helper import save_game_session
+from modules.arcade_submit import submit_game
+
+GAMES = ["speed_math", "vocab_builder", "map_master"]
+
+
+# ============================================================
+# PREVIOUS FLOW (one commit per step)
+# ============================================================
+# The database work /arcade/submit did before the pipeline, minus the
+# Flask session bookkeeping.
+
+def legacy_submit(student_id, game_key, difficulty, score, time_seconds, correct, total, game_mode):
+    results = save_game_session(student_id, game_key, difficulty, score, time_seconds, correct, total)
+
+    game_session = GameSession.query.filter_by(student_id=student_id).order_by(GameSession.id.desc()).first()
+    if game_session:
+        game_session.game_mode = game_mode
+        db.session.commit()
+
+    if game_mode != "practice" and game_session:
+        streak = update_game_streak(student_id)
+        results["current_streak"] = streak.current_streak
+        results["longest_streak"] = streak.longest_streak
+
+        newly_earned_badges = check_and_award_badges(student_id, game_session)
+        if newly_earned_badges:
+            results["badges_earned"] = [
+                {"name": b.name, "icon": b.icon, "description": b.description}
+                for b in newly_earned_badges
+            ]
+
+        if check_daily_challenge_completion(student_id, game_session):
+            results["challenge_completed"] = True
+            results["challenge_bonus_xp"] = game_session.xp_earned - results["xp_earned"]
+            results["challenge_bonus_tokens"] = game_session.tokens_earned - results["tokens_earned"]
+    else:
+        results["practice_mode"] = True
+        results["xp_earned"] = 0
+        results["tokens_earned"] = 0
+
+    log_activity(
+        student_id=student_id,
+        activity_type="arcade_game_completed",
+        subject=game_key,
+        description=f"Completed arcade game ({game_mode}) with {correct}/{total} correct",
+        xp_earned=results["xp_earned"]
+    )
+    return results
+
+
+def new_submit(*args):
+    _, results = submit_game(*args)
+    return results
+
+
+# ============================================================
+# BENCHMARK
+# ============================================================
+
+class Counter:
+    def __init__(self, engine):
+        self.queries = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_execute(self, *args):
+        self.queries += 1
+
+    def _on_commit(self, *args):
+        self.commits += 1
+
+
+def make_games(count, seed=7):
+    rng = random.Random(seed)
+    games = []
+    for _ in range(count):
+        total = 10
+        correct = rng.randint(0, total)
+        games.append((
+            rng.choice(GAMES),
+            rng.choice(["easy", "medium", "hard"]),
+            rng.randint(0, 1500),
+            rng.randint(5, 120),
+            correct,
+            total,
+            "practice" if rng.random() < 0.1 else "timed",
+        ))
+    return games
+
+
+def run(label, submit, student_ids, games, counter):
+    latencies = []
+    outputs = []
+    start_queries, start_commits = counter.queries, counter.commits
+
+    for i, (game_key, difficulty, score, time_seconds, correct, total, mode) in enumerate(games):
+        student_id = student_ids[i % len(student_ids)]
+        db.session.expire_all()
+        start = time.perf_counter()
+        result = submit(student_id, game_key, difficulty, score, time_seconds, correct, total, mode)
+        latencies.append((time.perf_counter() - start) * 1000)
+        outputs.append(result)
+
+    n = len(games)
+    latencies.sort()
+    p95 = latencies[int(0.95 * (n - 1))]
+    print(f"   {label:<16} p50 {statistics.median(latencies):>7.2f} ms   p95 {p95:>7.2f} ms   "
+          f"{(counter.commits - start_commits) / n:>4.1f} commits   {(counter.queries - start_queries) / n:>5.1f} queries")
+    return outputs, statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single-transaction vs commit-per-step arcade submit")
+    parser.add_argument("submits", nargs="?", type=int, default=300)
+    parser.add_argument("--students", type=int, default=10)
+    args = parser.parse_args()
+
+    db_file = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_file}"
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        initialize_badges()
+        db.session.add(DailyChallenge(game_key="speed_math", challenge_date=date.today(),
+                                      target_score=800, bonus_xp=100, bonus_tokens=50))
+
+        legacy_students, new_students = [], []
+        for i in range(args.students):
+            for group, prefix in ((legacy_students, "legacy"), (new_students, "pipeline")):
+                student = Student(student_name=f"{prefix} {i}", student_email=f"{prefix}{i}@cozmictest.com")
+                db.session.add(student)
+                group.append(student)
+        db.session.commit()
+        legacy_ids = [s.id for s in legacy_students]
+        new_ids = [s.id for s in new_students]
+
+        games = make_games(args.submits)
+        counter = Counter(db.engine)
+
+        print(f"\n🎮 {args.submits} game submits across {args.students} students (SQLite file)\n")
+        old, old_ms = run("commit-per-step", legacy_submit, legacy_ids, games, counter)
+        new, new_ms = run("single commit", new_submit, new_ids, games, counter)
+
+        assert old == new, "submit results differ"
+        for old_id, new_id in zip(legacy_ids, new_ids):
+            for model in (GameSession, StudentBadge, ActivityLog):
+                assert model.query.filter_by(student_id=old_id).count() == model.query.filter_by(student_id=new_id).count()
+        print(f"\n   ✓ identical results and rows, {old_ms / new_ms:.1f}x faster (p50)\n")
+
+
+if __name__ == "__main__":
+    main()
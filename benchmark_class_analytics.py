@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Class Analytics
+Compares the set-based analytics engine (modules/class_analytics.py) with the
+previous per-student query loops, on a throwaway SQLite database.
+
+For each run this script:
+1. Seeds one teacher with N classes of M students and their assessment results
+2. Runs both implementations for every class (per class, and for all of the
+   teacher's classes at once) and for the teacher's early warnings
+3. Checks the results are identical, then prints timings and query counts
+
+Usage:
+    python3 benchmark_class_analytics.py                    # 6 classes x 30 students
+    python3 benchmark_class_analytics.py 12 35 --repeat 5
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import event
+
+from models import db, ActivityLog, AssessmentResult, Class, Student, Teacher
+from modules.class_analytics import compute_class_analytics, compute_early_warnings, compute_teacher_class_analytics
+
+SUBJECTS = ["num_forge", "atom_sphere", "story_verse", "chrono_core", "ink_haven", None]
+
+
+# ============================================================
+# PREVIOUS IMPLEMENTATIONS (one query per student)
+# ============================================================
+# Copied from modules/teacher_tools.py before the set-based engine, reading
+# score_percent / student_name (the old get_class_analytics read r.score and
+# s.name, which these models don't have).
+
+def legacy_class_analytics(class_id):
+    students = Student.query.filter_by(class_id=class_id).order_by(Student.id).all()
+    summary = {"class_id": class_id, "students": [], "subjects": {}, "flags": []}
+
+    for s in students:
+        results = (
+            AssessmentResult.query.filter_by(student_id=s.id)
+            .order_by(AssessmentResult.created_at.desc(), AssessmentResult.id.desc())
+            .limit(20)
+            .all()
+        )
+        last10 = results[:10]
+        prev10 = results[10:20]
+        scores_last = [r.score_percent for r in last10 if r.score_percent is not None]
+        scores_prev = [r.score_percent for r in prev10 if r.score_percent is not None]
+        avg_last = sum(scores_last) / len(scores_last) if scores_last else 0
+        avg_prev = sum(scores_prev) / len(scores_prev) if scores_prev else 0
+        delta = round(avg_last - avg_prev, 2)
+
+        if avg_last < 60:
+            tier = "struggling"
+        elif avg_last < 85:
+            tier = "on_level"
+        else:
+            tier = "advanced"
+
+        subject_avgs = {}
+        subject_groups = {}
+        for r in last10:
+            subj = r.subject or "unknown"
+            if r.score_percent is None:
+                continue
+            subject_groups.setdefault(subj, []).append(r.score_percent)
+        for subj, arr in subject_groups.items():
+            subject_avgs[subj] = round(sum(arr) / len(arr), 2)
+
+        weak_subjects = [subj for subj, a in subject_avgs.items() if a < 70]
+        suggested_mode = "adaptive" if tier == "on_level" else ("scaffold" if tier == "struggling" else "mastery")
+        name = s.student_name or "Student"
+
+        summary["students"].append({
+            "student_id": s.id,
+            "name": name,
+            "avg": round(avg_last, 2),
+            "prev_avg": round(avg_prev, 2),
+            "delta": delta,
+            "ability": tier,
+            "subjects": subject_avgs,
+            "weak_subjects": weak_subjects,
+            "suggested_mode": suggested_mode,
+        })
+
+        for subj, a in subject_avgs.items():
+            agg = summary["subjects"].setdefault(subj, {"scores": []})
+            agg["scores"].append(a)
+
+        if delta < -10 or len(weak_subjects) >= 2:
+            summary["flags"].append({
+                "student_id": s.id,
+                "name": name,
+                "delta": delta,
+                "weak_subjects": weak_subjects,
+            })
+
+    for subj, agg in summary["subjects"].items():
+        arr = agg.get("scores", [])
+        summary["subjects"][subj] = {"avg": round(sum(arr) / len(arr), 2) if arr else 0, "n": len(arr)}
+
+    return summary
+
+
+def legacy_early_warnings(teacher_id):
+    classes = Class.query.filter_by(teacher_id=teacher_id).order_by(Class.id).all()
+    warnings = {"declining_performance": [], "low_performance": [], "inactive": [],
+                "no_recent_activity": [], "critical": []}
+
+    now = datetime.utcnow()
+    week_ago = now - timedelta(days=7)
+
+    for cls in classes:
+        students = Student.query.filter_by(class_id=cls.id).order_by(Student.id).all()
+
+        for student in students:
+            student_warnings = []
+            results = (
+                AssessmentResult.query.filter_by(student_id=student.id)
+                .order_by(AssessmentResult.created_at.desc(), AssessmentResult.id.desc())
+                .limit(20)
+                .all()
+            )
+            base = {"student_id": student.id, "student_name": student.student_name,
+                    "class_name": cls.class_name, "class_id": cls.id}
+
+            if len(results) >= 10:
+                scores_last = [r.score_percent for r in results[:10] if r.score_percent is not None]
+                scores_prev = [r.score_percent for r in results[10:20] if r.score_percent is not None]
+                if scores_last and scores_prev:
+                    avg_last = sum(scores_last) / len(scores_last)
+                    avg_prev = sum(scores_prev) / len(scores_prev)
+                    delta = avg_last - avg_prev
+                    if delta < -10:
+                        student_warnings.append("declining")
+                        warnings["declining_performance"].append(dict(
+                            base, delta=round(delta, 1), current_avg=round(avg_last, 1),
+                            previous_avg=round(avg_prev, 1)))
+
+            if len(results) >= 5:
+                subject_groups = {}
+                for r in results[:10]:
+                    if r.subject and r.score_percent is not None:
+                        subject_groups.setdefault(r.subject, []).append(r.score_percent)
+                weak_subjects = []
+                for subj, scores in subject_groups.items():
+                    avg = sum(scores) / len(scores)
+                    if avg < 60:
+                        weak_subjects.append({"subject": subj, "avg": round(avg, 1)})
+                if len(weak_subjects) >= 2:
+                    student_warnings.append("low_performance")
+                    warnings["low_performance"].append(dict(
+                        base, weak_subjects=weak_subjects, count=len(weak_subjects)))
+
+            if student.last_login:
+                days_since_login = (now - student.last_login).days
+                if days_since_login >= 7:
+                    student_warnings.append("inactive")
+                    warnings["inactive"].append(dict(
+                        base, days_since_login=days_since_login,
+                        last_login=student.last_login.strftime("%Y-%m-%d")))
+
+            recent_activity = ActivityLog.query.filter(
+                ActivityLog.student_id == student.id,
+                ActivityLog.created_at >= week_ago
+            ).count()
+            if recent_activity == 0 and len(results) > 0:
+                student_warnings.append("no_activity")
+                warnings["no_recent_activity"].append(dict(base, days_inactive=7))
+
+            if len(student_warnings) >= 2:
+                warnings["critical"].append(dict(
+                    base, warning_types=student_warnings, warning_count=len(student_warnings)))
+
+    warnings["total_at_risk"] = len({
+        w["student_id"] for category in ["declining_performance", "low_performance", "inactive", "no_recent_activity"]
+        for w in warnings[category]
+    })
+    return warnings
+
+
+# ============================================================
+# SEED DATA
+# ============================================================
+
+def seed(num_classes, students_per_class, max_results):
+    """One teacher with a spread of strong, weak, declining and inactive students"""
+    rng = random.Random(42)
+    now = datetime.utcnow()
+
+    teacher = Teacher(name="Benchmark Teacher", email="bench@cozmictest.com")
+    db.session.add(teacher)
+    db.session.flush()
+
+    for c in range(num_classes):
+        cls = Class(teacher_id=teacher.id, class_name=f"Class {c + 1}", join_code=f"BENCH{c:03d}")
+        db.session.add(cls)
+        db.session.flush()
+
+        for s in range(students_per_class):
+            student = Student(
+                class_id=cls.id,
+                student_name=f"Student {c + 1}-{s + 1}",
+                student_email=f"bench{c}_{s}@cozmictest.com",
+                last_login=now - timedelta(days=rng.randint(0, 14)) if rng.random() > 0.1 else None,
+            )
+            db.session.add(student)
+            db.session.flush()
+
+            level = rng.uniform(35, 98)
+            trend = rng.uniform(-3, 2)  # points per result, newest first
+            for i in range(rng.randint(0, max_results)):
+                score = None if rng.random() < 0.05 else max(0.0, min(100.0, level + trend * i + rng.uniform(-12, 12)))
+                db.session.add(AssessmentResult(
+                    student_id=student.id,
+                    subject=rng.choice(SUBJECTS),
+                    score_percent=score,
+                    created_at=now - timedelta(hours=i * rng.randint(6, 30)),
+                ))
+
+            if rng.random() < 0.6:
+                db.session.add(ActivityLog(
+                    student_id=student.id,
+                    activity_type="question_answered",
+                    created_at=now - timedelta(days=rng.randint(0, 13)),
+                ))
+
+    db.session.commit()
+    return teacher
+
+
+# ============================================================
+# BENCHMARK
+# ============================================================
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def measure(label, func, counter, repeat):
+    """Run func `repeat` times; returns (result, ms per run, queries per run)"""
+    db.session.expire_all()
+    start_queries = counter.count
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+        db.session.expire_all()
+    elapsed_ms = (time.perf_counter() - start) * 1000 / repeat
+    queries = (counter.count - start_queries) / repeat
+    print(f"   {label:<12} {elapsed_ms:>9.1f} ms   {queries:>6.0f} queries")
+    return result, elapsed_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark set-based vs per-student class analytics")
+    parser.add_argument("classes", nargs="?", type=int, default=6)
+    parser.add_argument("students", nargs="?", type=int, default=30)
+    parser.add_argument("--results", type=int, default=30, help="max assessment results per student")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    db_file = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_file}"
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        teacher = seed(args.classes, args.students, args.results)
+        class_ids = [cls.id for cls in Class.query.filter_by(teacher_id=teacher.id).order_by(Class.id)]
+        counter = QueryCounter(db.engine)
+
+        print(f"\n📊 {args.classes} classes x {args.students} students, "
+              f"{AssessmentResult.query.count()} results ({args.repeat} runs each)")
+
+        print("\n🏫 Class analytics (all classes):")
+        old, old_ms = measure("per-student", lambda: [legacy_class_analytics(c) for c in class_ids], counter, args.repeat)
+        new, new_ms = measure("set-based", lambda: [compute_class_analytics(c) for c in class_ids], counter, args.repeat)
+        assert old == new, "class analytics differ"
+        print(f"   ✓ identical results, {old_ms / new_ms:.1f}x faster")
+        by_teacher, teacher_ms = measure("per-teacher", lambda: compute_teacher_class_analytics(teacher.id), counter, args.repeat)
+        assert [by_teacher[c] for c in class_ids] == old, "per-teacher class analytics differ"
+        print(f"   ✓ identical results, {old_ms / teacher_ms:.1f}x faster")
+
+        print("\n⚠️  Early warnings (whole teacher):")
+        old, old_ms = measure("per-student", lambda: legacy_early_warnings(teacher.id), counter, args.repeat)
+        new, new_ms = measure("set-based", lambda: compute_early_warnings(teacher.id), counter, args.repeat)
+        assert old == new, "early warnings differ"
+        print(f"   ✓ identical results, {old_ms / new_ms:.1f}x faster "
+              f"({new['total_at_risk']} students at risk)\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -243,7 +243,9 @@ def migrate_production_db():
         indices = [
             "CREATE INDEX IF NOT EXISTS idx_game_session_student_id ON game_sessions(student_id)",
             "CREATE INDEX IF NOT EXISTS idx_game_session_game_key ON game_sessions(game_key)",
+            "CREATE INDEX IF NOT EXISTS idx_game_session_student_game ON game_sessions(student_id, game_key)",
             "CREATE INDEX IF NOT EXISTS idx_game_leaderboard_student_id ON game_leaderboards(student_id)",
+            "CREATE INDEX IF NOT EXISTS idx_game_leaderboard_board ON game_leaderboards(game_key, difficulty, high_score)",
             "CREATE INDEX IF NOT EXISTS idx_student_badge_student_id ON student_badges(student_id)",
             "CREATE INDEX IF NOT EXISTS idx_student_powerup_student_id ON student_powerups(student_id)",
             "CREATE INDEX IF NOT EXISTS idx_game_streak_student_id ON game_streaks(student_id)",
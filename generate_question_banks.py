@@ -136,6 +136,64 @@ Return ONLY the JSON array, no other text."""
     return json.loads(response.choices[0].message.content)
 
 
+def generate_vocab_questions(difficulty='medium', count=25):
+    """Generate vocabulary matching questions (used to fill the arcade question pool)"""
+
+    difficulty_params = {
+        'easy': {
+            'grade_level': '3rd-5th grade',
+            'word_complexity': 'simple everyday words'
+        },
+        'medium': {
+            'grade_level': '6th-8th grade',
+            'word_complexity': 'intermediate academic vocabulary'
+        },
+        'hard': {
+            'grade_level': '9th-12th grade',
+            'word_complexity': 'advanced SAT/ACT level vocabulary'
+        }
+    }
+
+    params = difficulty_params.get(difficulty, difficulty_params['medium'])
+
+    prompt = f"""Generate {count} unique vocabulary words for a {params['grade_level']} vocabulary matching game.
+
+REQUIREMENTS:
+1. Words should be {params['word_complexity']}
+2. Each word needs a clear definition (2-4 words, like "showing great courage" or "having strong desire")
+3. Each word needs 3 INCORRECT distractor options that:
+   - Are plausible but wrong
+   - Match the LENGTH and WORD COUNT of the correct definition
+   - Are not obviously wrong
+   - Use similar grammatical structure as correct answer
+
+OUTPUT FORMAT (JSON array):
+[
+  {{
+    "word": "brave",
+    "definition": "showing great courage",
+    "options": ["feeling very scared", "showing great courage", "acting quite silly", "being overly loud"]
+  }},
+  ...
+]
+
+CRITICAL: All 4 options must have similar length (2-4 words each). Do NOT use single-word distractors.
+Make questions educational and age-appropriate. Avoid repetition across words.
+Return ONLY the JSON array, no other text."""
+
+    client = get_client()
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": "You are a vocabulary game generator. Return only valid JSON."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.9  # Higher temperature for variety
+    )
+
+    return json.loads(response.choices[0].message.content)
+
+
 if __name__ == "__main__":
     print("Generating expanded question banks...")
     print("\nThis will take a few minutes and cost approximately $0.50 in API calls.")
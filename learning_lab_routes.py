@@ -87,7 +87,9 @@ def learning_lab_quiz_submit():
         try:
             send_parent_notification(g.user_id, profile)
             send_teacher_notification(g.user_id, profile)
+            db.session.commit()
         except Exception as e:
+            db.session.rollback()
             print(f"Error sending notifications: {e}")
 
         flash("Your Learning Profile has been created! Check out your results below.", "success")
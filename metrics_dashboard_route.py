@@ -8,10 +8,16 @@ that shows real-time performance data.
 
 Access at: https://cozmiclearning-1.onrender.com/metrics
 (Requires admin/owner login for security)
+
+Numbers are merged across all gunicorn workers and read from the
+metric_counters table, so they survive restarts. app.py already calls
+init_metrics_store(app, db) and records per-route latency in an
+after_request hook.
 """
 
 from modules.performance_monitor import (
     get_metrics_summary,
+    get_latency_stats,
     generate_weekly_report,
     check_performance_alerts,
     print_metrics_summary
@@ -33,14 +39,16 @@ def metrics_dashboard():
         flash('Access denied. Admin only.', 'error')
         return redirect(url_for('index'))
 
-    # Get metrics summary
+    # Get metrics summary (merged across workers)
     summary_7day = get_metrics_summary(days=7)
     summary_30day = get_metrics_summary(days=30)
+    latency_today = get_latency_stats(days=1)
     alerts = check_performance_alerts()
 
     return render_template('metrics_dashboard.html',
                          summary_7day=summary_7day,
                          summary_30day=summary_30day,
+                         latency_today=latency_today,
                          alerts=alerts)
 
 
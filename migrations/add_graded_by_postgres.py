@@ -0,0 +1,62 @@
+"""
+Add graded_by column to student_submissions table (PostgreSQL version)
+Records who graded a submission ('auto' or 'teacher') so bulk regrades
+never overwrite a teacher's grade
+"""
+
+import os
+import sys
+
+def migrate():
+    """Add graded_by column to PostgreSQL database"""
+
+    # Import after adding parent directory to path
+    sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+    from app import app, db
+    from sqlalchemy import text
+
+    print("Starting PostgreSQL migration: add graded_by column")
+
+    with app.app_context():
+        try:
+            # Check if column already exists
+            result = db.session.execute(
+                text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name = 'student_submissions'
+                AND column_name = 'graded_by'
+                """)
+            )
+
+            if result.fetchone():
+                print("✅ Column 'graded_by' already exists in student_submissions")
+                return True
+
+            # Add the column (existing rows stay NULL = graded before it was recorded)
+            print("Adding graded_by column...")
+            db.session.execute(
+                text("""
+                ALTER TABLE student_submissions
+                ADD COLUMN graded_by VARCHAR(20)
+                """)
+            )
+
+            db.session.commit()
+            print("✅ Successfully added 'graded_by' column to student_submissions")
+            return True
+
+        except Exception as e:
+            print(f"❌ Migration failed: {e}")
+            db.session.rollback()
+            return False
+
+if __name__ == "__main__":
+    print("Running PostgreSQL migration: Add graded_by column...")
+    success = migrate()
+    if success:
+        print("\n✅ Migration completed successfully!")
+    else:
+        print("\n❌ Migration failed!")
+        sys.exit(1)
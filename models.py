@@ -388,6 +388,7 @@ class StudentSubmission(db.Model):
     points_earned = db.Column(db.Float, nullable=True)
     points_possible = db.Column(db.Float, nullable=True)
     grade_released = db.Column(db.Boolean, default=False)  # Teacher has released grade to student
+    graded_by = db.Column(db.String(20), nullable=True)  # "auto" / "teacher"; NULL = graded before this was recorded
 
     # Answers submitted (JSON of question_id: answer pairs)
     answers_json = db.Column(db.Text, nullable=True)
@@ -420,6 +421,10 @@ class QuestionLog(db.Model):
     Tracks moderation flags, parent notifications, and admin reviews.
     """
     __tablename__ = "question_logs"
+    __table_args__ = (
+        # Covers the moderation stats aggregate (modules/moderation_stats.py)
+        db.Index('idx_question_log_moderation', 'created_at', 'flagged', 'allowed', 'parent_notified', 'severity'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     
@@ -473,6 +478,31 @@ class QuestionLog(db.Model):
     student = db.relationship("Student", backref="question_logs", lazy=True)
 
 
+class ModerationDailyStat(db.Model):
+    """
+    Moderation counters for one completed UTC day, pre-aggregated from
+    question_logs so long reporting periods sum days instead of scanning
+    every log (see modules/moderation_stats.py).
+    """
+    __tablename__ = "moderation_daily_stats"
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, unique=True)
+
+    total = db.Column(db.Integer, nullable=False, default=0)
+    flagged = db.Column(db.Integer, nullable=False, default=0)
+    blocked = db.Column(db.Integer, nullable=False, default=0)  # allowed == False
+    notified = db.Column(db.Integer, nullable=False, default=0)  # parent_notified == True
+    high = db.Column(db.Integer, nullable=False, default=0)
+    medium = db.Column(db.Integer, nullable=False, default=0)
+    low = db.Column(db.Integer, nullable=False, default=0)
+
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ModerationDailyStat {self.day} total={self.total} flagged={self.flagged}>'
+
+
 # ============================================================
 # CHAPTER & LESSON PROGRESS TRACKING
 # ============================================================
@@ -590,6 +620,36 @@ class ChapterQuiz(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+class LessonContentCache(db.Model):
+    """
+    Generated lesson content shared across all students.
+    One row per (subject, grade, topic, chapter, character, content version).
+    """
+    __tablename__ = "lesson_content_cache"
+    __table_args__ = (
+        db.UniqueConstraint('subject', 'grade', 'topic', 'chapter_id', 'character', 'content_version',
+                          name='uix_lesson_content'),
+        db.Index('idx_lesson_cache_expires', 'expires_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Cache key
+    subject = db.Column(db.String(50), nullable=False)
+    grade = db.Column(db.String(10), nullable=False)
+    topic = db.Column(db.String(200), nullable=False)
+    chapter_id = db.Column(db.String(100), nullable=False, default="")  # "" = not opened from a chapter
+    character = db.Column(db.String(50), nullable=False)
+    content_version = db.Column(db.Integer, nullable=False, default=1)  # Bumped when the lesson prompt changes
+
+    # "pending" while one worker generates it, "ready" once lesson_json is filled in
+    status = db.Column(db.String(20), default="pending")
+    lesson_json = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=True)
+
+
 class ChapterBadge(db.Model):
     """
     Achievement badges awarded for completing chapters.
@@ -716,6 +776,9 @@ class ArcadeGame(db.Model):
 class GameSession(db.Model):
     """Individual game play sessions with scores"""
     __tablename__ = "game_sessions"
+    __table_args__ = (
+        db.Index('idx_game_session_student_game', 'student_id', 'game_key'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey("students.id"))
@@ -751,6 +814,9 @@ class GameSession(db.Model):
 class GameLeaderboard(db.Model):
     """High scores and leaderboard tracking"""
     __tablename__ = "game_leaderboards"
+    __table_args__ = (
+        db.Index('idx_game_leaderboard_board', 'game_key', 'difficulty', 'high_score'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey("students.id"))
@@ -1027,6 +1093,33 @@ class GameStreak(db.Model):
     student = db.relationship("Student", backref="game_streak", uselist=False)
 
 
+class ArcadeQuestionPool(db.Model):
+    """
+    Pre-generated arcade questions, filled offline by refill_arcade_question_pool.py.
+    Play-time generators sample from here instead of calling the AI per game.
+    """
+    __tablename__ = "arcade_question_pool"
+    __table_args__ = (
+        db.UniqueConstraint('game_key', 'difficulty', 'question_key', name='uix_pool_question'),
+        db.Index('idx_pool_rotation', 'game_key', 'difficulty', 'times_served', 'last_served_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    game_key = db.Column(db.String(50), nullable=False)
+    difficulty = db.Column(db.String(20), nullable=False)  # easy, medium, hard
+
+    # Dedup identifier (word / question text) + full question payload
+    question_key = db.Column(db.String(255), nullable=False)
+    question_json = db.Column(db.Text, nullable=False)
+
+    # Rotation tracking - least-served questions are handed out first
+    times_served = db.Column(db.Integer, default=0)
+    last_served_at = db.Column(db.DateTime, nullable=True)
+
+    source = db.Column(db.String(20), default="ai_generated")  # ai_generated, static
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 # ============================================================
 # ASYNCHRONOUS MULTIPLAYER MODELS
 # ============================================================
@@ -1538,3 +1631,314 @@ class Admin(db.Model):
         return False
 
 
+
+
+# ============================================================
+# SERVER-SIDE SESSIONS
+# ============================================================
+
+class ServerSession(db.Model):
+    """
+    Server-side session payloads keyed by an opaque session id.
+    The browser cookie only carries the signed id + version (see modules/session_store.py).
+    """
+    __tablename__ = "server_sessions"
+    __table_args__ = (
+        db.Index('idx_server_session_expires', 'expires_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(64), unique=True, nullable=False)
+    version = db.Column(db.String(16), nullable=False)  # Changes on every save
+    data = db.Column(db.Text, nullable=False)  # Tagged JSON, same format as Flask cookies
+
+    expires_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ServerSession {self.session_id[:8]}... expires={self.expires_at}>'
+
+
+# ============================================================
+# QUOTAS + RATE LIMITS
+# ============================================================
+
+class QuotaBucket(db.Model):
+    """
+    Token-bucket state for one quota key (e.g. "study_buddy:42").
+    Shared by every worker; updated with compare-and-swap (see modules/quota_store.py).
+    """
+    __tablename__ = "quota_buckets"
+    __table_args__ = (
+        db.Index('idx_quota_bucket_full_at', 'full_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    bucket_key = db.Column(db.String(200), unique=True, nullable=False)
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)  # Unix time of the last refill
+    full_at = db.Column(db.Float, nullable=False)  # When the bucket is full again (safe to purge)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<QuotaBucket {self.bucket_key} tokens={self.tokens:.2f}>'
+
+
+class PlanLimitSetting(db.Model):
+    """
+    One plan limit (e.g. student/premium/questions_per_day).
+    Seeded from PLAN_LIMITS in app.py; edit a row to change a limit without a deploy.
+    """
+    __tablename__ = "plan_limit_settings"
+    __table_args__ = (
+        db.UniqueConstraint('role', 'plan', 'name', name='uq_plan_limit_setting'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    role = db.Column(db.String(20), nullable=False)  # student / parent / teacher / homeschool
+    plan = db.Column(db.String(20), nullable=False)
+    name = db.Column(db.String(60), nullable=False)
+    value = db.Column(db.Integer, nullable=False)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<PlanLimitSetting {self.role}/{self.plan}/{self.name}={self.value}>'
+
+
+# ============================================================
+# PERFORMANCE METRICS
+# ============================================================
+
+class MetricCounter(db.Model):
+    """
+    One aggregated metric value for a day, summed across every worker
+    (see modules/performance_monitor.py).
+
+    Plain counters use field "count"; latency histograms store "count",
+    "sum" (ms) and one "b<N>" row per bucket.
+    """
+    __tablename__ = "metric_counters"
+    __table_args__ = (
+        db.UniqueConstraint('day', 'name', 'label', 'field', name='uq_metric_counter'),
+        db.Index('idx_metric_counter_day', 'day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    name = db.Column(db.String(40), nullable=False)   # signups, route_latency, cache, ...
+    label = db.Column(db.String(200), nullable=False, default="")  # route, subject, cache name, ...
+    field = db.Column(db.String(20), nullable=False, default="count")
+    value = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<MetricCounter {self.day} {self.name}[{self.label}].{self.field}={self.value}>'
+
+
+# ============================================================
+# STUDENT PERFORMANCE ROLLUPS
+# ============================================================
+
+class StudentPerformanceRollup(db.Model):
+    """
+    Running score totals per student, kept up to date as results are written
+    (see modules/performance_rollup.py), so dashboards don't re-read raw rows.
+
+    One row per (student, source, subject, topic); "*" means "all".
+    source: assessment (AssessmentResult) / assignment (graded StudentSubmission)
+    / arcade (GameSession accuracy, subject = game_key)
+    """
+    __tablename__ = "student_performance_rollups"
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'source', 'subject', 'topic', name='uq_student_performance_rollup'),
+        db.Index('idx_rollup_source_subject', 'source', 'subject'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
+    source = db.Column(db.String(20), nullable=False)
+    subject = db.Column(db.String(50), nullable=False, default="*")
+    topic = db.Column(db.String(200), nullable=False, default="*")
+
+    # All-time totals (unscored results count in results_count only)
+    results_count = db.Column(db.Integer, nullable=False, default=0)
+    scored_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+    # Last 20 scores, newest first (JSON list, null = unscored)
+    recent_scores_json = db.Column(db.Text, nullable=False, default="[]")
+
+    # Windows over recent_scores: 1-10 ("last") and 11-20 ("prev")
+    last_results = db.Column(db.Integer, nullable=False, default=0)
+    last_scored = db.Column(db.Integer, nullable=False, default=0)
+    last_sum = db.Column(db.Float, nullable=False, default=0.0)
+    prev_scored = db.Column(db.Integer, nullable=False, default=0)
+    prev_sum = db.Column(db.Float, nullable=False, default=0.0)
+    trend_delta = db.Column(db.Float, nullable=False, default=0.0)  # last avg - prev avg
+
+    last_result_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StudentPerformanceRollup student={self.student_id} {self.source}/{self.subject}/{self.topic}>'
+
+
+# ============================================================
+# BACKGROUND JOBS
+# ============================================================
+
+class BackgroundJob(db.Model):
+    """
+    A unit of deferred work (e.g. sending an email), run by the job workers
+    in modules/job_queue.py so requests don't wait on slow services.
+
+    status: pending -> running -> done, or back to pending with a later
+    run_after when an attempt fails; "dead" after max_attempts failures
+    (the dead-letter list, retried by hand from /admin/jobs).
+    """
+    __tablename__ = "background_jobs"
+    __table_args__ = (
+        db.Index('idx_background_job_due', 'status', 'run_after'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # email, ...
+    payload_json = db.Column(db.Text, nullable=False, default="{}")
+
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+
+    # Set while a worker runs the job; stale locks are reclaimed
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.id} {self.kind} {self.status} attempts={self.attempts}>'
+
+
+# ============================================================
+# WEEKLY SUMMARY DELIVERIES
+# ============================================================
+
+class WeeklySummaryDelivery(db.Model):
+    """
+    One weekly summary email sent to a parent. The batch sender skips
+    parents that already have a row for the week, so an interrupted run
+    resumes where it stopped (see modules/weekly_summary.py).
+    """
+    __tablename__ = "weekly_summary_deliveries"
+    __table_args__ = (
+        db.UniqueConstraint('parent_id', 'week_start', name='uq_weekly_summary_delivery'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    parent_id = db.Column(db.Integer, db.ForeignKey("parents.id", ondelete="CASCADE"), nullable=False)
+    week_start = db.Column(db.Date, nullable=False)  # Monday
+    sent_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<WeeklySummaryDelivery parent={self.parent_id} week={self.week_start}>'
+
+
+# ============================================================
+# VISUAL AID CACHE
+# ============================================================
+
+class VisualCache(db.Model):
+    """
+    A generated visual aid (ASCII diagram, Mermaid chart or description),
+    stored under a hash of its visual type, grade band and normalized
+    concept text so identical requests reuse it (see modules/visual_cache.py).
+    """
+    __tablename__ = "visual_cache"
+
+    id = db.Column(db.Integer, primary_key=True)
+    content_key = db.Column(db.String(64), nullable=False, unique=True)  # sha256 hex
+
+    visual_type = db.Column(db.String(20), nullable=False)  # ascii / mermaid / description
+    grade_band = db.Column(db.String(20), nullable=False)
+    concept = db.Column(db.String(500), nullable=False)  # normalized prompt, for the admin view
+    content_version = db.Column(db.Integer, nullable=False, default=1)
+    content = db.Column(db.Text, nullable=False)
+
+    hit_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<VisualCache {self.visual_type} {self.grade_band} hits={self.hit_count}>'
+
+
+# ============================================================
+# ADAPTIVE ASSIGNMENT SESSIONS
+# ============================================================
+
+class AdaptiveSession(db.Model):
+    """
+    Routing state of one student working through a dynamic assignment
+    (adaptive / scaffold / gap_fill / mastery). One row per submission,
+    updated in place on every answer (see modules/adaptive_session.py).
+
+    Everything derived from the question pool (difficulty pools, tiers,
+    skills, thresholds) lives in the per-assignment plan, not here.
+    """
+    __tablename__ = "adaptive_sessions"
+
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey("student_submissions.id", ondelete="CASCADE"),
+                              nullable=False, unique=True)
+    mode = db.Column(db.String(20), nullable=False)  # adaptive / scaffold / gap_fill / mastery
+
+    current_question_index = db.Column(db.Integer, nullable=False, default=0)
+    shown_count = db.Column(db.Integer, nullable=False, default=0)
+    target_count = db.Column(db.Integer, nullable=False, default=10)
+
+    # Counters (each mode uses some of them)
+    correct_count = db.Column(db.Integer, nullable=False, default=0)
+    total_answered = db.Column(db.Integer, nullable=False, default=0)
+    consecutive_right = db.Column(db.Integer, nullable=False, default=0)
+    consecutive_wrong = db.Column(db.Integer, nullable=False, default=0)
+    performance_score = db.Column(db.Float, nullable=False, default=0.0)  # adaptive: -1 to +1
+
+    current_tier = db.Column(db.String(20), nullable=True)  # easy/medium/hard, or foundation/challenge/expert
+    unlocked_tiers = db.Column(db.String(100), nullable=True)  # mastery: comma-separated
+    phase = db.Column(db.String(20), nullable=True)  # gap_fill: diagnostic / targeted
+    weak_skills = db.Column(db.String(200), nullable=True)  # gap_fill: comma-separated
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<AdaptiveSession submission={self.submission_id} {self.mode} {self.shown_count}/{self.target_count}>'
+
+
+class AdaptiveAnswer(db.Model):
+    """
+    A question shown in an adaptive session, in the order shown; the
+    answer fields are filled in when the student answers it.
+    """
+    __tablename__ = "adaptive_answers"
+    __table_args__ = (
+        db.UniqueConstraint('session_id', 'question_index', name='uq_adaptive_answer_question'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.Integer, db.ForeignKey("adaptive_sessions.id", ondelete="CASCADE"), nullable=False)
+    position = db.Column(db.Integer, nullable=False)  # 0 = first question shown
+    question_index = db.Column(db.Integer, nullable=False)  # index into the assignment's steps
+
+    answer = db.Column(db.Text, nullable=True)
+    correct = db.Column(db.Boolean, nullable=True)  # null until answered
+    hint_revealed = db.Column(db.Boolean, nullable=False, default=False)  # scaffold progressive hints
+
+    shown_at = db.Column(db.DateTime, default=datetime.utcnow)
+    answered_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<AdaptiveAnswer session={self.session_id} #{self.position} q={self.question_index}>'
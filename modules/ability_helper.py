@@ -1,6 +1,7 @@
 # modules/ability_helper.py
 
-from models import db, Student, AssessmentResult
+from models import db, Student
+from modules.performance_rollup import update_student_ability
 
 
 def recalc_student_ability(student: Student):
@@ -10,33 +11,14 @@ def recalc_student_ability(student: Student):
         - struggling < 60%
         - on_level 60–84%
         - advanced 85%+
+
+    Reads the student's assessment rollup (modules/performance_rollup.py)
+    instead of the raw results.
     """
 
     if not student:
         return None
 
-    results = (
-        AssessmentResult.query
-        .filter_by(student_id=student.id)
-        .order_by(AssessmentResult.timestamp.desc())
-        .limit(10)
-        .all()
-    )
-
-    if not results:
-        student.ability_level = "on_level"
-        db.session.commit()
-        return "on_level"
-
-    avg = sum(r.score_percent or 0 for r in results) / len(results)
-
-    if avg >= 85:
-        tier = "advanced"
-    elif avg < 60:
-        tier = "struggling"
-    else:
-        tier = "on_level"
-
-    student.ability_level = tier
+    tier = update_student_ability(student)
     db.session.commit()
     return tier
@@ -4,7 +4,9 @@ Manages unlocking, tracking, and displaying student achievements
 """
 
 from models import db, Achievement, StudentAchievement, ActivityLog, Student
+from modules.reward_rules import Counters, RuleCatalog, evaluate
 from datetime import datetime
+from sqlalchemy import case, func
 
 
 # ============================================================
@@ -64,12 +66,45 @@ def initialize_achievements():
             db.session.add(achievement)
     
     db.session.commit()
+    achievement_rules.invalidate()
 
 
 # ============================================================
 # UNLOCK & CHECK LOGIC
 # ============================================================
 
+# Achievement definitions cached in process, indexed by category
+achievement_rules = RuleCatalog(Achievement, type_attr="category")
+
+ACHIEVEMENT_CATEGORIES = ("streak", "level", "xp", "milestone", "exploration", "practice")
+
+
+def _activity_counts(student_id):
+    """Questions answered, assignments completed and subjects visited (one query)"""
+    row = db.session.query(
+        func.coalesce(func.sum(case((ActivityLog.activity_type == "question_answered", 1), else_=0)), 0),
+        func.coalesce(func.sum(case((ActivityLog.activity_type == "assignment_completed", 1), else_=0)), 0),
+        func.count(func.distinct(ActivityLog.subject)),
+    ).filter(ActivityLog.student_id == student_id).one()
+
+    return {"milestone": int(row[0]), "practice": int(row[1]), "exploration": int(row[2])}
+
+
+def _achievement_counters(student_id, session_data):
+    """Current value for every achievement category; activity counts load on first use"""
+    def activity():
+        return _activity_counts(student_id)
+
+    return Counters(
+        {
+            "streak": session_data.get("streak", 0),
+            "level": session_data.get("level", 1),
+            "xp": session_data.get("xp", 0),
+        },
+        loaders={"milestone": activity, "exploration": activity, "practice": activity},
+    )
+
+
 def check_and_award_achievements(student_id, session_data):
     """
     Check if student has unlocked new achievements based on current stats
@@ -79,80 +114,31 @@ def check_and_award_achievements(student_id, session_data):
     if not student:
         return []
     
-    newly_unlocked = []
-    
     # Get current student achievements
-    earned_ids = {sa.achievement_id for sa in StudentAchievement.query.filter_by(student_id=student_id).all()}
-    
-    # Get all achievements
-    all_achievements = Achievement.query.all()
-    
-    for achievement in all_achievements:
-        # Skip if already earned
-        if achievement.id in earned_ids:
-            continue
+    earned_ids = {
+        achievement_id for (achievement_id,) in db.session.query(StudentAchievement.achievement_id).filter(
+            StudentAchievement.student_id == student_id
+        )
+    }
+    unearned = [a for a in achievement_rules.rules_for(ACHIEVEMENT_CATEGORIES) if a.id not in earned_ids]
+    
+    # Activity counts are only queried if an unearned achievement needs them
+    newly_unlocked = evaluate(unearned, _achievement_counters(student_id, session_data)) if unearned else []
+    
+    for achievement in newly_unlocked:
+        db.session.add(StudentAchievement(
+            student_id=student_id,
+            achievement_id=achievement.id,
+            earned_at=datetime.utcnow()
+        ))
         
-        # Check if requirements are met
-        earned = False
-        
-        if achievement.category == "streak":
-            if session_data.get("streak", 0) >= achievement.requirement_value:
-                earned = True
-        
-        elif achievement.category == "level":
-            if session_data.get("level", 1) >= achievement.requirement_value:
-                earned = True
-        
-        elif achievement.category == "xp":
-            if session_data.get("xp", 0) >= achievement.requirement_value:
-                earned = True
-        
-        elif achievement.category == "milestone":
-            # Count questions from activity log
-            question_count = ActivityLog.query.filter_by(
-                student_id=student_id,
-                activity_type="question_answered"
-            ).count()
-            if question_count >= achievement.requirement_value:
-                earned = True
-        
-        elif achievement.category == "exploration":
-            # Count unique subjects visited
-            unique_subjects = db.session.query(ActivityLog.subject).filter(
-                ActivityLog.student_id == student_id,
-                ActivityLog.subject.isnot(None)
-            ).distinct().count()
-            if unique_subjects >= achievement.requirement_value:
-                earned = True
-        
-        elif achievement.category == "practice":
-            # Count completed assignments
-            practice_count = ActivityLog.query.filter_by(
-                student_id=student_id,
-                activity_type="assignment_completed"
-            ).count()
-            if practice_count >= achievement.requirement_value:
-                earned = True
-        
-        # Award achievement if earned
-        if earned:
-            student_achievement = StudentAchievement(
-                student_id=student_id,
-                achievement_id=achievement.id,
-                earned_at=datetime.utcnow()
-            )
-            db.session.add(student_achievement)
-            
-            # Log achievement in activity feed
-            activity = ActivityLog(
-                student_id=student_id,
-                activity_type="achievement_earned",
-                description=f"Unlocked: {achievement.name}",
-                xp_earned=50  # Bonus XP for achievements
-            )
-            db.session.add(activity)
-            
-            newly_unlocked.append(achievement)
+        # Log achievement in activity feed
+        db.session.add(ActivityLog(
+            student_id=student_id,
+            activity_type="achievement_earned",
+            description=f"Unlocked: {achievement.name}",
+            xp_earned=50  # Bonus XP for achievements
+        ))
     
     db.session.commit()
     return newly_unlocked
@@ -174,38 +160,19 @@ def get_achievement_progress(student_id, session_data):
     Get progress towards all achievements (for display)
     Returns dict with achievement info and progress percentage
     """
-    student = Student.query.get(student_id)
-    earned_ids = {sa.achievement_id for sa in StudentAchievement.query.filter_by(student_id=student_id).all()}
-    all_achievements = Achievement.query.all()
+    earned_ids = {
+        achievement_id for (achievement_id,) in db.session.query(StudentAchievement.achievement_id).filter(
+            StudentAchievement.student_id == student_id
+        )
+    }
+    counters = _achievement_counters(student_id, session_data)
     
     progress = []
     
-    for achievement in all_achievements:
-        current_value = 0
-        
-        if achievement.category == "streak":
-            current_value = session_data.get("streak", 0)
-        elif achievement.category == "level":
-            current_value = session_data.get("level", 1)
-        elif achievement.category == "xp":
-            current_value = session_data.get("xp", 0)
-        elif achievement.category == "milestone":
-            current_value = ActivityLog.query.filter_by(
-                student_id=student_id,
-                activity_type="question_answered"
-            ).count()
-        elif achievement.category == "exploration":
-            current_value = db.session.query(ActivityLog.subject).filter(
-                ActivityLog.student_id == student_id,
-                ActivityLog.subject.isnot(None)
-            ).distinct().count()
-        elif achievement.category == "practice":
-            current_value = ActivityLog.query.filter_by(
-                student_id=student_id,
-                activity_type="assignment_completed"
-            ).count()
+    for achievement in achievement_rules.all():
+        current_value = counters.get(achievement.category) if achievement.category in counters else 0
         
-        percent = min(100, int((current_value / achievement.requirement_value) * 100)) if achievement.requirement_value > 0 else 0
+        percent = min(100, int((current_value / achievement.requirement_value) * 100)) if achievement.requirement_value else 0
         
         progress.append({
             "achievement": achievement,
@@ -222,7 +189,7 @@ def get_achievement_progress(student_id, session_data):
 # ACTIVITY LOGGING
 # ============================================================
 
-def log_activity(student_id, activity_type, subject=None, description="", xp_earned=0):
+def log_activity(student_id, activity_type, subject=None, description="", xp_earned=0, commit=True):
     """Log student activity for tracking and achievements"""
     activity = ActivityLog(
         student_id=student_id,
@@ -232,7 +199,8 @@ def log_activity(student_id, activity_type, subject=None, description="", xp_ear
         xp_earned=xp_earned
     )
     db.session.add(activity)
-    db.session.commit()
+    if commit:
+        db.session.commit()
 
 
 def get_recent_activities(student_id, limit=10):
@@ -0,0 +1,410 @@
+"""
+Adaptive Assignment Sessions
+============================
+Structured state for dynamic assignments (adaptive, scaffold, gap_fill,
+mastery), so answering a question is a few small row updates instead of
+decoding and re-encoding the question pool and routing state as JSON.
+
+- The question pool is decoded once per assignment and kept in process
+  (get_plan), together with everything routing and grading derive from
+  it: difficulty pools, mastery tiers, gap fill skills, the answer key.
+  A changed preview_json gets a new plan.
+- A student's routing state is one AdaptiveSession row; each question
+  shown is one AdaptiveAnswer row, filled in when it is answered
+- Submissions started before this kept their state in answers_json; it is
+  imported the first time the submission is opened
+- When a session finishes, its answers and state are written to
+  answers_json once, in the shape the grading and review pages read
+
+Usage:
+    plan = get_plan(assignment)
+    adaptive = get_session(submission) or start_session(submission, plan, "mastery")
+    record_answer(adaptive, question_index, answer, correct)
+    show_question(adaptive, next_index)
+    db.session.commit()
+"""
+
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, AdaptiveAnswer, AdaptiveSession
+from modules.answer_matching import build_answer_key
+from modules.practice_helper import estimate_question_difficulty
+
+PLAN_CACHE_MAX_ENTRIES = 500
+
+DYNAMIC_MODES = ("adaptive", "scaffold", "gap_fill", "mastery")
+
+# Teacher settings and their defaults, per mode (from <mode>_config in preview_json)
+MODE_DEFAULTS = {
+    "adaptive": {},
+    "scaffold": {"progressive_hints": True, "adjust_difficulty": True, "wrong_threshold": 2},
+    "gap_fill": {"skills_count": 4, "diagnostic_count": 5, "use_diagnostic": True},
+    "mastery": {"unlock_threshold": 70, "expert_threshold": 85},
+}
+
+
+# ============================================================
+# ASSIGNMENT PLANS (decoded once per assignment)
+# ============================================================
+
+class AssignmentPlan:
+    """
+    The decoded question pool of one assignment and the routing tables
+    built from it. Shared between requests - treat it as read-only (copy a
+    step before changing it).
+    """
+
+    def __init__(self, assignment_id: int, mission: Dict):
+        self.assignment_id = assignment_id
+        self.steps: List[Dict] = mission.get("steps", [])
+        self.configs = {mode: mission.get(f"{mode}_config") for mode in DYNAMIC_MODES}
+
+        # Categorize all questions by difficulty
+        self.question_pool = {"easy": [], "medium": [], "hard": []}
+        for idx, q in enumerate(self.steps):
+            self.question_pool[estimate_question_difficulty(q)].append(idx)
+
+        self.tier_questions = self._mastery_tiers()
+        self.skills, self.diagnostic_questions = self._gap_fill_skills()
+
+        # Normalized accepted answers per question, for grading submissions
+        self.answer_key = build_answer_key(self.steps)
+
+    def setting(self, mode: str, key: str):
+        return (self.configs.get(mode) or {}).get(key, MODE_DEFAULTS[mode][key])
+
+    def target_count(self, mode: str) -> int:
+        return (self.configs.get(mode) or {}).get("student_question_count", 10)
+
+    def _mastery_tiers(self) -> Dict[str, List[int]]:
+        pool = self.question_pool
+        tier_questions = {
+            "foundation": pool["easy"][:5] + pool["medium"][:2],
+            "challenge": pool["medium"][2:12],
+            "expert": pool["hard"][:5]
+        }
+
+        # Fallbacks if tiers are empty
+        count = len(self.steps)
+        if not tier_questions["foundation"]:
+            tier_questions["foundation"] = list(range(min(5, count)))
+        if not tier_questions["challenge"]:
+            start = len(tier_questions["foundation"])
+            tier_questions["challenge"] = list(range(start, min(start + 10, count)))
+        if not tier_questions["expert"]:
+            start = len(tier_questions["foundation"]) + len(tier_questions["challenge"])
+            tier_questions["expert"] = list(range(start, count))
+        return tier_questions
+
+    def _gap_fill_skills(self) -> Tuple[Dict[str, List[int]], List[int]]:
+        # Divide pool into sub-skills (4 skills with ~5 questions each for 20 total)
+        count = len(self.steps)
+        skills_count = max(self.setting("gap_fill", "skills_count") or 1, 1)  # 0 = one skill
+        skill_size = count // skills_count
+        skills = {}
+        for i in range(skills_count):
+            start_idx = i * skill_size
+            end_idx = start_idx + skill_size if i < skills_count - 1 else count
+            skills[f"skill_{i+1}"] = list(range(start_idx, end_idx))
+
+        # Pick diagnostic questions from each skill
+        diagnostic_count = self.setting("gap_fill", "diagnostic_count")
+        diagnostic_questions = []
+        for indices in skills.values():
+            if indices and len(diagnostic_questions) < diagnostic_count:
+                diagnostic_questions.append(indices[0])
+        return skills, diagnostic_questions
+
+
+_plans: "OrderedDict[int, Tuple[int, AssignmentPlan]]" = OrderedDict()
+_plans_lock = threading.Lock()
+
+
+def get_plan(assignment) -> AssignmentPlan:
+    """The assignment's plan, decoded from preview_json on first use (LRU)"""
+    raw = assignment.preview_json or ""
+    fingerprint = zlib.crc32(raw.encode("utf-8"))
+
+    with _plans_lock:
+        cached = _plans.get(assignment.id)
+        if cached and cached[0] == fingerprint:
+            _plans.move_to_end(assignment.id)
+            return cached[1]
+
+    try:
+        mission = json.loads(raw) if raw else {}
+    except Exception as e:
+        print(f"❌ Failed to parse preview_json for assignment {assignment.id}: {e}")
+        mission = {}
+    plan = AssignmentPlan(assignment.id, mission)
+
+    with _plans_lock:
+        _plans[assignment.id] = (fingerprint, plan)
+        _plans.move_to_end(assignment.id)
+        while len(_plans) > PLAN_CACHE_MAX_ENTRIES:
+            _plans.popitem(last=False)
+    return plan
+
+
+# ============================================================
+# SESSIONS
+# ============================================================
+
+def get_session(submission) -> Optional[AdaptiveSession]:
+    return AdaptiveSession.query.filter_by(submission_id=submission.id).first()
+
+
+def delete_sessions(submission_ids) -> None:
+    """
+    Delete the adaptive sessions (and their answers) of these submissions -
+    a list of ids or a SELECT of them. Call before deleting the submissions;
+    the caller commits. SQLite runs without foreign keys, so ON DELETE
+    CASCADE alone would leave them behind for a reused submission id.
+    """
+    session_ids = select(AdaptiveSession.id).where(AdaptiveSession.submission_id.in_(submission_ids))
+    AdaptiveAnswer.query.filter(AdaptiveAnswer.session_id.in_(session_ids)).delete(synchronize_session=False)
+    AdaptiveSession.query.filter(AdaptiveSession.submission_id.in_(submission_ids)).delete(synchronize_session=False)
+
+
+def start_session(submission, plan: AssignmentPlan, mode: str) -> AdaptiveSession:
+    """
+    Create the submission's session (importing state saved in answers_json
+    by older versions, if any) and commit it. If another request created
+    it first, that one is returned.
+    """
+    try:
+        legacy = json.loads(submission.answers_json) if submission.answers_json else {}
+    except Exception:
+        legacy = {}
+    legacy_state = legacy.get(f"{mode}_state") if isinstance(legacy, dict) else None
+
+    try:
+        if legacy_state and legacy_state.get("shown_questions"):
+            adaptive = _import_legacy(submission, plan, mode, legacy_state, legacy.get("answers") or {})
+            print(f"♻️ [{mode.upper()}] Imported saved state for submission {submission.id}")
+        else:
+            adaptive = _new_session(submission, plan, mode)
+        db.session.commit()
+    except IntegrityError:
+        # Another request started this session first
+        db.session.rollback()
+        adaptive = get_session(submission)
+    return adaptive
+
+
+def _new_session(submission, plan: AssignmentPlan, mode: str) -> AdaptiveSession:
+    adaptive = AdaptiveSession(
+        submission_id=submission.id,
+        mode=mode,
+        target_count=plan.target_count(mode),
+        correct_count=0,
+        total_answered=0,
+        consecutive_right=0,
+        consecutive_wrong=0,
+        performance_score=0.0,
+        shown_count=0,
+    )
+    pool = plan.question_pool
+
+    if mode in ("adaptive", "scaffold"):
+        # Start with medium, or easy if no medium
+        adaptive.current_tier = "medium"
+        if pool["medium"]:
+            first = pool["medium"][0]
+        elif pool["easy"]:
+            first = pool["easy"][0]
+            adaptive.current_tier = "easy"
+        else:
+            first = 0
+    elif mode == "gap_fill":
+        adaptive.phase = "diagnostic"
+        adaptive.weak_skills = ""
+        first = plan.diagnostic_questions[0] if plan.diagnostic_questions else 0
+    else:  # mastery
+        adaptive.current_tier = "foundation"
+        adaptive.unlocked_tiers = "foundation"
+        first = plan.tier_questions["foundation"][0] if plan.tier_questions["foundation"] else 0
+
+    db.session.add(adaptive)
+    db.session.flush()
+    show_question(adaptive, first)
+    print(f"🎯 [{mode.upper()}] Started session for submission {submission.id} - "
+          f"pool sizes: E={len(pool['easy'])}, M={len(pool['medium'])}, H={len(pool['hard'])}")
+    return adaptive
+
+
+def _import_legacy(submission, plan: AssignmentPlan, mode: str, state: Dict, answers: Dict) -> AdaptiveSession:
+    """Session rows for a submission whose state was saved as a JSON blob"""
+    hints = {int(k) for k in (state.get("hints_revealed") or {})}
+    diagnostic_results = {int(k): v for k, v in (state.get("diagnostic_results") or {}).items()}
+
+    adaptive = AdaptiveSession(
+        submission_id=submission.id,
+        mode=mode,
+        target_count=state.get("target_count", plan.target_count(mode)),
+        correct_count=state.get("correct_count", 0),
+        total_answered=state.get("total_answered", len(answers)),
+        consecutive_right=state.get("consecutive_right", 0),
+        consecutive_wrong=state.get("consecutive_wrong", 0),
+        performance_score=state.get("performance_score", 0.0),
+        current_tier=state.get("current_tier"),
+        unlocked_tiers=",".join(state.get("unlocked_tiers") or []) or None,
+        phase=state.get("phase"),
+        weak_skills=",".join(state.get("weak_skills") or []),
+        shown_count=0,
+    )
+    db.session.add(adaptive)
+    db.session.flush()
+
+    now = datetime.utcnow()
+    for idx in dict.fromkeys(int(i) for i in state["shown_questions"]):
+        answer = answers.get(str(idx))
+        db.session.add(AdaptiveAnswer(
+            session_id=adaptive.id,
+            position=adaptive.shown_count,
+            question_index=idx,
+            answer=None if answer is None else str(answer),
+            correct=diagnostic_results.get(idx),
+            hint_revealed=idx in hints,
+            answered_at=now if answer is not None else None,
+        ))
+        adaptive.shown_count += 1
+        adaptive.current_question_index = idx
+
+    if state.get("current_question_index") is not None:
+        adaptive.current_question_index = int(state["current_question_index"])
+    return adaptive
+
+
+# ============================================================
+# ANSWERS
+# ============================================================
+
+def record_answer(adaptive: AdaptiveSession, question_index, answer, correct: bool, reveal_hint: bool = False):
+    """Fill in the answer to a shown question and update the session counters"""
+    values = {
+        "answer": None if answer is None else str(answer),
+        "correct": bool(correct),
+        "answered_at": datetime.utcnow(),
+    }
+    if reveal_hint:
+        values["hint_revealed"] = True
+
+    result = db.session.execute(
+        update(AdaptiveAnswer)
+        .where(AdaptiveAnswer.session_id == adaptive.id,
+               AdaptiveAnswer.question_index == int(question_index))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        print(f"⚠️ Answer to question {question_index} that was never shown (session {adaptive.id})")
+
+    adaptive.total_answered += 1
+    if correct:
+        adaptive.correct_count += 1
+
+
+def show_question(adaptive: AdaptiveSession, question_index: int):
+    """Make question_index the current question"""
+    db.session.add(AdaptiveAnswer(
+        session_id=adaptive.id,
+        position=adaptive.shown_count,
+        question_index=question_index,
+        hint_revealed=False,
+    ))
+    adaptive.shown_count += 1
+    adaptive.current_question_index = question_index
+
+
+def shown_questions(adaptive: AdaptiveSession) -> List[int]:
+    """Question indices shown so far, in order"""
+    return [
+        idx for (idx,) in db.session.query(AdaptiveAnswer.question_index)
+        .filter(AdaptiveAnswer.session_id == adaptive.id)
+        .order_by(AdaptiveAnswer.position)
+    ]
+
+
+def first_unshown(indices: Iterable[int], shown) -> Optional[int]:
+    return next((idx for idx in indices if idx not in shown), None)
+
+
+def answered_results(adaptive: AdaptiveSession) -> Dict[int, bool]:
+    """{question_index: correct} for every answered question"""
+    return dict(
+        db.session.query(AdaptiveAnswer.question_index, AdaptiveAnswer.correct)
+        .filter(AdaptiveAnswer.session_id == adaptive.id, AdaptiveAnswer.correct.isnot(None))
+    )
+
+
+# ============================================================
+# SNAPSHOTS (templates, answers_json)
+# ============================================================
+
+def session_snapshot(adaptive: AdaptiveSession, plan: AssignmentPlan) -> Tuple[Dict, Dict[str, str]]:
+    """
+    (state, answers) in the shape answers_json used to hold them:
+    state is the "<mode>_state" dict, answers maps str(question_index)
+    to the answer given.
+    """
+    rows = (
+        AdaptiveAnswer.query.filter_by(session_id=adaptive.id)
+        .order_by(AdaptiveAnswer.position)
+        .all()
+    )
+    answers = {str(row.question_index): row.answer for row in rows if row.answer is not None}
+
+    state = {
+        "shown_questions": [row.question_index for row in rows],
+        "target_count": adaptive.target_count,
+        "current_question_index": adaptive.current_question_index,
+    }
+    mode = adaptive.mode
+    if mode == "adaptive":
+        state.update(question_pool=plan.question_pool, performance_score=adaptive.performance_score)
+    elif mode == "scaffold":
+        state.update(
+            question_pool=plan.question_pool,
+            consecutive_wrong=adaptive.consecutive_wrong,
+            consecutive_right=adaptive.consecutive_right,
+            current_tier=adaptive.current_tier,
+            hints_revealed={row.question_index: True for row in rows if row.hint_revealed},
+            **{key: plan.setting(mode, key) for key in MODE_DEFAULTS[mode]},
+        )
+    elif mode == "gap_fill":
+        diagnostic = set(plan.diagnostic_questions)
+        state.update(
+            phase=adaptive.phase,
+            skills=plan.skills,
+            diagnostic_questions=plan.diagnostic_questions,
+            diagnostic_results={row.question_index: row.correct for row in rows
+                                if row.correct is not None and row.question_index in diagnostic},
+            weak_skills=[s for s in (adaptive.weak_skills or "").split(",") if s],
+            use_diagnostic=plan.setting(mode, "use_diagnostic"),
+        )
+    elif mode == "mastery":
+        state.update(
+            current_tier=adaptive.current_tier,
+            unlocked_tiers=(adaptive.unlocked_tiers or "foundation").split(","),
+            tier_questions=plan.tier_questions,
+            correct_count=adaptive.correct_count,
+            total_answered=adaptive.total_answered,
+            **{key: plan.setting(mode, key) for key in MODE_DEFAULTS[mode]},
+        )
+    return state, answers
+
+
+def finish_session(submission, adaptive: AdaptiveSession, plan: AssignmentPlan):
+    """Write the finished session to answers_json (once) and commit"""
+    state, answers = session_snapshot(adaptive, plan)
+    submission.answers_json = json.dumps({"answers": answers, f"{adaptive.mode}_state": state})
+    db.session.commit()
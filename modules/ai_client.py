@@ -1,21 +1,16 @@
 # modules/ai_client.py
 
-import os
-from openai import OpenAI
+from modules.ai_gateway import chat_text, get_shared_client
 
-# Load OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Shared OpenAI client (pooled connections, see modules/ai_gateway.py)
+client = get_shared_client()
 
 def ask_ai(prompt: str, model: str = "gpt-4o-mini") -> str:
     """
     Sends a simple prompt to OpenAI and returns plain text output.
     Uses the Chat Completions API.
     """
-    response = client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.choices[0].message.content
+    return chat_text([{"role": "user", "content": prompt}], model=model)
 
 
 def get_completion(user_prompt: str, system_prompt: str = "", model: str = "gpt-4o-mini") -> str:
@@ -38,10 +33,5 @@ def get_completion(user_prompt: str, system_prompt: str = "", model: str = "gpt-
 
     messages.append({"role": "user", "content": user_prompt})
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages
-    )
-
-    return response.choices[0].message.content
+    return chat_text(messages, model=model)
 
@@ -0,0 +1,342 @@
+"""
+AI Gateway
+==========
+One shared entry point for every OpenAI call the app makes.
+
+- A single client per worker process, so all threads reuse one pooled
+  set of keep-alive HTTP connections instead of opening a client per call
+- Per-attempt timeouts plus an overall time budget per call; retries back
+  off with jitter but never sleep past the budget
+- Identical in-flight requests (same model, messages and params) are
+  coalesced: the first caller hits the API, the rest share its response
+- Thread-pool and asyncio helpers for fanning out many calls at once
+
+Usage:
+    from modules.ai_gateway import chat_completion, map_chat
+
+    response = chat_completion(messages, model="gpt-4o-mini", budget=30)
+    responses = map_chat([{"messages": m1}, {"messages": m2}])
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import openai
+
+try:
+    import httpx
+except ImportError:  # openai bundles its own transport - fall back to its default pool
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# GATEWAY CONFIGURATION
+# ============================================================
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Seconds allowed for one HTTP attempt / for all attempts of one call
+DEFAULT_TIMEOUT = float(os.getenv("AI_TIMEOUT_SECONDS", "60"))
+DEFAULT_BUDGET = float(os.getenv("AI_BUDGET_SECONDS", "90"))
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Connection pool shared by every thread in the worker
+MAX_CONNECTIONS = int(os.getenv("AI_MAX_CONNECTIONS", "32"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("AI_MAX_KEEPALIVE_CONNECTIONS", "16"))
+
+# Threads used by submit_chat / map_chat / the asyncio helpers
+FANOUT_WORKERS = int(os.getenv("AI_FANOUT_WORKERS", "8"))
+
+BACKOFF_BASE_SECONDS = 0.5
+RATE_LIMIT_BACKOFF_SECONDS = 2.0
+
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+_client = None
+_client_lock = threading.Lock()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Coalescing: request key -> Future shared by every identical caller
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+_stats = {"calls": 0, "api_requests": 0, "coalesced": 0, "retries": 0, "failures": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+# ============================================================
+# SHARED CLIENT
+# ============================================================
+
+def get_shared_client():
+    """
+    Return the process-wide OpenAI client (created on first use).
+
+    The client is thread-safe; its httpx pool keeps connections to the API
+    warm across requests. It keeps openai's own retry behaviour so code that
+    calls it directly works as before - chat_completion() uses a no-retry
+    copy and applies its own budgeted retries instead.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                options = {"api_key": os.getenv("OPENAI_API_KEY"), "timeout": DEFAULT_TIMEOUT}
+                if httpx is not None:
+                    options["http_client"] = openai.DefaultHttpxClient(
+                        limits=httpx.Limits(
+                            max_connections=MAX_CONNECTIONS,
+                            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                        ),
+                        timeout=DEFAULT_TIMEOUT,
+                    )
+                _client = openai.OpenAI(**options)
+    return _client
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="ai-gateway")
+    return _executor
+
+
+# ============================================================
+# BUDGETED RETRIES
+# ============================================================
+
+def is_retryable(error):
+    """True for timeouts, connection drops, rate limits and 5xx errors"""
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+
+    # Non-openai callables (see resilient_api_call) - best effort on the message
+    error_str = str(error).lower()
+    return any(marker in error_str for marker in (
+        "timeout", "timed out", "connection", "rate limit", "429", "500", "502", "503"
+    ))
+
+
+def _backoff_seconds(error, attempt):
+    """Jittered exponential backoff; rate limits back off harder"""
+    is_rate_limit = isinstance(error, openai.RateLimitError) or "429" in str(error) or "rate limit" in str(error).lower()
+    base = RATE_LIMIT_BACKOFF_SECONDS if is_rate_limit else BACKOFF_BASE_SECONDS
+    return base * (2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def call_with_budget(func, *args, budget=DEFAULT_BUDGET, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                     attempt_timeout=None, **kwargs):
+    """
+    Call func(*args, **kwargs), retrying retryable errors until the time
+    budget (seconds, across all attempts) or max_attempts runs out.
+
+    If attempt_timeout is given, each attempt is passed
+    timeout=min(attempt_timeout, remaining budget).
+
+    Raises the last error when every attempt fails.
+    """
+    deadline = time.monotonic() + budget
+    attempt = 0
+
+    while True:
+        if attempt_timeout is not None:
+            kwargs["timeout"] = max(0.1, min(attempt_timeout, deadline - time.monotonic()))
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            attempt += 1
+            wait = _backoff_seconds(e, attempt - 1)
+            remaining = deadline - time.monotonic()
+
+            if not is_retryable(e) or attempt >= max_attempts or wait >= remaining:
+                logger.error(f"AI call failed after {attempt} attempt(s): {e}")
+                raise
+
+            _count("retries")
+            logger.warning(f"AI call failed (attempt {attempt}/{max_attempts}), retrying in {wait:.1f}s: {e}")
+            time.sleep(wait)
+
+
+# ============================================================
+# CHAT COMPLETIONS
+# ============================================================
+
+def _request_key(model, messages, params):
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _create_completion(model, messages, timeout, budget, params):
+    client = get_shared_client().with_options(max_retries=0)
+    _count("api_requests")
+    return call_with_budget(
+        client.chat.completions.create,
+        model=model,
+        messages=messages,
+        budget=budget,
+        attempt_timeout=timeout,
+        **params
+    )
+
+
+def chat_completion(messages, model=DEFAULT_MODEL, timeout=None, budget=None, coalesce=True, **params):
+    """
+    Create a chat completion through the shared client.
+
+    Args:
+        messages: Chat messages list
+        model: OpenAI model name
+        timeout: Seconds allowed per HTTP attempt (default AI_TIMEOUT_SECONDS)
+        budget: Seconds allowed across all attempts (default AI_BUDGET_SECONDS)
+        coalesce: Share the response with identical requests already in flight
+        **params: Extra create() arguments (temperature, max_tokens, ...)
+
+    Returns:
+        The openai ChatCompletion response. Coalesced callers receive the
+        same object, so treat it as read-only.
+    """
+    timeout = timeout or DEFAULT_TIMEOUT
+    budget = budget or DEFAULT_BUDGET
+    _count("calls")
+
+    if not coalesce or params.get("stream"):
+        return _create_completion(model, messages, timeout, budget, params)
+
+    key = _request_key(model, messages, params)
+    with _inflight_lock:
+        future = _inflight.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _inflight[key] = future
+
+    if not is_leader:
+        _count("coalesced")
+        return future.result(timeout=budget)
+
+    try:
+        response = _create_completion(model, messages, timeout, budget, params)
+        future.set_result(response)
+        return response
+    except Exception as e:
+        _count("failures")
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def chat_text(messages, model=DEFAULT_MODEL, **kwargs):
+    """chat_completion() returning just the first choice's text"""
+    return chat_completion(messages, model=model, **kwargs).choices[0].message.content
+
+
+def stream_chat(messages, model=DEFAULT_MODEL, timeout=None, budget=None, **params):
+    """
+    Stream a chat completion, yielding text deltas as they arrive.
+
+    Opening the stream is retried within the budget like chat_completion();
+    an error after tokens have been yielded is raised to the caller.
+    Streams are never coalesced.
+    """
+    client = get_shared_client().with_options(max_retries=0)
+    _count("calls")
+    _count("api_requests")
+
+    stream = call_with_budget(
+        client.chat.completions.create,
+        model=model,
+        messages=messages,
+        stream=True,
+        budget=budget or DEFAULT_BUDGET,
+        attempt_timeout=timeout or DEFAULT_TIMEOUT,
+        **params
+    )
+
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+# ============================================================
+# FAN-OUT
+# ============================================================
+
+def submit_task(func, *args, **kwargs):
+    """Run any AI-bound callable (e.g. a subject helper) on the gateway thread pool"""
+    return _get_executor().submit(func, *args, **kwargs)
+
+
+def submit_chat(messages, **kwargs):
+    """Run chat_completion() on the gateway thread pool. Returns a Future."""
+    return submit_task(chat_completion, messages, **kwargs)
+
+
+def map_chat(requests, return_exceptions=False):
+    """
+    Run many chat completions concurrently.
+
+    Args:
+        requests: list of chat_completion() keyword dicts, each with "messages"
+        return_exceptions: put errors in the result list instead of raising
+
+    Returns:
+        Responses in the same order as requests
+    """
+    futures = [submit_chat(**request) for request in requests]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results.append(e)
+    return results
+
+
+async def achat_completion(messages, **kwargs):
+    """asyncio version of chat_completion() (runs on the gateway thread pool)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), lambda: chat_completion(messages, **kwargs))
+
+
+async def agather_chat(requests, return_exceptions=False):
+    """asyncio version of map_chat()"""
+    return await asyncio.gather(
+        *[achat_completion(**request) for request in requests],
+        return_exceptions=return_exceptions
+    )
+
+
+def get_gateway_stats():
+    """Counters for the performance dashboard"""
+    with _stats_lock:
+        stats = dict(_stats)
+    with _inflight_lock:
+        stats["in_flight"] = len(_inflight)
+    return stats
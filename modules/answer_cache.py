@@ -0,0 +1,290 @@
+"""
+Answer Cache
+============
+In-process cache of subject answers, so students asking the same (or
+nearly the same) question don't each pay for a full AI call.
+
+- Keyed by normalized question text + subject, grade band, character and
+  whether the explicit Christian section was requested
+- Near-duplicate matching with MinHash over word shingles, bucketed with
+  LSH bands so a lookup only compares against a handful of candidates,
+  which are scored by exact shingle Jaccard.
+  A near hit needs exactly the same content words - only word order,
+  punctuation and filler words may differ - so "photosynthesis" never
+  reuses "cellular respiration". Numbers and operators must match in
+  order ("what is 12 x 13" never reuses "12 x 14", "2+3" never "2-3").
+- LRU + TTL eviction
+- Personalized questions (mentions of "my ...", contact details, pasted
+  homework) and flagged content are never cached
+
+Hit/miss counts are reported to modules/performance_monitor.py.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from modules.performance_monitor import track_event
+from modules.shared_ai import is_christian_question
+
+
+# ============================================================
+# CACHE CONFIGURATION
+# ============================================================
+
+ANSWER_CACHE_MAX_ENTRIES = 5000
+ANSWER_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# Shingle Jaccard similarity needed to reuse an answer with the same
+# content words (keeps "does a cause b" apart from "does b cause a")
+NEAR_DUPLICATE_THRESHOLD = 0.85
+
+# MinHash signature = NUM_BANDS * ROWS_PER_BAND hash values
+NUM_BANDS = 16
+ROWS_PER_BAND = 4
+
+# Longer questions are usually pasted homework - too specific to share
+MAX_CACHEABLE_QUESTION_LENGTH = 300
+
+FILLER_WORDS = {
+    "please", "pls", "plz", "can", "could", "would", "you", "u", "tell", "me",
+    "explain", "a", "an", "the", "hey", "hi", "um", "uh", "so", "just",
+    "is", "are", "s",  # "what's" -> "what s"
+}
+
+PERSONAL_PATTERN = re.compile(
+    r"\b(my|mine|our|ours|myself)\b"       # "my teacher said...", "our project"
+    r"|[\w.+-]+@[\w-]+\.[\w.]+"            # email addresses
+    r"|\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b",  # phone numbers
+    re.IGNORECASE
+)
+
+# Operators are tokens of their own, so "2+3", "2-3" and "2*3" stay distinct
+_TOKEN_PATTERN = re.compile(r"\d+(?:\.\d+)?|[a-z0-9]+|[+\-*/^=<>%×÷]")
+_MATH_PATTERN = re.compile(r"\d+(?:\.\d+)?|[+\-*/^=<>%×÷]")
+
+
+# ============================================================
+# NORMALIZATION + SIGNATURES
+# ============================================================
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation (but not operators) and filler words, collapse whitespace"""
+    tokens = _TOKEN_PATTERN.findall((question or "").lower())
+    return " ".join(t for t in tokens if t not in FILLER_WORDS)
+
+
+def grade_band(grade) -> str:
+    """Grades that get the same depth instruction (see shared_ai.grade_depth_instruction)"""
+    try:
+        g = int(grade)
+    except (TypeError, ValueError):
+        g = 8
+
+    if g <= 3:
+        return "1-3"
+    if g <= 5:
+        return "4-5"
+    if g <= 8:
+        return "6-8"
+    if g <= 10:
+        return "9-10"
+    if g <= 12:
+        return "11-12"
+    return "college"
+
+
+def is_cacheable_question(question: str) -> bool:
+    """False for personalized or very long questions"""
+    if not question or len(question) > MAX_CACHEABLE_QUESTION_LENGTH:
+        return False
+    return not PERSONAL_PATTERN.search(question)
+
+
+def _shingles(normalized: str) -> set:
+    """Word unigrams + bigrams (questions are short, so both matter)"""
+    words = normalized.split()
+    shingles = set(words)
+    shingles.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return shingles
+
+
+def _minhash(shingles: set) -> tuple:
+    """MinHash signature using seeded blake2b (stable across processes)"""
+    signature = []
+    for seed in range(NUM_BANDS * ROWS_PER_BAND):
+        salt = seed.to_bytes(8, "little")
+        signature.append(min(
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8, salt=salt).digest(), "little")
+            for s in shingles
+        ))
+    return tuple(signature)
+
+
+def _bands(signature: tuple) -> list:
+    return [
+        (band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+        for band in range(NUM_BANDS)
+    ]
+
+
+def _similarity(shingles_a: set, shingles_b: set) -> float:
+    """Exact Jaccard similarity (MinHash only picks the candidates)"""
+    return len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+
+
+# ============================================================
+# CACHE
+# ============================================================
+
+class AnswerCache:
+    """
+    Thread-safe LRU + TTL cache with exact and near-duplicate lookup.
+
+    Entries live in partitions (subject, grade band, character, christian
+    flag); near-duplicate matching only happens inside a partition.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl_seconds=ANSWER_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # exact key -> entry dict
+        self._buckets = {}             # (partition, band, rows) -> set of exact keys
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _partition(subject, grade, character, question):
+        return (subject, grade_band(grade), character, is_christian_question(question))
+
+    def get(self, subject, grade, character, question):
+        """
+        Return (result, match) where match is "exact" or "near",
+        or (None, None) on a miss.
+        """
+        normalized = normalize_question(question)
+        if not normalized:
+            return None, None
+
+        partition = self._partition(subject, grade, character, question)
+        key = partition + (normalized,)
+        shingles = _shingles(normalized)
+        signature = _minhash(shingles)
+        words = frozenset(normalized.split())
+        math = _MATH_PATTERN.findall(normalized)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["expires_at"] > now:
+                self._entries.move_to_end(key)
+                return entry["result"], "exact"
+            if entry:
+                self._remove(key)
+
+            candidates = set()
+            for band, rows in _bands(signature):
+                candidates.update(self._buckets.get((partition, band, rows), ()))
+
+            best_key, best_score = None, 0.0
+            for candidate_key in candidates:
+                candidate = self._entries.get(candidate_key)
+                if not candidate or candidate["expires_at"] <= now:
+                    continue
+                if candidate["words"] != words or candidate["math"] != math:
+                    continue
+                score = _similarity(shingles, candidate["shingles"])
+                if score > best_score:
+                    best_key, best_score = candidate_key, score
+
+            if best_key is not None and best_score >= NEAR_DUPLICATE_THRESHOLD:
+                self._entries.move_to_end(best_key)
+                return self._entries[best_key]["result"], "near"
+
+        return None, None
+
+    def put(self, subject, grade, character, question, result):
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+
+        partition = self._partition(subject, grade, character, question)
+        key = partition + (normalized,)
+        shingles = _shingles(normalized)
+        signature = _minhash(shingles)
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = {
+                "result": result,
+                "signature": signature,
+                "shingles": shingles,
+                "words": frozenset(normalized.split()),
+                "math": _MATH_PATTERN.findall(normalized),
+                "partition": partition,
+                "expires_at": time.monotonic() + self.ttl_seconds,
+            }
+            for band, rows in _bands(signature):
+                self._buckets.setdefault((partition, band, rows), set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        """Drop an entry and its LSH bucket references (caller holds the lock)"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band, rows in _bands(entry["signature"]):
+            bucket_key = (entry["partition"], band, rows)
+            bucket = self._buckets.get(bucket_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[bucket_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+_cache = AnswerCache()
+
+
+# ============================================================
+# PUBLIC API
+# ============================================================
+
+def get_cached_answer(subject, grade, character, question):
+    """
+    Cached helper result for this question, or None.
+    Personalized questions always miss (and count as bypassed).
+    """
+    if not is_cacheable_question(question):
+        track_event("cache", cache="answer", outcome="bypass")
+        return None
+
+    result, match = _cache.get(subject, grade, character, question)
+    if result is None:
+        track_event("cache", cache="answer", outcome="miss")
+        return None
+
+    track_event("cache", cache="answer", outcome="near_hit" if match == "near" else "hit")
+    return result
+
+
+def cache_answer(subject, grade, character, question, result, flagged=False):
+    """Store a helper result unless the question is flagged or personalized"""
+    if flagged or not result or not is_cacheable_question(question):
+        return
+    _cache.put(subject, grade, character, question, result)
+
+
+def clear_answer_cache():
+    _cache.clear()
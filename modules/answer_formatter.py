@@ -132,3 +132,44 @@ def format_answer(
 
 
 
+
+
+class IncrementalSectionParser:
+    """
+    Runs parse_into_sections over a streaming answer.
+
+    feed() takes each text chunk and returns the section updates since the
+    last call, as a list of {"section": key, "delta": text} (text appended
+    to that section) or {"section": key, "text": text} (section replaced).
+    Only complete lines are parsed, so a half-received SECTION label is
+    never mistaken for content. Call finish() after the last chunk.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._sent = {}
+
+    def feed(self, chunk: str) -> list:
+        self.text += chunk
+        complete = self.text[:self.text.rfind("\n") + 1]
+
+        # Until the first label arrives we can't tell which section text belongs to
+        if not re.search(r"SECTION\s+[1-6]", complete, re.IGNORECASE):
+            return []
+        return self._updates(parse_into_sections(complete))
+
+    def finish(self) -> list:
+        return self._updates(parse_into_sections(self.text))
+
+    def _updates(self, sections: dict) -> list:
+        updates = []
+        for key, content in sections.items():
+            sent = self._sent.get(key, "")
+            if content == sent:
+                continue
+            if content.startswith(sent):
+                updates.append({"section": key, "delta": content[len(sent):]})
+            else:
+                updates.append({"section": key, "text": content})
+            self._sent[key] = content
+        return updates
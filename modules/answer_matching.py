@@ -0,0 +1,307 @@
+"""
+Answer Matching
+===============
+The one answer checker behind every auto-graded path: practice steps,
+assignment submissions, hybrid adaptive MC answers and chapter quizzes.
+
+An answer is normalized once into its parts (MC letter, text, compact
+text, number, unit, percent) with precompiled patterns; normalizations
+are memoized, and an assignment's answer key is built once with its
+question pool (modules/adaptive_session.py), so grading a whole class
+compares prepared values only.
+
+Two answers match when any of these hold:
+- same text, ignoring case and surrounding whitespace
+- MC letters: "b" == "B. 4" == "(b) 4"; "4" == "B. 4"; different
+  letters never match
+- same text ignoring spaces, "$", "%" and thousands separators
+  ("1,000" == "1000", "3x + 2" == "3x+2"), and a leading "answer:" or
+  "the answer is"; spaces between digits are kept ("1 2" != "12")
+- a left-hand side is optional ("x = 5" == "5"), but when both answers
+  have one the variables must agree ("x = 2x+3" != "y = 2x+3")
+- same number: 0.5 == 1/2 == .50, "1 1/2" == 1.5; a decimal rounded to
+  2+ places matches a fraction ("0.33" == "1/3")
+- percent: "25%" == "25 percent" == "25" == "0.25"
+- units: "5 cm" == "5", "5 cm" != "5 m", "3 inches" == "3 inch",
+  "$5" == "5 dollars"
+
+Usage:
+    answers_match(student_answer, expected)
+    key = build_answer_key(steps)
+    results = grade_many(key, [answers_a, answers_b, ...])
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+NUMBER_TOLERANCE = 1e-6
+MIN_ROUNDED_DECIMALS = 2  # "0.33" can stand for 1/3, "0.3" can't
+NORMALIZE_CACHE_SIZE = 50000
+
+_MC_BARE = re.compile(r"^\(?([a-z])[.):]?\)?$")                 # b, b., b), (b)
+_MC_PREFIX = re.compile(r"^(?:\(([a-z])\)|([a-z])[.):])\s*(.+)$")  # b. 4, b) 4, (b) 4
+_FILLER = re.compile(r"^(?:the\s+answer\s+is|answer\s*:)\s*")
+_LHS = re.compile(r"^(?:([a-z])\s*)?=\s*")                     # "x = 5", "= 5"
+_THOUSANDS = re.compile(r"(?<=\d),(?=\d{3}(?!\d))")
+_PERCENT = re.compile(r"\s*(?:%|\bper\s*cent\b|\bperc\b)\s*")
+_CURRENCY = re.compile(r"\$|\b(?:dollars?|usd)\b")
+_SPACES = re.compile(r"\s+")
+_COMPACT_STRIP = re.compile(r"[$%]")
+_COMPACT_SPACES = re.compile(r"(?<!\d)\s+|\s+(?!\d)")          # keeps "1 2" apart from "12"
+_NUMBER = re.compile(
+    r"^(?P<sign>[-+−])?\s*"
+    r"(?:(?P<whole>\d+)\s+(?P<mnum>\d+)\s*/\s*(?P<mden>\d+)"  # mixed number: 1 1/2
+    r"|(?P<fnum>\d+)\s*/\s*(?P<fden>\d+)"                      # fraction: 3/4
+    r"|(?P<dec>\d+\.?\d*|\.\d+))"                              # 2, 2.5, .5
+    r"\s*(?P<unit>[a-zµ°²³][a-zµ°²³ /.]*?)?\.?$"
+)
+
+
+# ============================================================
+# NORMALIZATION
+# ============================================================
+
+class NormalizedAnswer(NamedTuple):
+    text: str                 # lowercased, whitespace collapsed
+    letter: Optional[str]     # MC letter, if the answer is or starts with one
+    body: str                 # text without the MC letter prefix
+    compact: str              # body without filler, left-hand side, $, %, thousands separators
+                              # and spaces (except between digits)
+    lhs: Optional[str]        # variable of a leading "x =", if any
+    number: Optional[float]
+    decimals: Optional[int]   # digits after the decimal point, None for fractions
+    is_fraction: bool
+    unit: Optional[str]       # singular; "$" for currency
+    percent: bool
+
+
+def _singular(unit: str) -> str:
+    if len(unit) > 3 and unit.endswith(("ches", "shes", "xes", "sses")):
+        return unit[:-2]
+    if len(unit) > 2 and unit.endswith("s") and not unit.endswith("ss"):
+        return unit[:-1]
+    return unit
+
+
+def _parse_number(text: str):
+    """(value, decimals, is_fraction, unit) or None"""
+    match = _NUMBER.match(text)
+    if not match:
+        return None
+    sign = -1 if match.group("sign") in ("-", "−") else 1
+    if match.group("dec") is not None:
+        raw = match.group("dec")
+        value = float(raw)
+        decimals = len(raw.split(".", 1)[1]) if "." in raw else 0
+        is_fraction = False
+    else:
+        num, den = (match.group("mnum"), match.group("mden")) if match.group("whole") else (match.group("fnum"), match.group("fden"))
+        if int(den) == 0:
+            return None
+        value = int(match.group("whole") or 0) + int(num) / int(den)
+        decimals = None
+        is_fraction = True
+    unit = match.group("unit")
+    unit = _singular(_SPACES.sub(" ", unit).strip(" .")) if unit else None
+    return sign * value, decimals, is_fraction, unit or None
+
+
+def normalize_answer(raw) -> NormalizedAnswer:
+    """Split an answer into the parts answers are compared on (memoized)"""
+    return _normalize("" if raw is None else str(raw))
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _normalize(raw: str) -> NormalizedAnswer:
+    text = _SPACES.sub(" ", raw).strip().lower()
+
+    letter = None
+    body = text
+    bare = _MC_BARE.match(text)
+    if bare:
+        letter, body = bare.group(1), ""
+    else:
+        prefixed = _MC_PREFIX.match(text)
+        if prefixed:
+            letter, body = prefixed.group(1) or prefixed.group(2), prefixed.group(3)
+
+    value = _FILLER.sub("", body, count=1) if len(body) > 1 else body
+    lhs = None
+    equation = _LHS.match(value) if len(value) > 1 else None
+    if equation:
+        lhs, value = equation.group(1), value[equation.end():]
+    value = _THOUSANDS.sub("", value)
+
+    percent = bool(_PERCENT.search(value))
+    if percent:
+        value = _PERCENT.sub(" ", value).strip()
+
+    unit = None
+    if _CURRENCY.search(value):
+        value = _SPACES.sub(" ", _CURRENCY.sub(" ", value)).strip()
+        unit = "$"
+
+    number = decimals = None
+    is_fraction = False
+    parsed = _parse_number(value) if value else None
+    if parsed:
+        number, decimals, is_fraction, parsed_unit = parsed
+        if parsed_unit:
+            unit = parsed_unit if unit is None else unit + " " + parsed_unit
+
+    return NormalizedAnswer(
+        text=text,
+        letter=letter,
+        body=body,
+        compact=_COMPACT_SPACES.sub("", _COMPACT_STRIP.sub("", value)),
+        lhs=lhs,
+        number=number,
+        decimals=decimals,
+        is_fraction=is_fraction,
+        unit=unit,
+        percent=percent,
+    )
+
+
+# ============================================================
+# MATCHING
+# ============================================================
+
+def _same_number(a: NormalizedAnswer, b: NormalizedAnswer, a_value: float, b_value: float) -> bool:
+    if abs(a_value - b_value) < NUMBER_TOLERANCE:
+        return True
+    # A decimal written to 2+ places matches a fraction rounded to that many places
+    for decimal, fraction, d_value, f_value in ((a, b, a_value, b_value), (b, a, b_value, a_value)):
+        if fraction.is_fraction and not decimal.is_fraction and (decimal.decimals or 0) >= MIN_ROUNDED_DECIMALS:
+            if abs(round(f_value, decimal.decimals) - d_value) < NUMBER_TOLERANCE:
+                return True
+    return False
+
+
+def _numbers_match(a: NormalizedAnswer, b: NormalizedAnswer) -> bool:
+    if a.unit and b.unit and a.unit != b.unit:
+        return False
+    if a.percent == b.percent:
+        return _same_number(a, b, a.number, b.number)
+    # One side is a percent: 25% == 25 == 0.25
+    pct, other = (a, b) if a.percent else (b, a)
+    return (_same_number(pct, other, pct.number, other.number)
+            or _same_number(pct, other, pct.number / 100, other.number))
+
+
+def normalized_match(student: NormalizedAnswer, expected: NormalizedAnswer) -> bool:
+    if not student.text or not expected.text:
+        return False
+    if student.text == expected.text:
+        return True
+
+    if student.letter and expected.letter:
+        if student.letter != expected.letter:
+            return False
+        if not student.body or not expected.body:
+            return True  # "b" vs "B. 4"
+    elif (student.letter and not student.body) or (expected.letter and not expected.body):
+        return False  # a bare letter against an unlettered answer
+
+    if student.lhs and expected.lhs and student.lhs != expected.lhs:
+        return False  # "x = 2x+3" vs "y = 2x+3"
+
+    if student.compact and student.compact == expected.compact and student.unit == expected.unit:
+        return True
+    if student.number is not None and expected.number is not None:
+        return _numbers_match(student, expected)
+    return False
+
+
+def answers_match(student_answer, expected_answer) -> bool:
+    """True if the student's answer matches the expected answer"""
+    if student_answer is None or expected_answer is None:
+        return False
+    return normalized_match(normalize_answer(student_answer), normalize_answer(expected_answer))
+
+
+def matches_any(student_answer, expected_answers: Iterable) -> bool:
+    """True if the student's answer matches any of the expected answers"""
+    if student_answer is None:
+        return False
+    student = normalize_answer(student_answer)
+    return any(normalized_match(student, normalize_answer(e)) for e in expected_answers if e is not None)
+
+
+# ============================================================
+# ANSWER KEYS + BULK GRADING
+# ============================================================
+
+def question_answers(question: Dict) -> List:
+    """The accepted answers of a question ("expected", else "correct_answer"), blanks dropped"""
+    expected = question.get("expected", [])
+    if not expected:
+        expected = question.get("correct_answer") or []
+    if not isinstance(expected, list):
+        expected = [expected]
+    return [e for e in expected if e is not None and str(e).strip()]
+
+
+def build_answer_key(steps: Sequence[Dict]) -> List[Optional[tuple]]:
+    """
+    Normalized accepted answers per question, or None for questions that
+    need manual grading (free response, or no answer given).
+    """
+    key = []
+    for question in steps:
+        accepted = question_answers(question)
+        if question.get("type") in ("multiple_choice", None, "") and accepted:
+            key.append(tuple(normalize_answer(e) for e in accepted))
+        else:
+            key.append(None)
+    return key
+
+
+class GradeResult(NamedTuple):
+    correct: int                    # auto-graded questions answered correctly
+    gradable: int                   # questions auto-graded
+    results: List[Optional[bool]]   # per question; None = needs manual grading
+
+
+def grade_answers(answer_key: Sequence[Optional[tuple]], answers: Dict, memo: Dict = None) -> GradeResult:
+    """
+    Grade one set of answers ({"0": "B. 4", ...}) against an answer key.
+    Answers already graded on the way in ({"answer": ..., "correct": ...})
+    keep their stored result. `memo` remembers results per (question,
+    answer) across calls - grade_many shares one between students.
+    """
+    results = []
+    correct = gradable = 0
+    for idx, accepted in enumerate(answer_key):
+        raw = answers.get(str(idx), "")
+        if isinstance(raw, dict) and "correct" in raw:
+            is_correct = bool(raw.get("correct"))
+        elif accepted is None:
+            results.append(None)
+            continue
+        else:
+            if isinstance(raw, dict):
+                raw = raw.get("answer", "")
+            memo_key = (idx, raw) if memo is not None and isinstance(raw, str) else None
+            is_correct = memo.get(memo_key) if memo_key else None
+            if is_correct is None:
+                student = normalize_answer(raw)
+                is_correct = any(normalized_match(student, e) for e in accepted)
+                if memo_key:
+                    memo[memo_key] = is_correct
+
+        results.append(is_correct)
+        gradable += 1
+        correct += is_correct
+    return GradeResult(correct, gradable, results)
+
+
+def grade_many(answer_key: Sequence[Optional[tuple]], answer_sets: Iterable[Dict]) -> List[GradeResult]:
+    """
+    Grade many students' answers to the same assignment in one pass. Each
+    distinct answer to a question is matched once, however many students
+    gave it.
+    """
+    memo = {}
+    return [grade_answers(answer_key, answers, memo) for answers in answer_sets]
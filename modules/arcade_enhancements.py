@@ -14,6 +14,8 @@ from models import (
     db, ArcadeBadge, StudentBadge, PowerUp, StudentPowerUp,
     DailyChallenge, StudentChallengeProgress, GameStreak, GameSession
 )
+from modules.arcade_helper import get_session_totals
+from modules.reward_rules import Counters, RuleCatalog, evaluate
 import random
 
 
@@ -219,6 +221,7 @@ def initialize_badges():
             badge = ArcadeBadge(**badge_data)
             db.session.add(badge)
     db.session.commit()
+    badge_rules.invalidate()
     print(f"✅ Initialized {len(ARCADE_BADGES)} arcade badges")
 
 
@@ -237,65 +240,61 @@ def initialize_powerups():
 # BADGE CHECKING & AWARDING
 # ============================================================
 
-def check_and_award_badges(student_id, game_session):
-    """
-    Check if a game session qualifies for any badges and award them.
-    Returns list of newly earned badges.
-    """
-    newly_earned = []
-
-    # Get all badges
-    all_badges = ArcadeBadge.query.all()
-
-    # Get student's existing badges
-    existing_badge_ids = {sb.badge_id for sb in StudentBadge.query.filter_by(student_id=student_id).all()}
-
-    for badge in all_badges:
-        # Skip if already earned
-        if badge.id in existing_badge_ids:
-            continue
-
-        # Check if badge is game-specific and matches
-        if badge.game_key and badge.game_key != game_session.game_key:
-            continue
+# Badge definitions cached in process, indexed by (requirement_type, game_key)
+badge_rules = RuleCatalog(ArcadeBadge, type_attr="requirement_type")
 
-        earned = False
+BADGE_REQUIREMENTS = ("score", "accuracy", "time", "streak", "total_plays")
 
-        # Check badge requirements
-        if badge.requirement_type == "score":
-            earned = game_session.score >= badge.requirement_value
 
-        elif badge.requirement_type == "accuracy":
-            earned = game_session.accuracy >= badge.requirement_value
-
-        elif badge.requirement_type == "time":
-            # Time badges are for UNDER the requirement (faster is better)
-            earned = game_session.time_seconds <= badge.requirement_value
+def check_and_award_badges(student_id, game_session, commit=True):
+    """
+    Check if a game session qualifies for any badges and award them.
+    Returns list of newly earned badges. Pass commit=False to leave the
+    commit to the caller.
+    """
+    # Only badges for every game or for this game
+    candidates = badge_rules.rules_for(BADGE_REQUIREMENTS, game_key=game_session.game_key)
+    if not candidates:
+        return []
+
+    # Skip badges already earned (one query, candidates only)
+    earned_ids = {
+        badge_id for (badge_id,) in db.session.query(StudentBadge.badge_id).filter(
+            StudentBadge.student_id == student_id,
+            StudentBadge.badge_id.in_([badge.id for badge in candidates])
+        )
+    }
+    unearned = [badge for badge in candidates if badge.id not in earned_ids]
 
-        elif badge.requirement_type == "streak":
-            streak = GameStreak.query.filter_by(student_id=student_id).first()
-            if streak:
-                earned = streak.current_streak >= badge.requirement_value
+    # Streak and play count are only queried if an unearned badge needs them
+    def current_streak():
+        streak = GameStreak.query.filter_by(student_id=student_id).first()
+        return streak.current_streak if streak else None
 
-        elif badge.requirement_type == "total_plays":
-            # Count plays of this specific game
-            total = GameSession.query.filter_by(
-                student_id=student_id,
-                game_key=game_session.game_key
-            ).count()
-            earned = total >= badge.requirement_value
+    def plays_of_this_game():
+        return GameSession.query.filter_by(
+            student_id=student_id,
+            game_key=game_session.game_key
+        ).count()
+
+    counters = Counters(
+        {
+            "score": game_session.score,
+            "accuracy": game_session.accuracy,
+            "time": game_session.time_seconds,  # at most the requirement - faster is better
+        },
+        loaders={"streak": current_streak, "total_plays": plays_of_this_game},
+    )
 
-        # Award the badge
-        if earned:
-            student_badge = StudentBadge(
-                student_id=student_id,
-                badge_id=badge.id,
-                game_key=game_session.game_key
-            )
-            db.session.add(student_badge)
-            newly_earned.append(badge)
+    newly_earned = evaluate(unearned, counters)
+    for badge in newly_earned:
+        db.session.add(StudentBadge(
+            student_id=student_id,
+            badge_id=badge.id,
+            game_key=game_session.game_key
+        ))
 
-    if newly_earned:
+    if newly_earned and commit:
         db.session.commit()
 
     return newly_earned
@@ -305,7 +304,7 @@ def check_and_award_badges(student_id, game_session):
 # STREAK TRACKING
 # ============================================================
 
-def update_game_streak(student_id):
+def update_game_streak(student_id, commit=True):
     """
     Update student's game streak based on today's play.
     Returns the updated streak object.
@@ -341,7 +340,8 @@ def update_game_streak(student_id):
             streak.current_streak = 1
             streak.last_played_date = today
 
-    db.session.commit()
+    if commit:
+        db.session.commit()
     return streak
 
 
@@ -394,7 +394,7 @@ def get_todays_challenge():
     return generate_daily_challenge()
 
 
-def check_daily_challenge_completion(student_id, game_session):
+def check_daily_challenge_completion(student_id, game_session, commit=True):
     """
     Check if a game session completed today's daily challenge.
     Returns True if challenge was completed (and rewards awarded).
@@ -447,7 +447,8 @@ def check_daily_challenge_completion(student_id, game_session):
         game_session.xp_earned += challenge.bonus_xp
         game_session.tokens_earned += challenge.bonus_tokens
 
-        db.session.commit()
+        if commit:
+            db.session.commit()
         return True
 
     else:
@@ -470,7 +471,8 @@ def check_daily_challenge_completion(student_id, game_session):
             if not progress.best_time or game_session.time_seconds < progress.best_time:
                 progress.best_time = game_session.time_seconds
 
-        db.session.commit()
+        if commit:
+            db.session.commit()
         return False
 
 
@@ -574,21 +576,9 @@ def get_student_arcade_stats(student_id):
     Get comprehensive arcade statistics for a student.
     Returns dict with various stats.
     """
-    # Total games played
-    total_games = GameSession.query.filter_by(student_id=student_id).count()
-
-    # Total XP and tokens earned
-    sessions = GameSession.query.filter_by(student_id=student_id).all()
-    total_xp = sum(s.xp_earned for s in sessions)
-    total_tokens = sum(s.tokens_earned for s in sessions)
-
-    # Average accuracy
-    accuracies = [s.accuracy for s in sessions if s.accuracy is not None]
-    avg_accuracy = sum(accuracies) / len(accuracies) if accuracies else 0
-
-    # Best score
-    scores = [s.score for s in sessions if s.score is not None]
-    best_score = max(scores) if scores else 0
+    # Totals, average accuracy and best score (one aggregate query)
+    totals = get_session_totals(student_id)
+    avg_accuracy = totals.accuracy_sum / totals.accuracy_count if totals.accuracy_count else 0
 
     # Current streak
     streak = GameStreak.query.filter_by(student_id=student_id).first()
@@ -605,11 +595,11 @@ def get_student_arcade_stats(student_id):
     ).count()
 
     return {
-        "total_games": total_games,
-        "total_xp": total_xp,
-        "total_tokens": total_tokens,
+        "total_games": totals.plays,
+        "total_xp": totals.total_xp,
+        "total_tokens": totals.total_tokens,
         "avg_accuracy": round(avg_accuracy, 1),
-        "best_score": best_score,
+        "best_score": totals.best_score or 0,
         "current_streak": current_streak,
         "longest_streak": longest_streak,
         "badges_earned": badges_earned,
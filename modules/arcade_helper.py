@@ -12,7 +12,10 @@ UPDATED: December 2024
 import random
 import time
 from datetime import datetime
+from sqlalchemy import case, func
 from models import db, GameSession, GameLeaderboard, ArcadeGame
+from modules.performance_rollup import record_game_session
+from modules.leaderboard import leaderboards
 
 
 # ============================================================
@@ -31,14 +34,10 @@ def reseed_random():
 # QUESTION DEDUPLICATION HELPER
 # ============================================================
 
-def is_duplicate_question(question, seen_questions):
+def get_question_identifier(question):
     """
-    Check if a question is a duplicate.
-    Returns True if duplicate, False if unique.
-
-    Args:
-        question: dict with 'question' field (and optionally 'answer', 'word', etc.)
-        seen_questions: set of question strings seen so far
+    Build the identifier used to spot duplicate questions.
+    Shared by per-game dedup and the persistent question pool.
     """
     # Create a unique identifier for this question
     # For math questions, use the question text
@@ -47,16 +46,28 @@ def is_duplicate_question(question, seen_questions):
 
     if 'word' in question:
         # Vocabulary/spelling question - track by word
-        identifier = question['word'].lower()
+        return question['word'].lower()
     elif 'question' in question:
         # Math or other text-based question - track by question text
-        identifier = str(question['question']).lower().strip()
+        return str(question['question']).lower().strip()
     elif 'symbol' in question:
         # Element match - track by symbol
-        identifier = question['symbol'].upper()
+        return question['symbol'].upper()
     else:
         # Generic fallback - stringify the whole question
-        identifier = str(question)
+        return str(question)
+
+
+def is_duplicate_question(question, seen_questions):
+    """
+    Check if a question is a duplicate.
+    Returns True if duplicate, False if unique.
+
+    Args:
+        question: dict with 'question' field (and optionally 'answer', 'word', etc.)
+        seen_questions: set of question strings seen so far
+    """
+    identifier = get_question_identifier(question)
 
     if identifier in seen_questions:
         return True  # Duplicate found
@@ -593,82 +604,24 @@ VOCAB_SETS = {
 
 def generate_vocab_builder(difficulty='medium'):
     """
-    Generate vocabulary matching game with AI-generated fresh questions.
-    Each time a student plays, they get completely new vocabulary words.
+    Generate vocabulary matching game from the pre-generated question pool.
+    The pool is filled offline by refill_arcade_question_pool.py, so no AI call
+    happens while the student waits for the game to load.
     """
-    from modules.shared_ai import get_client
-
-    # Define difficulty parameters
-    difficulty_params = {
-        'easy': {
-            'grade_level': '3rd-5th grade',
-            'word_complexity': 'simple everyday words',
-            'num_words': 15
-        },
-        'medium': {
-            'grade_level': '6th-8th grade',
-            'word_complexity': 'intermediate academic vocabulary',
-            'num_words': 15
-        },
-        'hard': {
-            'grade_level': '9th-12th grade',
-            'word_complexity': 'advanced SAT/ACT level vocabulary',
-            'num_words': 15
-        }
-    }
-
-    params = difficulty_params.get(difficulty, difficulty_params['medium'])
-
-    prompt = f"""Generate {params['num_words']} unique vocabulary words for a {params['grade_level']} vocabulary matching game.
-
-REQUIREMENTS:
-1. Words should be {params['word_complexity']}
-2. Each word needs a clear definition (2-4 words, like "showing great courage" or "having strong desire")
-3. Each word needs 3 INCORRECT distractor options that:
-   - Are plausible but wrong
-   - Match the LENGTH and WORD COUNT of the correct definition
-   - Are not obviously wrong
-   - Use similar grammatical structure as correct answer
-
-OUTPUT FORMAT (JSON array):
-[
-  {{
-    "word": "brave",
-    "definition": "showing great courage",
-    "options": ["feeling very scared", "showing great courage", "acting quite silly", "being overly loud"]
-  }},
-  ...
-]
-
-CRITICAL: All 4 options must have similar length (2-4 words each). Do NOT use single-word distractors.
-Make questions educational and age-appropriate. Avoid repetition across words.
-Return ONLY the JSON array, no other text."""
+    from modules.arcade_question_pool import draw_pool_questions
 
     try:
-        client = get_client()
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a vocabulary game generator. Return only valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.9  # Higher temperature for variety
-        )
-
-        import json
-        vocab_data = json.loads(response.choices[0].message.content)
-
-        # Shuffle options for each question to prevent position patterns
-        shuffled_vocab = [shuffle_question_options(q) for q in vocab_data]
-        return shuffled_vocab
-
+        pooled = draw_pool_questions("vocab_builder", difficulty, 15)
+        if pooled:
+            return pooled
     except Exception as e:
-        print(f"Error generating vocab with AI: {e}")
-        # Fallback to static questions if AI fails
-        vocab_set = VOCAB_SETS.get(difficulty, VOCAB_SETS["medium"]).copy()
-        random.shuffle(vocab_set)
-        shuffled_vocab = [shuffle_question_options(q) for q in vocab_set[:15]]
-        return shuffled_vocab
+        print(f"Error drawing vocab from question pool: {e}")
+
+    # Fallback to static questions if the pool is empty or unavailable
+    vocab_set = VOCAB_SETS.get(difficulty, VOCAB_SETS["medium"]).copy()
+    random.shuffle(vocab_set)
+    shuffled_vocab = [shuffle_question_options(q) for q in vocab_set[:15]]
+    return shuffled_vocab
 
 
 # ============================================================
@@ -3140,8 +3093,12 @@ def generate_worldview_warriors(difficulty='medium'):
 # GAME SESSION MANAGEMENT - UPDATED FOR DIFFICULTY
 # ============================================================
 
-def save_game_session(student_id, game_key, difficulty, score, time_seconds, correct, total):
-    """Save completed game session and update leaderboard with difficulty"""
+def record_game(student_id, game_key, difficulty, score, time_seconds, correct, total, game_mode="timed"):
+    """
+    Add a completed game session and update the leaderboard entry, without
+    committing (see modules/arcade_submit.py).
+    Returns (game_session, leaderboard, results).
+    """
     accuracy = (correct / total * 100) if total > 0 else 0
 
     # Calculate XP with difficulty multipliers
@@ -3163,6 +3120,7 @@ def save_game_session(student_id, game_key, difficulty, score, time_seconds, cor
         student_id=student_id,
         game_key=game_key,
         difficulty=difficulty,
+        game_mode=game_mode,
         score=score,
         time_seconds=time_seconds,
         accuracy=accuracy,
@@ -3173,6 +3131,7 @@ def save_game_session(student_id, game_key, difficulty, score, time_seconds, cor
         completed_at=datetime.utcnow()
     )
     db.session.add(session)
+    record_game_session(session)
 
     # Update or create leaderboard entry
     leaderboard = GameLeaderboard.query.filter_by(
@@ -3180,6 +3139,7 @@ def save_game_session(student_id, game_key, difficulty, score, time_seconds, cor
         game_key=game_key,
         difficulty=difficulty
     ).first()
+    new_high_score = not leaderboard or score > (leaderboard.high_score or 0)
 
     if not leaderboard:
         leaderboard = GameLeaderboard(
@@ -3202,66 +3162,102 @@ def save_game_session(student_id, game_key, difficulty, score, time_seconds, cor
             leaderboard.best_accuracy = accuracy
         leaderboard.last_played = datetime.utcnow()
 
-    db.session.commit()
-
-    return {
+    return session, leaderboard, {
         "xp_earned": xp_earned,
         "tokens_earned": tokens_earned,
-        "new_high_score": not leaderboard or score > leaderboard.high_score,
+        "new_high_score": new_high_score,
         "accuracy": accuracy,
         "difficulty_multiplier": multiplier
     }
 
 
-def get_leaderboard(game_key, difficulty, limit=10):
-    """Get top scores for a game at a specific difficulty level"""
-    from models import Student
+def update_cached_leaderboards(leaderboard, game_session):
+    """Apply a committed game to the in-memory leaderboards"""
+    try:
+        leaderboards.record(leaderboard, game_session)
+    except Exception as e:
+        # Cached boards re-read the database within a minute anyway
+        print(f"⚠️ Could not update cached leaderboards: {e}")
+
+
+def save_game_session(student_id, game_key, difficulty, score, time_seconds, correct, total, game_mode="timed"):
+    """Save completed game session and update leaderboard with difficulty"""
+    session, leaderboard, results = record_game(
+        student_id, game_key, difficulty, score, time_seconds, correct, total, game_mode
+    )
+    db.session.commit()
+    update_cached_leaderboards(leaderboard, session)
+    return results
+
+
+def get_leaderboard(game_key, difficulty, limit=10, class_id=None, weekly=False):
+    """Get top scores for a game at a specific difficulty level (see modules/leaderboard.py)"""
+    return leaderboards.top(game_key, difficulty, limit=limit, class_id=class_id, weekly=weekly)
+
 
-    leaderboards = db.session.query(
-        GameLeaderboard, Student
-    ).join(
-        Student, GameLeaderboard.student_id == Student.id
+def get_session_totals(student_id, game_key=None):
+    """
+    Aggregate a student's game sessions in one query (optionally for one game).
+    Row fields: plays, total_xp, total_tokens, accuracy_sum, accuracy_count,
+    score_sum, best_score
+    """
+    query = db.session.query(
+        func.count(GameSession.id).label("plays"),
+        func.coalesce(func.sum(GameSession.xp_earned), 0).label("total_xp"),
+        func.coalesce(func.sum(GameSession.tokens_earned), 0).label("total_tokens"),
+        func.coalesce(func.sum(GameSession.accuracy), 0).label("accuracy_sum"),
+        func.count(GameSession.accuracy).label("accuracy_count"),
+        func.coalesce(func.sum(GameSession.score), 0).label("score_sum"),
+        func.max(GameSession.score).label("best_score"),
+    ).filter(GameSession.student_id == student_id)
+
+    if game_key:
+        query = query.filter(GameSession.game_key == game_key)
+
+    return query.one()
+
+
+def get_per_game_stats(student_id):
+    """Plays, average score/accuracy and best score for every game a student has played (one query)"""
+    scored_accuracy = case((GameSession.accuracy != 0, GameSession.accuracy))
+    rows = db.session.query(
+        GameSession.game_key,
+        func.count(GameSession.id).label("plays"),
+        func.coalesce(func.sum(GameSession.score), 0).label("score_sum"),
+        func.avg(scored_accuracy).label("avg_accuracy"),
+        func.max(GameSession.score).label("best_score"),
     ).filter(
-        GameLeaderboard.game_key == game_key,
-        GameLeaderboard.difficulty == difficulty
-    ).order_by(
-        GameLeaderboard.high_score.desc()
-    ).limit(limit).all()
+        GameSession.student_id == student_id
+    ).group_by(GameSession.game_key).all()
 
-    return [
-        {
-            "student_name": student.student_name,
-            "high_score": lb.high_score,
-            "best_time": lb.best_time,
-            "best_accuracy": lb.best_accuracy,
-            "total_plays": lb.total_plays
+    return {
+        row.game_key: {
+            "plays": row.plays,
+            "avg_score": round(row.score_sum / row.plays, 1),
+            "avg_accuracy": round(row.avg_accuracy or 0, 1),
+            "best_score": row.best_score,
         }
-        for lb, student in leaderboards
-    ]
+        for row in rows
+    }
 
 
 def get_student_stats(student_id, game_key=None):
     """Get student's arcade statistics"""
-    if game_key:
-        sessions = GameSession.query.filter_by(
-            student_id=student_id,
-            game_key=game_key
-        ).all()
-    else:
-        sessions = GameSession.query.filter_by(student_id=student_id).all()
+    totals = get_session_totals(student_id, game_key)
 
-    if not sessions:
+    if not totals.plays:
         return None
 
-    total_xp = sum(s.xp_earned for s in sessions)
-    total_tokens = sum(s.tokens_earned for s in sessions)
-    avg_accuracy = sum(s.accuracy for s in sessions) / len(sessions)
+    recent = GameSession.query.filter_by(student_id=student_id)
+    if game_key:
+        recent = recent.filter_by(game_key=game_key)
+    recent_sessions = recent.order_by(GameSession.id.desc()).limit(5).all()
 
     return {
-        "total_plays": len(sessions),
-        "total_xp_earned": total_xp,
-        "total_tokens_earned": total_tokens,
-        "average_accuracy": round(avg_accuracy, 1),
-        "best_score": max(s.score for s in sessions),
-        "recent_sessions": sessions[-5:]
+        "total_plays": totals.plays,
+        "total_xp_earned": totals.total_xp,
+        "total_tokens_earned": totals.total_tokens,
+        "average_accuracy": round(totals.accuracy_sum / totals.plays, 1),
+        "best_score": totals.best_score,
+        "recent_sessions": recent_sessions[::-1]
     }
@@ -0,0 +1,189 @@
+"""
+Arcade Question Pool
+====================
+Persistent, per-game/per-difficulty pool of pre-generated arcade questions.
+
+- Filled offline by refill_arcade_question_pool.py (no AI calls on the request path)
+- Play-time generators draw from the pool with least-served-first rotation
+- Heavily served questions are retired so the refill job replaces them with fresh ones
+"""
+
+import json
+import random
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from models import db, ArcadeQuestionPool
+from modules.arcade_helper import get_question_identifier, shuffle_question_options
+
+
+# ============================================================
+# POOL CONFIGURATION
+# ============================================================
+
+# Games whose questions come from the pool, with their refill settings.
+# The AI generator for each game lives in generate_question_banks.py.
+POOL_GAMES = {
+    "vocab_builder": {
+        "questions_per_game": 15,
+        "target_size": 150,      # Questions kept per difficulty
+        "retire_after": 40,      # Serves before a question is replaced
+        "batch_size": 25,        # Questions requested per AI call
+    },
+}
+
+POOL_DIFFICULTIES = ["easy", "medium", "hard"]
+
+# Sample from the N * count least-served questions so games still vary
+ROTATION_WINDOW = 3
+
+
+# ============================================================
+# PLAY-TIME SAMPLING
+# ============================================================
+
+def draw_pool_questions(game_key, difficulty, count):
+    """
+    Draw `count` questions for a game from the pool.
+
+    Picks randomly among the least-served questions and bumps their serve
+    counters, so repeats stay rare as long as the pool is topped up.
+
+    Returns:
+        list of question dicts, or None if the pool doesn't have enough questions
+    """
+    candidates = ArcadeQuestionPool.query.filter_by(
+        game_key=game_key,
+        difficulty=difficulty
+    ).order_by(
+        ArcadeQuestionPool.times_served.asc(),
+        ArcadeQuestionPool.last_served_at.asc()
+    ).limit(count * ROTATION_WINDOW).all()
+
+    if len(candidates) < count:
+        return None
+
+    picked = random.sample(candidates, count)
+
+    # Serve counters are best-effort - never fail the game over them
+    try:
+        ArcadeQuestionPool.query.filter(
+            ArcadeQuestionPool.id.in_([row.id for row in picked])
+        ).update({
+            ArcadeQuestionPool.times_served: ArcadeQuestionPool.times_served + 1,
+            ArcadeQuestionPool.last_served_at: datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        print(f"⚠️ Could not update question pool serve counts: {e}")
+        db.session.rollback()
+
+    return [shuffle_question_options(json.loads(row.question_json)) for row in picked]
+
+
+# ============================================================
+# OFFLINE MAINTENANCE
+# ============================================================
+
+def is_valid_pool_question(question):
+    """Check a generated question has a usable answer among its options"""
+    if not isinstance(question, dict):
+        return False
+
+    options = question.get("options")
+    answer = question.get("answer", question.get("definition"))
+    if not isinstance(options, list) or len(options) < 2 or answer is None:
+        return False
+
+    return answer in options
+
+
+def add_questions_to_pool(game_key, difficulty, questions):
+    """
+    Store new questions in the pool, skipping invalid ones and duplicates.
+    Each insert runs in a savepoint, so a duplicate added by a concurrent
+    refill is skipped without rolling back the rest of the batch.
+
+    Returns:
+        Number of questions added
+    """
+    existing_keys = {
+        key for (key,) in db.session.query(ArcadeQuestionPool.question_key).filter_by(
+            game_key=game_key,
+            difficulty=difficulty
+        ).all()
+    }
+
+    added = 0
+    for question in questions:
+        if not is_valid_pool_question(question):
+            continue
+
+        question_key = get_question_identifier(question)[:255]
+        if question_key in existing_keys:
+            continue
+        existing_keys.add(question_key)
+
+        try:
+            with db.session.begin_nested():
+                db.session.add(ArcadeQuestionPool(
+                    game_key=game_key,
+                    difficulty=difficulty,
+                    question_key=question_key,
+                    question_json=json.dumps(question)
+                ))
+        except IntegrityError:
+            continue
+        added += 1
+
+    db.session.commit()
+    return added
+
+
+def retire_overserved_questions(game_key, difficulty, retire_after):
+    """
+    Delete questions that have been served `retire_after` times or more.
+
+    Returns:
+        Number of questions removed
+    """
+    removed = ArcadeQuestionPool.query.filter(
+        ArcadeQuestionPool.game_key == game_key,
+        ArcadeQuestionPool.difficulty == difficulty,
+        ArcadeQuestionPool.times_served >= retire_after
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def get_pool_size(game_key, difficulty):
+    """Number of questions currently pooled for a game/difficulty"""
+    return ArcadeQuestionPool.query.filter_by(
+        game_key=game_key,
+        difficulty=difficulty
+    ).count()
+
+
+def get_pool_stats():
+    """
+    Pool size and serve totals for every game/difficulty.
+
+    Returns:
+        dict keyed by (game_key, difficulty) -> {"size": int, "served": int}
+    """
+    rows = db.session.query(
+        ArcadeQuestionPool.game_key,
+        ArcadeQuestionPool.difficulty,
+        func.count(ArcadeQuestionPool.id),
+        func.coalesce(func.sum(ArcadeQuestionPool.times_served), 0)
+    ).group_by(
+        ArcadeQuestionPool.game_key,
+        ArcadeQuestionPool.difficulty
+    ).all()
+
+    return {
+        (game_key, difficulty): {"size": size, "served": int(served)}
+        for game_key, difficulty, size, served in rows
+    }
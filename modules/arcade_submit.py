@@ -0,0 +1,79 @@
+# modules/arcade_submit.py
+"""
+Arcade submit pipeline.
+
+Everything a finished game writes - the game session, leaderboard entry,
+performance rollups, streak, badges, daily challenge progress and the
+activity log entry - is added to one transaction and committed once.
+The created GameSession is returned directly, so nothing re-queries "the
+newest session" (which could belong to a concurrent request).
+
+Usage:
+    game_session, results = submit_game(student_id, "speed_math", "hard",
+                                        score=900, time_seconds=42,
+                                        correct=9, total=10, game_mode="timed")
+"""
+from models import db
+from modules.achievement_helper import log_activity
+from modules.arcade_enhancements import (
+    check_and_award_badges,
+    check_daily_challenge_completion,
+    update_game_streak,
+)
+from modules.arcade_helper import record_game, update_cached_leaderboards
+
+
+def submit_game(student_id, game_key, difficulty, score, time_seconds, correct, total, game_mode="timed"):
+    """
+    Record a finished game in a single commit.
+
+    Practice games are saved (and count towards the leaderboard) but earn
+    no XP, tokens, streak, badges or challenge progress.
+
+    Returns:
+        (game_session, results) - results is the JSON for /arcade/submit,
+        minus the session-only level fields the route adds.
+    """
+    try:
+        game_session, leaderboard, results = record_game(
+            student_id, game_key, difficulty, score, time_seconds, correct, total, game_mode
+        )
+
+        if game_mode == "practice":
+            results["practice_mode"] = True
+            results["xp_earned"] = 0
+            results["tokens_earned"] = 0
+        else:
+            streak = update_game_streak(student_id, commit=False)
+            results["current_streak"] = streak.current_streak
+            results["longest_streak"] = streak.longest_streak
+
+            newly_earned_badges = check_and_award_badges(student_id, game_session, commit=False)
+            if newly_earned_badges:
+                results["badges_earned"] = [
+                    {"name": b.name, "icon": b.icon, "description": b.description}
+                    for b in newly_earned_badges
+                ]
+
+            if check_daily_challenge_completion(student_id, game_session, commit=False):
+                results["challenge_completed"] = True
+                results["challenge_bonus_xp"] = game_session.xp_earned - results["xp_earned"]
+                results["challenge_bonus_tokens"] = game_session.tokens_earned - results["tokens_earned"]
+
+        log_activity(
+            student_id=student_id,
+            activity_type="arcade_game_completed",
+            subject=game_key,
+            description=f"Completed arcade game ({game_mode}) with {correct}/{total} correct",
+            xp_earned=results["xp_earned"],
+            commit=False,
+        )
+
+        db.session.commit()
+    except Exception as e:
+        print(f"❌ Arcade submit failed for student {student_id}: {e}")
+        db.session.rollback()
+        raise
+
+    update_cached_leaderboards(leaderboard, game_session)
+    return game_session, results
@@ -8,6 +8,7 @@
 from datetime import datetime
 from models import db, Student, AssessmentResult
 from modules.ability_helper import recalc_student_ability
+from modules.performance_rollup import record_assessment
 
 
 # ------------------------------------------------------------
@@ -83,6 +84,7 @@ def log_practice_event(
     )
 
     db.session.add(result)
+    record_assessment(result)
     db.session.commit()
 
     # Recalculate ability tier
@@ -144,6 +146,7 @@ def log_finished_practice_session(
         )
 
         db.session.add(result)
+        record_assessment(result)
 
     db.session.commit()
 
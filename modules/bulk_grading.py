@@ -0,0 +1,223 @@
+# modules/bulk_grading.py
+"""
+Bulk grading.
+
+Re-scores every turned-in submission of an assignment against its current
+answer key in one pass, e.g. after the teacher fixes a wrong answer:
+
+- submissions are read as plain rows (one query) and graded together with
+  grade_many(), so each distinct answer to a question is matched once
+- changed scores are written with one executemany UPDATE, grade releases
+  with one more
+- each changed score is swapped into the student's assignment rollups,
+  and every affected student's ability is refreshed once, in one commit
+
+Submissions the teacher graded (graded_by="teacher") are kept unless
+include_manual=True, and submissions with nothing auto-gradable are left
+for the teacher. Rows graded before graded_by was recorded are kept too
+when the assignment has manually graded questions, or the grade has
+teacher feedback or doesn't follow from the stored points.
+Answers already graded on the way in (hybrid MC) are re-matched, since
+their stored result came from the old key.
+
+Usage:
+    report = regrade_assignment(assignment, release=True)
+    report = regrade_assignment(assignment, dry_run=True)   # preview only
+    report = release_grades(assignment)
+"""
+import json
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import select, update
+
+from models import db, Student, StudentSubmission
+from modules.adaptive_session import get_plan
+from modules.answer_matching import grade_many
+from modules.performance_rollup import ASSIGNMENT, record_score, update_student_ability
+
+TURNED_IN = ("submitted", "graded")
+SCORE_TOLERANCE = 0.01
+
+
+# ============================================================
+# HELPERS
+# ============================================================
+
+def _answer_set(answers_json) -> Dict:
+    """A submission's answers as {"0": "B. 4", ...}"""
+    try:
+        answers = json.loads(answers_json) if answers_json else {}
+    except (TypeError, ValueError):
+        return {}
+    if not isinstance(answers, dict):
+        return {}
+    # Dynamic modes saved {"answers": {...}, "<mode>_state": {...}}
+    if isinstance(answers.get("answers"), dict):
+        answers = answers["answers"]
+    return {
+        idx: answer.get("answer", "") if isinstance(answer, dict) else answer
+        for idx, answer in answers.items()
+    }
+
+
+def _manually_graded(row, has_manual_questions: bool) -> bool:
+    """The teacher graded this submission (or may have, for rows older than graded_by)"""
+    if row.graded_by:
+        return row.graded_by == "teacher"
+    if row.status == "graded" and has_manual_questions:
+        return True
+    if row.feedback and row.feedback.strip():
+        return True
+    if row.score is None:
+        return False
+    if not row.points_possible:
+        return True
+    auto_score = round((row.points_earned or 0) / row.points_possible * 100, 2)
+    return abs(auto_score - row.score) > SCORE_TOLERANCE
+
+
+def _same(old, new) -> bool:
+    if old is None or new is None:
+        return old is new
+    return abs(old - new) <= SCORE_TOLERANCE
+
+
+# ============================================================
+# REGRADE
+# ============================================================
+
+def regrade_assignment(assignment, release: bool = False, include_manual: bool = False,
+                       dry_run: bool = False) -> Dict:
+    """
+    Re-score all turned-in submissions of `assignment` against its current
+    answer key. Commits unless dry_run.
+
+    Returns a report:
+        {"assignment_id", "checked", "changed", "unchanged", "skipped_manual",
+         "needs_manual", "released", "students_updated", "dry_run",
+         "changes": [{"submission_id", "student_id", "student_name",
+                      "old_score", "new_score", "old_status", "new_status"}, ...]}
+    """
+    plan = get_plan(assignment)
+
+    rows = db.session.execute(
+        select(
+            StudentSubmission.id, StudentSubmission.student_id, StudentSubmission.status,
+            StudentSubmission.score, StudentSubmission.points_earned, StudentSubmission.points_possible,
+            StudentSubmission.feedback, StudentSubmission.graded_by, StudentSubmission.answers_json,
+            Student.student_name,
+        )
+        .join(Student, Student.id == StudentSubmission.student_id)
+        .where(StudentSubmission.assignment_id == assignment.id, StudentSubmission.status.in_(TURNED_IN))
+        .order_by(StudentSubmission.id)
+    ).all()
+
+    has_manual_questions = any(accepted is None for accepted in plan.answer_key)
+    to_grade, skipped = [], 0
+    for row in rows:
+        if not include_manual and _manually_graded(row, has_manual_questions):
+            skipped += 1
+        else:
+            to_grade.append(row)
+    results = grade_many(plan.answer_key, (_answer_set(row.answers_json) for row in to_grade))
+
+    now = datetime.utcnow()
+    updates: List[Dict] = []
+    changes: List[Dict] = []
+    needs_manual = 0
+    for row, graded in zip(to_grade, results):
+        if not graded.gradable:
+            needs_manual += 1  # nothing auto-gradable: left for the teacher
+            continue
+        new_score = round(graded.correct / graded.gradable * 100, 2)
+        if (row.status == "graded" and _same(row.score, new_score)
+                and row.points_earned == graded.correct and row.points_possible == graded.gradable):
+            continue
+
+        updates.append({
+            "id": row.id, "score": new_score, "points_earned": graded.correct,
+            "points_possible": graded.gradable, "status": "graded", "graded_at": now, "graded_by": "auto",
+        })
+        changes.append({
+            "submission_id": row.id,
+            "student_id": row.student_id,
+            "student_name": row.student_name,
+            "old_score": row.score,
+            "new_score": new_score,
+            "old_status": row.status,
+            "new_status": "graded",
+        })
+
+    report = {
+        "assignment_id": assignment.id,
+        "checked": len(to_grade),
+        "changed": len(changes),
+        "unchanged": len(to_grade) - len(changes) - needs_manual,
+        "skipped_manual": skipped,
+        "needs_manual": needs_manual,
+        "released": 0,
+        "students_updated": 0,
+        "dry_run": dry_run,
+        "changes": changes,
+    }
+    if dry_run:
+        return report
+
+    try:
+        if updates:
+            db.session.execute(update(StudentSubmission), updates)
+
+        for change in changes:
+            if change["old_status"] == "graded" and change["old_score"] is not None:
+                record_score(change["student_id"], ASSIGNMENT, change["new_score"],
+                             subject=assignment.subject, at=now, previous=change["old_score"])
+            else:
+                record_score(change["student_id"], ASSIGNMENT, change["new_score"],
+                             subject=assignment.subject, at=now)
+
+        if release:
+            report["released"] = _release(assignment.id)
+
+        student_ids = {change["student_id"] for change in changes}
+        if student_ids:
+            for student in Student.query.filter(Student.id.in_(student_ids)):
+                update_student_ability(student)
+        report["students_updated"] = len(student_ids)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return report
+
+
+# ============================================================
+# RELEASE
+# ============================================================
+
+def _release(assignment_id) -> int:
+    """Release every graded, scored, unreleased submission (one UPDATE). The caller commits."""
+    result = db.session.execute(
+        update(StudentSubmission)
+        .where(
+            StudentSubmission.assignment_id == assignment_id,
+            StudentSubmission.status == "graded",
+            StudentSubmission.score.isnot(None),
+            StudentSubmission.grade_released.isnot(True),
+        )
+        .values(grade_released=True)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount or 0
+
+
+def release_grades(assignment) -> Dict:
+    """Release all graded submissions of an assignment. Commits."""
+    released = _release(assignment.id)
+    unscored = StudentSubmission.query.filter_by(
+        assignment_id=assignment.id, status="graded", score=None
+    ).count()
+    db.session.commit()
+    return {"assignment_id": assignment.id, "released": released, "skipped": unscored}
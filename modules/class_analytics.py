@@ -0,0 +1,342 @@
+# modules/class_analytics.py
+"""
+Set-based class analytics.
+
+Computes the teacher dashboard numbers (last-10 vs previous-10 averages,
+ability tiers, per-subject weak spots, inactivity flags) for a whole class
+or all of a teacher's classes at once in a fixed number of queries,
+instead of one AssessmentResult query per student:
+
+1. Students in scope (with their class)
+2. Per-student window totals - ROW_NUMBER() over each student's results,
+   summed separately for results 1-10 and 11-20
+3. Per-student, per-subject totals over results 1-10
+4. Students with any activity in the last 7 days (early warnings only)
+
+The aggregation happens in SQL; Python only turns totals into averages and
+flags. Results match the previous per-student loops (see
+benchmark_class_analytics.py).
+"""
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy import case, func, select
+
+from models import db, ActivityLog, AssessmentResult, Class, Student
+
+RECENT_RESULTS = 20  # results considered per student
+WINDOW_SIZE = 10  # "last 10" vs "previous 10"
+
+
+# ============================================================
+# QUERIES
+# ============================================================
+
+def _ranked_results(student_scope):
+    """Each student's results numbered newest first (rn = 1, 2, ...)"""
+    return (
+        select(
+            AssessmentResult.student_id,
+            AssessmentResult.subject,
+            AssessmentResult.score_percent,
+            func.row_number().over(
+                partition_by=AssessmentResult.student_id,
+                order_by=(AssessmentResult.created_at.desc(), AssessmentResult.id.desc()),
+            ).label("rn"),
+        )
+        .where(AssessmentResult.student_id.in_(student_scope))
+        .subquery()
+    )
+
+
+def load_recent_stats(student_scope) -> Dict[int, Dict]:
+    """
+    Totals over each student's 20 most recent results (two queries).
+
+    Args:
+        student_scope: SELECT of student ids to include
+
+    Returns:
+        {student_id: {
+            "results": n,                         # rows among the last 20
+            "last_sum", "last_n",                 # scored results 1-10
+            "prev_sum", "prev_n",                 # scored results 11-20
+            "subjects": [(subject, sum, n), ...]  # results 1-10, most recent subject first
+        }}
+    """
+    ranked = _ranked_results(student_scope)
+    window = case((ranked.c.rn <= WINDOW_SIZE, "last"), else_="prev").label("window")
+
+    stats: Dict[int, Dict] = {}
+    window_rows = db.session.execute(
+        select(
+            ranked.c.student_id,
+            window,
+            func.count().label("results"),
+            func.sum(ranked.c.score_percent).label("score_sum"),
+            func.count(ranked.c.score_percent).label("scored"),
+        )
+        .where(ranked.c.rn <= RECENT_RESULTS)
+        .group_by(ranked.c.student_id, window)
+    ).all()
+
+    for row in window_rows:
+        entry = stats.setdefault(row.student_id, {
+            "results": 0, "last_sum": 0.0, "last_n": 0, "prev_sum": 0.0, "prev_n": 0, "subjects": []
+        })
+        entry["results"] += row.results
+        entry[f"{row.window}_sum"] = row.score_sum or 0.0
+        entry[f"{row.window}_n"] = row.scored
+
+    subject_rows = db.session.execute(
+        select(
+            ranked.c.student_id,
+            ranked.c.subject,
+            func.sum(ranked.c.score_percent).label("score_sum"),
+            func.count(ranked.c.score_percent).label("scored"),
+            func.min(ranked.c.rn).label("first_rn"),
+        )
+        .where(ranked.c.rn <= WINDOW_SIZE, ranked.c.score_percent.isnot(None))
+        .group_by(ranked.c.student_id, ranked.c.subject)
+        .order_by(ranked.c.student_id, func.min(ranked.c.rn))
+    ).all()
+
+    for row in subject_rows:
+        stats[row.student_id]["subjects"].append((row.subject, row.score_sum, row.scored))
+
+    return stats
+
+
+def _recently_active(student_scope, since) -> set:
+    return set(db.session.execute(
+        select(ActivityLog.student_id)
+        .where(ActivityLog.student_id.in_(student_scope), ActivityLog.created_at >= since)
+        .distinct()
+    ).scalars())
+
+
+# ============================================================
+# HELPERS
+# ============================================================
+
+def _averages(entry):
+    """(avg of results 1-10, avg of results 11-20) - 0 when a window has no scores"""
+    if not entry:
+        return 0, 0
+    avg_last = entry["last_sum"] / entry["last_n"] if entry["last_n"] else 0
+    avg_prev = entry["prev_sum"] / entry["prev_n"] if entry["prev_n"] else 0
+    return avg_last, avg_prev
+
+
+def ability_tier(avg_last: float) -> str:
+    if avg_last < 60:
+        return "struggling"
+    if avg_last < 85:
+        return "on_level"
+    return "advanced"
+
+
+def suggested_mode(tier: str) -> str:
+    return "adaptive" if tier == "on_level" else ("scaffold" if tier == "struggling" else "mastery")
+
+
+def _merge_subjects(subjects, blank=None):
+    """
+    Combine per-subject totals into {subject: (sum, n)} in most-recent-first order.
+    Blank subjects are renamed to `blank`, or dropped when blank is None.
+    """
+    merged: Dict[str, list] = {}
+    for subject, score_sum, scored in subjects:
+        if not subject:
+            if blank is None:
+                continue
+            subject = blank
+        totals = merged.setdefault(subject, [0.0, 0])
+        totals[0] += score_sum
+        totals[1] += scored
+    return merged
+
+
+# ============================================================
+# CLASS ANALYTICS
+# ============================================================
+
+def _class_summary(class_id: int, students, stats: Dict) -> Dict:
+    """Build one class's analytics from its student rows and load_recent_stats() totals"""
+    summary: Dict = {"class_id": class_id, "students": [], "subjects": {}, "flags": []}
+    class_subjects: Dict[str, list] = {}
+
+    for student in students:
+        entry = stats.get(student.id)
+        avg_last, avg_prev = _averages(entry)
+        delta = round(avg_last - avg_prev, 2)
+        tier = ability_tier(avg_last)
+
+        subject_avgs = {
+            subject: round(score_sum / scored, 2)
+            for subject, (score_sum, scored) in _merge_subjects(entry["subjects"] if entry else [], blank="unknown").items()
+        }
+        weak_subjects = [subject for subject, avg in subject_avgs.items() if avg < 70]
+        name = student.student_name or "Student"
+
+        summary["students"].append({
+            "student_id": student.id,
+            "name": name,
+            "avg": round(avg_last, 2),
+            "prev_avg": round(avg_prev, 2),
+            "delta": delta,
+            "ability": tier,
+            "subjects": subject_avgs,
+            "weak_subjects": weak_subjects,
+            "suggested_mode": suggested_mode(tier),
+        })
+
+        for subject, avg in subject_avgs.items():
+            class_subjects.setdefault(subject, []).append(avg)
+
+        # Steep negative trend or multiple weak subjects
+        if delta < -10 or len(weak_subjects) >= 2:
+            summary["flags"].append({
+                "student_id": student.id,
+                "name": name,
+                "delta": delta,
+                "weak_subjects": weak_subjects,
+            })
+
+    for subject, avgs in class_subjects.items():
+        summary["subjects"][subject] = {"avg": round(sum(avgs) / len(avgs), 2), "n": len(avgs)}
+
+    return summary
+
+
+def compute_class_analytics(class_id: int) -> Dict:
+    """Averages, ability tiers, per-subject breakdown and trend deltas for one class."""
+    students = db.session.execute(
+        select(Student.id, Student.student_name)
+        .where(Student.class_id == class_id)
+        .order_by(Student.id)
+    ).all()
+    stats = load_recent_stats(select(Student.id).where(Student.class_id == class_id))
+    return _class_summary(class_id, students, stats)
+
+
+def compute_teacher_class_analytics(teacher_id: int) -> Dict[int, Dict]:
+    """
+    compute_class_analytics() for every class of a teacher, keyed by class id.
+    Three queries however many classes the teacher has.
+    """
+    rows = db.session.execute(
+        select(Class.id.label("class_id"), Student.id, Student.student_name)
+        .outerjoin(Student, Student.class_id == Class.id)
+        .where(Class.teacher_id == teacher_id)
+        .order_by(Class.id, Student.id)
+    ).all()
+    scope = select(Student.id).join(Class, Student.class_id == Class.id).where(Class.teacher_id == teacher_id)
+    stats = load_recent_stats(scope)
+
+    students_by_class: Dict[int, list] = {}
+    for row in rows:
+        class_students = students_by_class.setdefault(row.class_id, [])
+        if row.id is not None:  # empty classes still get a summary
+            class_students.append(row)
+
+    return {
+        class_id: _class_summary(class_id, students, stats)
+        for class_id, students in students_by_class.items()
+    }
+
+
+# ============================================================
+# EARLY WARNINGS
+# ============================================================
+
+def compute_early_warnings(teacher_id: int) -> Dict:
+    """At-risk students across all of a teacher's classes, by warning type."""
+    warnings = {
+        "declining_performance": [],  # Delta < -10
+        "low_performance": [],  # 2+ subjects < 60%
+        "inactive": [],  # No login in 7+ days
+        "no_recent_activity": [],  # No activity in 7+ days
+        "critical": []  # Multiple warning types
+    }
+
+    now = datetime.utcnow()
+    week_ago = now - timedelta(days=7)
+
+    students = db.session.execute(
+        select(Student.id, Student.student_name, Student.last_login,
+               Class.id.label("class_id"), Class.class_name)
+        .join(Class, Student.class_id == Class.id)
+        .where(Class.teacher_id == teacher_id)
+        .order_by(Class.id, Student.id)
+    ).all()
+    scope = select(Student.id).join(Class, Student.class_id == Class.id).where(Class.teacher_id == teacher_id)
+    stats = load_recent_stats(scope)
+    active = _recently_active(scope, week_ago)
+
+    for student in students:
+        entry = stats.get(student.id)
+        num_results = entry["results"] if entry else 0
+        base = {
+            "student_id": student.id,
+            "student_name": student.student_name,
+            "class_name": student.class_name,
+            "class_id": student.class_id,
+        }
+        student_warnings = []
+
+        # Check 1: Declining performance (delta < -10)
+        if num_results >= 10 and entry["last_n"] and entry["prev_n"]:
+            avg_last, avg_prev = _averages(entry)
+            delta = avg_last - avg_prev
+            if delta < -10:
+                student_warnings.append("declining")
+                warnings["declining_performance"].append(dict(
+                    base,
+                    delta=round(delta, 1),
+                    current_avg=round(avg_last, 1),
+                    previous_avg=round(avg_prev, 1),
+                ))
+
+        # Check 2: Low performance in multiple subjects
+        if num_results >= 5:
+            weak_subjects = [
+                {"subject": subject, "avg": round(score_sum / scored, 1)}
+                for subject, (score_sum, scored) in _merge_subjects(entry["subjects"]).items()
+                if score_sum / scored < 60
+            ]
+            if len(weak_subjects) >= 2:
+                student_warnings.append("low_performance")
+                warnings["low_performance"].append(dict(
+                    base, weak_subjects=weak_subjects, count=len(weak_subjects)
+                ))
+
+        # Check 3: Haven't logged in recently
+        if student.last_login:
+            days_since_login = (now - student.last_login).days
+            if days_since_login >= 7:
+                student_warnings.append("inactive")
+                warnings["inactive"].append(dict(
+                    base,
+                    days_since_login=days_since_login,
+                    last_login=student.last_login.strftime("%Y-%m-%d"),
+                ))
+
+        # Check 4: Has history but no activity in the last week
+        if student.id not in active and num_results > 0:
+            student_warnings.append("no_activity")
+            warnings["no_recent_activity"].append(dict(base, days_inactive=7))
+
+        # Critical: Multiple warning types
+        if len(student_warnings) >= 2:
+            warnings["critical"].append(dict(
+                base, warning_types=student_warnings, warning_count=len(student_warnings)
+            ))
+
+    warnings["total_at_risk"] = len({
+        w["student_id"]
+        for category in ["declining_performance", "low_performance", "inactive", "no_recent_activity"]
+        for w in warnings[category]
+    })
+
+    return warnings
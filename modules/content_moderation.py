@@ -1,17 +1,116 @@
 # modules/content_moderation.py
 """
 Content moderation for AI Study Buddy using OpenAI Moderation API
+
+- A local pre-filter settles obviously safe / obviously unsafe text
+  without an API call
+- ModeratedGeneration runs moderation and the main AI completion at the
+  same time, discarding the answer if the question gets flagged
 """
 
-import os
-from openai import OpenAI
+import re
+import threading
+
+from modules.ai_gateway import get_shared_client, submit_task
+
+
+# ============================================================
+# LOCAL PRE-FILTER
+# ============================================================
+
+# Obviously unsafe: first-person self-harm intent, threats against a school,
+# explicit sexual requests. Kept narrow on purpose - anything less clear-cut
+# still goes to the Moderation API.
+LOCAL_UNSAFE_RULES = [
+    (
+        re.compile(r"\b(kill|hurt|cut)\s+my\s*self\b|\bi\s*(want|wanna|am going|'m going|plan)\s+to\s+(die|end my life)\b", re.IGNORECASE),
+        ["self_harm", "self_harm_intent"],
+    ),
+    (
+        re.compile(r"\b(shoot|bomb|stab)\s+(up\s+)?(my|the|our)\s+(school|class|classroom|teacher)\b|\bhow\s+(do i|to)\s+(make|build)\s+a\s+(bomb|gun)\b", re.IGNORECASE),
+        ["violence"],
+    ),
+    (
+        re.compile(r"\bporn\w*\b|\bsend\s+(me\s+)?nudes?\b", re.IGNORECASE),
+        ["sexual"],
+    ),
+]
+
+# Obviously safe: plain math expressions and short chat acknowledgements
+SAFE_MATH_PATTERN = re.compile(r"^[\d\s+\-*/×÷=^().,%<>?xy]+$")
+SAFE_ACKNOWLEDGEMENTS = {
+    "hi", "hello", "hey", "ok", "okay", "yes", "no", "yep", "nope", "sure",
+    "thanks", "thank you", "thank you so much", "got it", "i get it", "cool",
+    "i don't know", "i dont know", "idk", "why", "how", "what", "really",
+    "can you explain", "explain again", "can you explain again", "help",
+    "next", "next question", "i'm confused", "im confused", "that makes sense",
+}
+SAFE_MATH_MAX_LENGTH = 200
+
+_stats = {"local_safe": 0, "local_unsafe": 0, "api_calls": 0, "api_errors": 0, "pipelines": 0, "discarded": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+def prefilter_content(text: str):
+    """
+    Settle obviously safe or unsafe text locally.
 
+    Returns:
+        A moderate_content()-shaped dict (with 'source': 'local'),
+        or None if the text needs the Moderation API.
+    """
+    stripped = (text or "").strip()
+
+    for pattern, categories in LOCAL_UNSAFE_RULES:
+        if pattern.search(stripped):
+            _count("local_unsafe")
+            return {
+                'flagged': True,
+                'categories': {category: True for category in categories},
+                'category_scores': {category: 1.0 for category in categories},
+                'reason': f"Flagged for: {', '.join(c.replace('_', ' ').title() for c in categories)}",
+                'source': 'local'
+            }
+
+    normalized = stripped.lower().strip(" .!?")
+    is_math = len(stripped) <= SAFE_MATH_MAX_LENGTH and bool(SAFE_MATH_PATTERN.match(stripped))
+    if not stripped or is_math or normalized in SAFE_ACKNOWLEDGEMENTS:
+        _count("local_safe")
+        return {
+            'flagged': False,
+            'categories': {},
+            'category_scores': {},
+            'reason': None,
+            'source': 'local'
+        }
+
+    return None
+
+
+def get_moderation_stats() -> dict:
+    """Pre-filter hit rate and pipeline counters (this worker, since startup)"""
+    with _stats_lock:
+        stats = dict(_stats)
+    checked = stats["local_safe"] + stats["local_unsafe"] + stats["api_calls"]
+    local = stats["local_safe"] + stats["local_unsafe"]
+    stats["checked"] = checked
+    stats["prefilter_hit_rate"] = round(local / checked * 100, 1) if checked else 0.0
+    return stats
+
+
+# ============================================================
+# MODERATION
+# ============================================================
 
 def moderate_content(text: str) -> dict:
     """
     Check content for inappropriate material using OpenAI Moderation API.
+    Obviously safe/unsafe text is settled by prefilter_content() instead.
 
     Args:
         text: The content to moderate
@@ -22,9 +121,15 @@ def moderate_content(text: str) -> dict:
             - categories (dict): Which categories were flagged
             - category_scores (dict): Confidence scores for each category
             - reason (str): Human-readable reason if flagged
+            - source (str): 'local' (pre-filter) or 'api'
     """
+    local_result = prefilter_content(text)
+    if local_result is not None:
+        return local_result
+
+    _count("api_calls")
     try:
-        response = client.moderations.create(input=text)
+        response = get_shared_client().moderations.create(input=text)
         result = response.results[0]
 
         # Build human-readable reason
@@ -41,10 +146,12 @@ def moderate_content(text: str) -> dict:
             'flagged': result.flagged,
             'categories': result.categories.model_dump(),
             'category_scores': result.category_scores.model_dump(),
-            'reason': reason
+            'reason': reason,
+            'source': 'api'
         }
 
     except Exception as e:
+        _count("api_errors")
         print(f"Moderation API error: {e}")
         # Fail open - don't block if moderation fails
         return {
@@ -52,7 +159,8 @@ def moderate_content(text: str) -> dict:
             'categories': {},
             'category_scores': {},
             'reason': None,
-            'error': str(e)
+            'error': str(e),
+            'source': 'api'
         }
 
 
@@ -95,6 +203,52 @@ def check_academic_dishonesty(text: str) -> dict:
     }
 
 
+# ============================================================
+# CONCURRENT MODERATION PIPELINE
+# ============================================================
+
+class ModeratedGeneration:
+    """
+    Moderates a student's text while the AI answer is already being generated.
+
+    generate(*args, **kwargs) starts on the AI gateway thread pool (unless the
+    pre-filter already knows the text is unsafe); moderation and the academic
+    dishonesty check run on the calling thread meanwhile. Callers that block
+    the text call discard(), so the answer is never shown.
+
+    Usage:
+        generation = ModeratedGeneration(question, explain_math, question, grade, character)
+        if generation.moderation['flagged']:
+            generation.discard()
+            ...block the question...
+        answer = generation.result()
+    """
+
+    def __init__(self, text, generate, *args, **kwargs):
+        _count("pipelines")
+        self._future = None
+
+        local_result = prefilter_content(text)
+        if local_result is None or not local_result['flagged']:
+            self._future = submit_task(generate, *args, **kwargs)
+
+        self.moderation = local_result or moderate_content(text)
+        self.cheating = check_academic_dishonesty(text)
+
+    def result(self, timeout=None):
+        """The generated answer (re-raises generation errors)"""
+        if self._future is None:
+            raise RuntimeError("Generation was discarded because the text was flagged")
+        return self._future.result(timeout=timeout)
+
+    def discard(self):
+        """Drop the answer. A call already in flight finishes in the background."""
+        if self._future is not None:
+            self._future.cancel()
+            self._future = None
+            _count("discarded")
+
+
 def should_notify_parent(moderation_result: dict, cheating_result: dict) -> bool:
     """
     Determine if parents should be notified based on moderation results.
@@ -0,0 +1,331 @@
+"""
+Gradebook Exports
+=================
+Streaming CSV exports for the teacher gradebook.
+
+Rows are generated while the response is being sent, CSV_CHUNK_ROWS at a
+time, so memory stays flat however many students and submissions an
+export covers:
+- submissions are read through a server-side cursor (yield_per) ordered
+  by student, and merged with the class roster one student at a time
+- averages are computed by grouped queries or running totals, never by
+  keeping every score
+- ?gzip=1 compresses the stream on the fly (filename gets .gz)
+
+Usage:
+    return csv_response(class_gradebook_rows(cls), "gradebook.csv",
+                        compress=wants_gzip())
+"""
+
+import csv
+import io
+import zlib
+from typing import Dict, Iterable, Iterator, List
+
+from flask import Response, request, stream_with_context
+from sqlalchemy import func, select
+
+from models import db, AssignedPractice, Class, Student, StudentSubmission, student_classes
+
+CSV_CHUNK_ROWS = 500  # rows per chunk written to the response
+STREAM_BATCH_SIZE = 1000  # rows fetched per round trip from the server-side cursor
+
+
+# ============================================================
+# RESPONSES
+# ============================================================
+
+def wants_gzip() -> bool:
+    """True if the export was requested compressed (?gzip=1)"""
+    return request.args.get("gzip") == "1"
+
+
+def iter_csv(rows: Iterable[List], chunk_rows: int = CSV_CHUNK_ROWS) -> Iterator[str]:
+    """Write rows as CSV, yielding the text every chunk_rows rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_chunks(chunks: Iterable[str]) -> Iterator[bytes]:
+    """Gzip a stream of text chunks incrementally"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_response(rows: Iterable[List], filename: str, compress: bool = False) -> Response:
+    """
+    Stream rows as a CSV download. Headers go out before the first row;
+    the request context (session, db) stays available while rows are made.
+    """
+    body = iter_csv(rows)
+    mimetype = "text/csv"
+    if compress:
+        body = gzip_chunks(body)
+        filename += ".gz"
+        mimetype = "application/gzip"
+
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    response.headers["X-Accel-Buffering"] = "no"  # stop proxies buffering the download
+    return response
+
+
+# ============================================================
+# QUERIES
+# ============================================================
+
+def _roster(class_id) -> List[Student]:
+    """Students enrolled in a class, by id"""
+    return (
+        Student.query.join(student_classes, student_classes.c.student_id == Student.id)
+        .filter(student_classes.c.class_id == class_id)
+        .order_by(Student.id)
+        .all()
+    )
+
+
+def _published_assignments(class_id) -> List[AssignedPractice]:
+    return (
+        AssignedPractice.query.filter_by(class_id=class_id, is_published=True)
+        .order_by(AssignedPractice.due_date)
+        .all()
+    )
+
+
+def _submissions_by_student(students: List[Student], assignment_ids: List[int]):
+    """
+    Yield (student, {assignment_id: submission}) for each student, in
+    student id order, from one streamed query. The first submission per
+    assignment wins, like .first() did.
+    """
+    if not assignment_ids:
+        for student in students:
+            yield student, {}
+        return
+
+    submissions = db.session.execute(
+        select(StudentSubmission)
+        .where(StudentSubmission.assignment_id.in_(assignment_ids))
+        .order_by(StudentSubmission.student_id, StudentSubmission.id)
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    ).scalars()
+
+    current = next(submissions, None)
+    for student in students:
+        # Skip submissions from students no longer on the roster
+        while current is not None and current.student_id < student.id:
+            current = next(submissions, None)
+
+        by_assignment: Dict[int, StudentSubmission] = {}
+        while current is not None and current.student_id == student.id:
+            by_assignment.setdefault(current.assignment_id, current)
+            current = next(submissions, None)
+        yield student, by_assignment
+
+    submissions.close()
+
+
+def _graded_averages(assignment_ids: List[int]) -> Dict[int, float]:
+    """Average graded score per assignment, over every graded submission"""
+    if not assignment_ids:
+        return {}
+    return dict(db.session.execute(
+        select(StudentSubmission.assignment_id, func.avg(StudentSubmission.score))
+        .where(StudentSubmission.assignment_id.in_(assignment_ids),
+               StudentSubmission.status == "graded",
+               StudentSubmission.score.isnot(None))
+        .group_by(StudentSubmission.assignment_id)
+    ).all())
+
+
+# ============================================================
+# EXPORTS
+# ============================================================
+
+def class_gradebook_rows(cls: Class) -> Iterator[List]:
+    """One row per student with a column per published assignment, then class averages"""
+    assignments = _published_assignments(cls.id)
+    assignment_ids = [a.id for a in assignments]
+
+    # Header row: Student Name, Email, then each assignment title, then Average
+    header = ['Student Name', 'Email']
+    for assignment in assignments:
+        header.append(f"{assignment.title} ({assignment.assignment_type})")
+    header.append('Average (%)')
+    header.append('Assignments Graded')
+    yield header
+
+    for student, submissions in _submissions_by_student(_roster(cls.id), assignment_ids):
+        row = [
+            getattr(student, 'student_name', 'Student'),
+            getattr(student, 'email', '')
+        ]
+
+        total_score = 0
+        graded_count = 0
+
+        for assignment in assignments:
+            submission = submissions.get(assignment.id)
+
+            if submission and submission.status == 'graded' and submission.score is not None:
+                row.append(f"{submission.score:.1f}")
+                total_score += submission.score
+                graded_count += 1
+            elif submission and submission.status == 'submitted':
+                row.append('Pending')
+            else:
+                row.append('Not Submitted')
+
+        row.append(f"{total_score / graded_count:.1f}" if graded_count else 'N/A')
+        row.append(str(graded_count))
+        yield row
+
+    # Class averages row
+    averages = _graded_averages(assignment_ids)
+    avg_row = ['CLASS AVERAGE', '']
+    for assignment in assignments:
+        average = averages.get(assignment.id)
+        avg_row.append(f"{average:.1f}" if average is not None else 'N/A')
+    avg_row.append('')  # No overall average for class average row
+    avg_row.append('')  # No graded count
+    yield avg_row
+
+
+def all_classes_gradebook_rows(class_ids: List[int]) -> Iterator[List]:
+    """One row per (class, student, published assignment)"""
+    yield ['Class Name', 'Grade Level', 'Student Name', 'Email', 'Assignment', 'Type', 'Score (%)', 'Status', 'Due Date']
+
+    for class_id in class_ids:
+        cls = db.session.get(Class, class_id)
+        assignments = _published_assignments(cls.id)
+
+        for student, submissions in _submissions_by_student(_roster(cls.id), [a.id for a in assignments]):
+            for assignment in assignments:
+                submission = submissions.get(assignment.id)
+
+                row = [
+                    cls.class_name,
+                    cls.grade_level or 'N/A',
+                    getattr(student, 'student_name', 'Student'),
+                    getattr(student, 'email', ''),
+                    assignment.title,
+                    assignment.assignment_type or 'practice',
+                ]
+
+                if submission and submission.status == 'graded' and submission.score is not None:
+                    row.append(f"{submission.score:.1f}")
+                    row.append('Graded')
+                elif submission and submission.status == 'submitted':
+                    row.append('N/A')
+                    row.append('Pending')
+                else:
+                    row.append('N/A')
+                    row.append('Not Submitted')
+
+                row.append(assignment.due_date.strftime('%Y-%m-%d') if assignment.due_date else 'No Due Date')
+                yield row
+
+
+def assignment_rows(assignment: AssignedPractice) -> Iterator[List]:
+    """One row per student on the assignment's class roster, then summary statistics"""
+    yield [
+        'Student Name',
+        'Email',
+        'Score (%)',
+        'Status',
+        'Submitted At',
+        'Graded At',
+        'Time to Grade (hours)',
+        'Attempts',
+        'Teacher Feedback'
+    ]
+
+    # Running statistics
+    student_count = 0
+    score_count = 0
+    score_sum = 0.0
+    highest = None
+    lowest = None
+    submitted_count = 0
+    not_submitted_count = 0
+    total_grading_time = 0
+    grading_time_count = 0
+
+    for student, submissions in _submissions_by_student(_roster(assignment.class_id), [assignment.id]):
+        student_count += 1
+        submission = submissions.get(assignment.id)
+
+        row = [
+            getattr(student, 'student_name', 'Student'),
+            getattr(student, 'email', '')
+        ]
+
+        if submission:
+            # Score
+            if submission.status == 'graded' and submission.score is not None:
+                row.append(f"{submission.score:.1f}")
+                score_count += 1
+                score_sum += submission.score
+                highest = submission.score if highest is None else max(highest, submission.score)
+                lowest = submission.score if lowest is None else min(lowest, submission.score)
+            else:
+                row.append('N/A')
+
+            # Status
+            row.append(submission.status.title())
+            if submission.status == 'submitted':
+                submitted_count += 1
+
+            row.append(submission.submitted_at.strftime('%Y-%m-%d %H:%M') if submission.submitted_at else 'N/A')
+            row.append(submission.graded_at.strftime('%Y-%m-%d %H:%M') if submission.graded_at else 'N/A')
+
+            # Time to Grade
+            if submission.submitted_at and submission.graded_at:
+                time_diff = (submission.graded_at - submission.submitted_at).total_seconds() / 3600
+                row.append(f"{time_diff:.1f}")
+                total_grading_time += time_diff
+                grading_time_count += 1
+            else:
+                row.append('N/A')
+
+            row.append(getattr(submission, 'attempts', 1))
+
+            # Teacher Feedback, without newlines and limited in length for CSV
+            feedback = getattr(submission, 'teacher_feedback', '') or ''
+            row.append(feedback.replace('\n', ' ').replace('\r', '')[:200])
+        else:
+            row.extend(['N/A', 'Not Submitted', 'N/A', 'N/A', 'N/A', '0', ''])
+            not_submitted_count += 1
+
+        yield row
+
+    # Summary statistics rows
+    yield []
+    yield ['SUMMARY STATISTICS']
+    yield ['Total Students', student_count]
+    yield ['Graded', score_count]
+    yield ['Submitted (Pending)', submitted_count]
+    yield ['Not Submitted', not_submitted_count]
+
+    if score_count:
+        yield ['Average Score', f"{score_sum / score_count:.1f}%"]
+        yield ['Highest Score', f"{highest:.1f}%"]
+        yield ['Lowest Score', f"{lowest:.1f}%"]
+
+    if grading_time_count > 0:
+        yield ['Avg. Grading Time', f"{total_grading_time / grading_time_count:.1f} hours"]
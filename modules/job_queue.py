@@ -0,0 +1,286 @@
+# modules/job_queue.py
+"""
+Background job queue.
+
+Slow side effects (SMTP mail today) are written to the background_jobs
+table and run by job workers, so the request that caused them returns
+without waiting on the mail server.
+
+- enqueue() / queue_email() save a job row (commit=False leaves it to the
+  caller's commit). Emails are rendered on the request; only the send is
+  deferred.
+- Workers claim due jobs with a conditional UPDATE, so several processes
+  can poll the same table without running a job twice. A job left
+  "running" by a worker that died is reclaimed after JOB_LOCK_SECONDS.
+- A failed attempt is retried with exponential backoff
+  (JOB_RETRY_BASE_SECONDS, doubling, capped at JOB_RETRY_MAX_SECONDS).
+  After max_attempts the job is marked "dead" and kept for the admin
+  dead-letter list (/admin/jobs), where it can be retried.
+
+Web workers run an embedded job worker thread when JOB_WORKER_EMBEDDED=1,
+which the web start commands (Procfile, render.yaml) set. It is off by
+default, so scripts that import app don't start one. run_job_worker.py
+runs a dedicated worker process.
+
+Usage:
+    msg = Message(subject="Hello", recipients=[parent.email], html=html)
+    queue_email(msg)
+
+    register_handler("recalculate", recalculate_job)
+    enqueue("recalculate", {"student_id": 7}, delay_seconds=60)
+"""
+import json
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from sqlalchemy import and_, func, or_, select, update
+
+from models import db, BackgroundJob
+
+JOB_POLL_SECONDS = 5
+JOB_BATCH_SIZE = 10
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_SECONDS = 30  # 30s, 1m, 2m, 4m, ...
+JOB_RETRY_MAX_SECONDS = 60 * 60
+JOB_LOCK_SECONDS = 10 * 60  # a running job older than this belonged to a dead worker
+JOB_KEEP_DONE_DAYS = 7  # finished jobs are deleted after this; dead jobs are kept
+
+EMAIL_FIELDS = ("subject", "recipients", "body", "html", "sender", "cc", "bcc", "reply_to")
+
+_handlers: Dict[str, Callable] = {}
+_app = None
+_wake = threading.Event()
+_worker_lock = threading.Lock()
+_worker_pid = None
+
+
+# ============================================================
+# ENQUEUE
+# ============================================================
+
+def register_handler(kind: str, handler: Callable):
+    """Run `handler(payload)` for jobs of this kind (inside an app context)"""
+    _handlers[kind] = handler
+
+
+def enqueue(kind: str, payload: Dict, delay_seconds: int = 0,
+            max_attempts: int = JOB_MAX_ATTEMPTS, commit: bool = True) -> BackgroundJob:
+    """Add a job. With commit=False it is saved by the caller's commit."""
+    job = BackgroundJob(
+        kind=kind,
+        payload_json=json.dumps(payload),
+        max_attempts=max_attempts,
+        run_after=datetime.utcnow() + timedelta(seconds=delay_seconds),
+    )
+    db.session.add(job)
+    if commit:
+        db.session.commit()
+        _wake.set()
+    _ensure_worker()
+    return job
+
+
+def queue_email(msg, commit: bool = True) -> BackgroundJob:
+    """Send a flask_mail Message from a job worker instead of the request"""
+    payload = {field: getattr(msg, field, None) for field in EMAIL_FIELDS}
+    return enqueue("email", payload, commit=commit)
+
+
+def _send_email(mail):
+    from flask_mail import Message
+
+    def send(payload):
+        if isinstance(payload.get("sender"), list):
+            payload["sender"] = tuple(payload["sender"])  # (name, address) comes back as a list
+        mail.send(Message(**payload))
+    return send
+
+
+# ============================================================
+# WORKER
+# ============================================================
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _retry_delay(attempts: int) -> int:
+    return min(JOB_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), JOB_RETRY_MAX_SECONDS)
+
+
+def _claim(worker_id: str, batch_size: int) -> List[int]:
+    """Mark up to batch_size due jobs as ours; returns their ids"""
+    now = datetime.utcnow()
+    claimable = or_(
+        and_(BackgroundJob.status == "pending", BackgroundJob.run_after <= now),
+        and_(BackgroundJob.status == "running", BackgroundJob.locked_at < now - timedelta(seconds=JOB_LOCK_SECONDS)),
+    )
+    candidates = db.session.execute(
+        select(BackgroundJob.id).where(claimable)
+        .order_by(BackgroundJob.run_after, BackgroundJob.id)
+        .limit(batch_size)
+    ).scalars().all()
+
+    claimed = []
+    for job_id in candidates:
+        # Only one worker's UPDATE still matches - the rest see rowcount 0
+        result = db.session.execute(
+            update(BackgroundJob)
+            .where(BackgroundJob.id == job_id, claimable)
+            .values(status="running", locked_by=worker_id, locked_at=now,
+                    attempts=BackgroundJob.attempts + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            claimed.append(job_id)
+    db.session.commit()
+    return claimed
+
+
+def _finish(job: BackgroundJob, error: Exception = None) -> str:
+    now = datetime.utcnow()
+    job.locked_by = None
+    job.locked_at = None
+
+    if error is None:
+        job.status = "done"
+        job.finished_at = now
+        job.last_error = None
+    else:
+        job.last_error = f"{type(error).__name__}: {error}"[:2000]
+        if job.attempts >= job.max_attempts:
+            job.status = "dead"
+            job.finished_at = now
+            print(f"❌ Job {job.id} ({job.kind}) failed {job.attempts} times, moved to dead letters: {error}")
+        else:
+            job.status = "pending"
+            job.run_after = now + timedelta(seconds=_retry_delay(job.attempts))
+            print(f"⚠️ Job {job.id} ({job.kind}) attempt {job.attempts} failed, retrying at {job.run_after}: {error}")
+    return job.status
+
+
+def run_due_jobs(worker_id: str = None, batch_size: int = JOB_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Claim and run one batch of due jobs.
+
+    Returns:
+        {"done": n, "pending": n (will be retried), "dead": n}
+    """
+    worker_id = worker_id or _worker_id()
+    counts = {"done": 0, "pending": 0, "dead": 0}
+
+    for job_id in _claim(worker_id, batch_size):
+        job = db.session.get(BackgroundJob, job_id)
+        error = None
+        try:
+            handler = _handlers.get(job.kind)
+            if handler is None:
+                raise LookupError(f"no handler registered for '{job.kind}' jobs")
+            handler(json.loads(job.payload_json))
+        except Exception as e:
+            error = e
+            db.session.rollback()  # drop anything the handler half-wrote
+            job = db.session.get(BackgroundJob, job_id)
+
+        counts[_finish(job, error)] += 1
+        db.session.commit()
+
+    return counts
+
+
+def purge_done_jobs(keep_days: int = JOB_KEEP_DONE_DAYS) -> int:
+    """Delete jobs that finished successfully more than keep_days ago"""
+    deleted = BackgroundJob.query.filter(
+        BackgroundJob.status == "done",
+        BackgroundJob.finished_at < datetime.utcnow() - timedelta(days=keep_days),
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def run_worker(app, poll_seconds: int = JOB_POLL_SECONDS, stop: threading.Event = None):
+    """Run jobs until `stop` is set; sleeps between polls while the queue is empty"""
+    worker_id = _worker_id()
+    last_purge = None
+    while stop is None or not stop.is_set():
+        ran = 0
+        try:
+            with app.app_context():
+                ran = sum(run_due_jobs(worker_id).values())
+                if last_purge is None or datetime.utcnow() - last_purge > timedelta(hours=1):
+                    purge_done_jobs()
+                    last_purge = datetime.utcnow()
+        except Exception as e:
+            print(f"⚠️ Job worker error: {e}")
+
+        if not ran:
+            _wake.wait(poll_seconds)
+            _wake.clear()
+
+
+def _ensure_worker():
+    """Start the embedded worker thread once per process (gunicorn forks after import)"""
+    global _worker_pid
+    if _app is None or _worker_pid == os.getpid():
+        return
+    if os.environ.get("JOB_WORKER_EMBEDDED", "0") != "1":
+        return
+    with _worker_lock:
+        if _worker_pid != os.getpid():
+            threading.Thread(target=run_worker, args=(_app,), daemon=True, name="job-worker").start()
+            _worker_pid = os.getpid()
+
+
+def start_embedded_worker():
+    """Run jobs in this process too (web entrypoints only)"""
+    os.environ["JOB_WORKER_EMBEDDED"] = "1"
+    _ensure_worker()
+
+
+def init_job_queue(app, mail):
+    """Register the built-in job kinds; starts a worker thread if JOB_WORKER_EMBEDDED=1"""
+    global _app
+    _app = app
+    register_handler("email", _send_email(mail))
+    _ensure_worker()
+
+
+# ============================================================
+# ADMIN
+# ============================================================
+
+def queue_stats() -> Dict[str, int]:
+    """Number of jobs in each status"""
+    counts = {"pending": 0, "running": 0, "done": 0, "dead": 0}
+    rows = db.session.execute(
+        select(BackgroundJob.status, func.count()).group_by(BackgroundJob.status)
+    ).all()
+    counts.update({status: count for status, count in rows})
+    return counts
+
+
+def dead_jobs(limit: int = 50) -> List[BackgroundJob]:
+    """The dead-letter list, most recent first"""
+    return (
+        BackgroundJob.query.filter_by(status="dead")
+        .order_by(BackgroundJob.finished_at.desc(), BackgroundJob.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def retry_job(job_id: int) -> bool:
+    """Give a dead job a fresh set of attempts"""
+    job = db.session.get(BackgroundJob, job_id)
+    if job is None or job.status != "dead":
+        return False
+    job.status = "pending"
+    job.attempts = 0
+    job.run_after = datetime.utcnow()
+    job.finished_at = None
+    db.session.commit()
+    _wake.set()
+    return True
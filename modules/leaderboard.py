@@ -0,0 +1,282 @@
+# modules/leaderboard.py
+"""
+Arcade leaderboards.
+
+Keeps the top LEADERBOARD_SIZE entries of each arcade leaderboard in
+memory, so the game page reads a sorted list instead of joining
+game_leaderboards and students and sorting on every view.
+
+Boards are kept per (game_key, difficulty) and scope:
+    ("all",)                 all-time high scores (game_leaderboards)
+    ("class", class_id)      all-time high scores of one class's students
+    ("week", monday)         best game_sessions score since Monday 00:00 UTC
+
+- warm() loads every all-time board in one query at startup; other boards
+  load on first read (one or two queries).
+- save_game_session() calls record() after committing, so the worker that
+  took the write serves it immediately.
+- Each worker keeps its own boards, so a board is re-read from the database
+  once it is LEADERBOARD_REFRESH_SECONDS old to pick up other workers'
+  writes.
+
+Usage:
+    leaderboards.top("speed_math", "hard", limit=10)
+    leaderboards.top("speed_math", "hard", class_id=7)
+    leaderboards.top("speed_math", "hard", weekly=True)
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import func, select, union
+
+from models import db, GameLeaderboard, GameSession, Student, student_classes
+
+LEADERBOARD_SIZE = 50  # entries kept per board - reads ask for up to this many
+LEADERBOARD_REFRESH_SECONDS = 60
+MAX_BOARDS = 2000  # least recently read boards are dropped past this
+
+
+# ============================================================
+# BOARDS
+# ============================================================
+
+def _sort_key(entry):
+    """Highest score first; ties go to the lower student id, like the queries below"""
+    return (-(entry["high_score"] or 0), entry["student_id"])
+
+
+def _best_time(*times):
+    times = [t for t in times if t is not None]
+    return min(times) if times else None
+
+
+def _week_start(at: datetime) -> datetime:
+    monday = at.date() - timedelta(days=at.weekday())
+    return datetime.combine(monday, datetime.min.time())
+
+
+class _Board:
+    """Top entries for one leaderboard, best first"""
+
+    def __init__(self, entries, size, members=None):
+        self.size = size
+        self.members = members  # student ids, for class boards
+        self.loaded_at = time.monotonic()
+        self.ranked: List[Dict] = []
+        self.entries: Dict[int, Dict] = {}
+        self._rank(entries)
+
+    def _rank(self, entries):
+        self.ranked = sorted(entries, key=_sort_key)[:self.size]
+        self.entries = {entry["student_id"]: entry for entry in self.ranked}
+
+    def qualifies(self, score) -> bool:
+        """Would a student not on the board get on with this score?"""
+        if len(self.ranked) < self.size:
+            return True
+        return -(score or 0) < _sort_key(self.ranked[-1])[0]
+
+    def put(self, entry):
+        entries = [e for e in self.ranked if e["student_id"] != entry["student_id"]]
+        entries.append(entry)
+        self._rank(entries)
+
+
+# ============================================================
+# QUERIES
+# ============================================================
+
+def _leaderboard_entry(row, student_name) -> Dict:
+    return {
+        "student_id": row.student_id,
+        "student_name": student_name,
+        "high_score": row.high_score,
+        "best_time": row.best_time,
+        "best_accuracy": row.best_accuracy,
+        "total_plays": row.total_plays,
+    }
+
+
+def _all_time_query(game_key, difficulty):
+    return (
+        select(GameLeaderboard.student_id, GameLeaderboard.high_score, GameLeaderboard.best_time,
+               GameLeaderboard.best_accuracy, GameLeaderboard.total_plays, Student.student_name)
+        .join(Student, GameLeaderboard.student_id == Student.id)
+        .where(GameLeaderboard.game_key == game_key, GameLeaderboard.difficulty == difficulty)
+        .order_by(GameLeaderboard.high_score.desc(), GameLeaderboard.student_id)
+    )
+
+
+def _class_members(class_id) -> set:
+    """Students in a class, through the roster table or the legacy class_id column"""
+    return set(db.session.execute(union(
+        select(student_classes.c.student_id).where(student_classes.c.class_id == class_id),
+        select(Student.id).where(Student.class_id == class_id),
+    )).scalars())
+
+
+def _weekly_query(game_key, difficulty, week_start):
+    return (
+        select(
+            GameSession.student_id,
+            Student.student_name,
+            func.max(GameSession.score).label("high_score"),
+            func.min(GameSession.time_seconds).label("best_time"),
+            func.max(GameSession.accuracy).label("best_accuracy"),
+            func.count(GameSession.id).label("total_plays"),
+        )
+        .join(Student, GameSession.student_id == Student.id)
+        .where(GameSession.game_key == game_key, GameSession.difficulty == difficulty,
+               GameSession.completed_at >= week_start)
+        .group_by(GameSession.student_id, Student.student_name)
+    )
+
+
+def _load(key, size) -> _Board:
+    game_key, difficulty, scope = key[0], key[1], key[2]
+
+    if scope == "all":
+        rows = db.session.execute(_all_time_query(game_key, difficulty).limit(size)).all()
+        return _Board([_leaderboard_entry(row, row.student_name) for row in rows], size)
+
+    if scope == "class":
+        members = _class_members(key[3])
+        rows = db.session.execute(
+            _all_time_query(game_key, difficulty).where(GameLeaderboard.student_id.in_(members)).limit(size)
+        ).all() if members else []
+        return _Board([_leaderboard_entry(row, row.student_name) for row in rows], size, members=members)
+
+    rows = db.session.execute(
+        _weekly_query(game_key, difficulty, key[3])
+        .order_by(func.max(GameSession.score).desc(), GameSession.student_id)
+        .limit(size)
+    ).all()
+    return _Board([_leaderboard_entry(row, row.student_name) for row in rows], size)
+
+
+# ============================================================
+# CACHE
+# ============================================================
+
+class LeaderboardCache:
+    """In-process top-N leaderboards, shared by the threads of one worker"""
+
+    def __init__(self, size=LEADERBOARD_SIZE, refresh_seconds=LEADERBOARD_REFRESH_SECONDS, max_boards=MAX_BOARDS):
+        self.size = size
+        self.refresh_seconds = refresh_seconds
+        self.max_boards = max_boards
+        self._boards: "OrderedDict[tuple, _Board]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _store(self, key, board):
+        with self._lock:
+            self._boards[key] = board
+            self._boards.move_to_end(key)
+            while len(self._boards) > self.max_boards:
+                self._boards.popitem(last=False)
+
+    def top(self, game_key, difficulty, limit=10, class_id=None, weekly=False) -> List[Dict]:
+        """The best `limit` entries (limit <= LEADERBOARD_SIZE)"""
+        if weekly:
+            key = (game_key, difficulty, "week", _week_start(datetime.utcnow()))
+        elif class_id is not None:
+            key = (game_key, difficulty, "class", class_id)
+        else:
+            key = (game_key, difficulty, "all")
+
+        with self._lock:
+            board = self._boards.get(key)
+            if board is not None:
+                self._boards.move_to_end(key)
+                if time.monotonic() - board.loaded_at < self.refresh_seconds:
+                    return [dict(entry) for entry in board.ranked[:limit]]
+
+        board = _load(key, self.size)
+        self._store(key, board)
+        return [dict(entry) for entry in board.ranked[:limit]]
+
+    def record(self, leaderboard: GameLeaderboard, game_session: GameSession):
+        """Apply a committed game to every cached board it belongs to"""
+        student_id = leaderboard.student_id
+        week = _week_start(game_session.completed_at or datetime.utcnow())
+
+        with self._lock:
+            boards = [
+                (key, board) for key, board in self._boards.items()
+                if key[:2] == (leaderboard.game_key, leaderboard.difficulty)
+                and (key[2] != "class" or student_id in board.members)
+                and (key[2] != "week" or key[3] == week)
+            ]
+
+        student_name = None
+        for key, board in boards:
+            current = board.entries.get(student_id)
+            if key[2] == "week":
+                if current is None and not board.qualifies(game_session.score):
+                    continue
+                if current is None:
+                    # New to this week's board - earlier plays this week weren't on it
+                    row = db.session.execute(
+                        _weekly_query(leaderboard.game_key, leaderboard.difficulty, week)
+                        .where(GameSession.student_id == student_id)
+                    ).first()
+                    if row is None:
+                        continue
+                    entry = _leaderboard_entry(row, row.student_name)
+                else:
+                    entry = dict(
+                        current,
+                        high_score=max(current["high_score"] or 0, game_session.score or 0),
+                        best_time=_best_time(current["best_time"], game_session.time_seconds),
+                        best_accuracy=max(current["best_accuracy"] or 0, game_session.accuracy or 0),
+                        total_plays=current["total_plays"] + 1,
+                    )
+            else:
+                if current is None and not board.qualifies(leaderboard.high_score):
+                    continue
+                if current is not None:
+                    student_name = current["student_name"]
+                elif student_name is None:
+                    student_name = db.session.execute(
+                        select(Student.student_name).where(Student.id == student_id)
+                    ).scalar()
+                entry = _leaderboard_entry(leaderboard, student_name)
+
+            with self._lock:
+                board.put(entry)
+
+    def warm(self):
+        """Load every all-time board in one query (top LEADERBOARD_SIZE per game and difficulty)"""
+        ranked = (
+            select(
+                GameLeaderboard.game_key, GameLeaderboard.difficulty, GameLeaderboard.student_id,
+                GameLeaderboard.high_score, GameLeaderboard.best_time, GameLeaderboard.best_accuracy,
+                GameLeaderboard.total_plays, Student.student_name,
+                func.row_number().over(
+                    partition_by=(GameLeaderboard.game_key, GameLeaderboard.difficulty),
+                    order_by=(GameLeaderboard.high_score.desc(), GameLeaderboard.student_id),
+                ).label("rn"),
+            )
+            .join(Student, GameLeaderboard.student_id == Student.id)
+            .subquery()
+        )
+        rows = db.session.execute(select(ranked).where(ranked.c.rn <= self.size)).all()
+
+        boards: Dict[tuple, List[Dict]] = {}
+        for row in rows:
+            boards.setdefault((row.game_key, row.difficulty, "all"), []).append(
+                _leaderboard_entry(row, row.student_name)
+            )
+        for key, entries in boards.items():
+            self._store(key, _Board(entries, self.size))
+        return len(boards)
+
+    def clear(self):
+        with self._lock:
+            self._boards.clear()
+
+
+leaderboards = LeaderboardCache()
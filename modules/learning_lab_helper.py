@@ -111,8 +111,9 @@ def generate_strengths_summary(quiz_answers):
 def send_parent_notification(student_id, profile):
     """
     Send email notification to parent about child's learning profile.
+    The email job is saved by the caller's commit.
     """
-    from app import mail
+    from modules.job_queue import queue_email
 
     student = Student.query.get(student_id)
     if not student or not student.parent_id:
@@ -290,18 +291,19 @@ View full profile: https://cozmiclearning.com/parent/analytics
     )
 
     try:
-        mail.send(msg)
+        queue_email(msg, commit=False)
         return True
     except Exception as e:
-        print(f"Failed to send parent notification: {e}")
+        print(f"Failed to queue parent notification: {e}")
         return False
 
 
 def send_teacher_notification(student_id, profile):
     """
     Send notification to teacher about student's learning profile (for assigned classes).
+    The email jobs are saved by the caller's commit.
     """
-    from app import mail
+    from modules.job_queue import queue_email
 
     student = Student.query.get(student_id)
     if not student:
@@ -400,11 +402,8 @@ def send_teacher_notification(student_id, profile):
             html=html_body
         )
 
-        try:
-            mail.send(msg)
-            sent_count += 1
-        except Exception as e:
-            print(f"Failed to send teacher notification to {teacher.email}: {e}")
+        queue_email(msg, commit=False)
+        sent_count += 1
 
     return sent_count > 0
 
@@ -798,6 +797,7 @@ def get_study_tips_for_topic(student_id, topic_or_lesson_title, subject=None):
 def send_parent_notification_flagged_content(student_id, message_content, flag_reason, flag_categories):
     """
     Send email notification to parent about flagged AI Study Buddy content.
+    The email job is saved by the caller's commit.
 
     Args:
         student_id: ID of the student
@@ -806,9 +806,9 @@ def send_parent_notification_flagged_content(student_id, message_content, flag_r
         flag_categories: Dictionary of flagged categories from moderation
 
     Returns:
-        bool: True if notification sent successfully
+        bool: True if the notification email was queued
     """
-    from app import mail
+    from modules.job_queue import queue_email
 
     student = Student.query.get(student_id)
     if not student or not student.parent_id:
@@ -1004,10 +1004,10 @@ View student activity: https://cozmiclearning.com/parent/analytics
     )
 
     try:
-        mail.send(msg)
+        queue_email(msg, commit=False)
         return True
     except Exception as e:
-        print(f"Failed to send parent notification for flagged content: {e}")
+        print(f"Failed to queue parent notification for flagged content: {e}")
         return False
 
 
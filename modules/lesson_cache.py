@@ -0,0 +1,270 @@
+"""
+Shared Lesson Content Cache
+===========================
+Database-backed cache of generated lessons, shared by every student.
+
+- Keyed by (subject, grade, topic, chapter, character) + LESSON_CONTENT_VERSION
+- Entries expire after LESSON_CACHE_TTL_DAYS and can be invalidated by admins
+- Single-flight: on a cold miss only one request generates the lesson.
+  Threads in the same worker wait on an in-process event; other gunicorn
+  workers see a "pending" row and poll until it turns "ready".
+"""
+
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, LessonContentCache
+
+
+# ============================================================
+# CACHE CONFIGURATION
+# ============================================================
+
+# Bump when the lesson prompt/format in student_lessons.py changes -
+# rows from older versions are ignored and regenerated on demand.
+LESSON_CONTENT_VERSION = 1
+
+LESSON_CACHE_TTL_DAYS = 90
+
+# How long requests wait for another request's generation before giving up
+GENERATION_WAIT_SECONDS = 75
+POLL_INTERVAL_SECONDS = 0.5
+
+# A "pending" row older than this is assumed abandoned (crashed worker)
+STALE_CLAIM_SECONDS = 120
+
+# In-process single-flight: cache key -> {"event": Event, "result": dict}
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _key_filters(subject, grade, topic, chapter_id, character):
+    """Column filters for one cache entry at the current content version"""
+    return {
+        "subject": subject,
+        "grade": str(grade),
+        "topic": topic,
+        "chapter_id": chapter_id or "",
+        "character": character,
+        "content_version": LESSON_CONTENT_VERSION,
+    }
+
+
+# ============================================================
+# LOOKUP + STORE
+# ============================================================
+
+def get_cached_lesson(subject, grade, topic, character, chapter_id=None):
+    """
+    Return a cached lesson dict, or None on a miss or expired entry.
+    """
+    entry = LessonContentCache.query.filter_by(
+        status="ready",
+        **_key_filters(subject, grade, topic, chapter_id, character)
+    ).first()
+
+    if not entry or not entry.lesson_json:
+        return None
+    if entry.expires_at and entry.expires_at <= datetime.utcnow():
+        return None
+
+    return json.loads(entry.lesson_json)
+
+
+def store_lesson(subject, grade, topic, character, lesson, chapter_id=None):
+    """Store (or replace) a generated lesson as ready"""
+    filters = _key_filters(subject, grade, topic, chapter_id, character)
+    entry = LessonContentCache.query.filter_by(**filters).first()
+    if not entry:
+        entry = LessonContentCache(**filters)
+        db.session.add(entry)
+
+    entry.status = "ready"
+    entry.lesson_json = json.dumps(lesson)
+    entry.created_at = datetime.utcnow()
+    entry.expires_at = datetime.utcnow() + timedelta(days=LESSON_CACHE_TTL_DAYS)
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker stored the same lesson first - theirs is just as good
+        db.session.rollback()
+
+
+# ============================================================
+# CROSS-WORKER CLAIMS
+# ============================================================
+
+def _claim_generation(filters):
+    """
+    Insert a "pending" row so other workers wait instead of generating.
+    Returns the claim (row id, created_at) if this request now owns the
+    generation, else None.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=STALE_CLAIM_SECONDS)
+    LessonContentCache.query.filter(
+        LessonContentCache.status == "pending",
+        LessonContentCache.created_at < stale_before,
+        *[getattr(LessonContentCache, col) == value for col, value in filters.items()]
+    ).delete(synchronize_session=False)
+
+    # Expired ready rows are replaced by the fresh generation
+    LessonContentCache.query.filter(
+        LessonContentCache.status == "ready",
+        LessonContentCache.expires_at <= datetime.utcnow(),
+        *[getattr(LessonContentCache, col) == value for col, value in filters.items()]
+    ).delete(synchronize_session=False)
+
+    claim = LessonContentCache(status="pending", created_at=datetime.utcnow(), **filters)
+    db.session.add(claim)
+    try:
+        db.session.commit()
+        return (claim.id, claim.created_at)
+    except IntegrityError:
+        db.session.rollback()
+        return None
+
+
+def _release_claim(claim):
+    """
+    Drop our pending claim after a failed generation so others can retry.
+    A claim taken over by another worker (ours went stale) is left alone.
+    """
+    claim_id, claimed_at = claim
+    LessonContentCache.query.filter_by(
+        id=claim_id, status="pending", created_at=claimed_at
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _wait_for_other_worker(subject, grade, topic, character, chapter_id):
+    """Poll until another worker's generation is ready. Returns lesson or None."""
+    filters = _key_filters(subject, grade, topic, chapter_id, character)
+    deadline = time.monotonic() + GENERATION_WAIT_SECONDS
+
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL_SECONDS)
+        db.session.expire_all()
+
+        lesson = get_cached_lesson(subject, grade, topic, character, chapter_id)
+        if lesson:
+            return lesson
+
+        # Claim released (generation failed) - stop waiting
+        if not LessonContentCache.query.filter_by(**filters).first():
+            return None
+
+    return None
+
+
+def _generate_and_store(subject, grade, topic, character, chapter_id, generate):
+    """Generate a lesson once across all workers and store it"""
+    filters = _key_filters(subject, grade, topic, chapter_id, character)
+
+    claim = _claim_generation(filters)
+    if not claim:
+        lesson = _wait_for_other_worker(subject, grade, topic, character, chapter_id)
+        if lesson:
+            return {"success": True, "lesson": lesson, "cached": True}
+        # Other worker failed or timed out - generate it ourselves
+
+    try:
+        result = generate()
+    except Exception as e:
+        print(f"Error generating lesson for cache: {e}")
+        result = {"success": False, "error": "AI service error. Please try again."}
+
+    try:
+        if result.get("success"):
+            store_lesson(subject, grade, topic, character, result["lesson"], chapter_id)
+        elif claim:
+            _release_claim(claim)
+    except Exception as e:
+        print(f"⚠️ Could not update lesson cache: {e}")
+        db.session.rollback()
+
+    return result
+
+
+# ============================================================
+# PUBLIC API
+# ============================================================
+
+def get_or_generate_lesson(subject, grade, topic, character, generate, chapter_id=None):
+    """
+    Return a lesson from the shared cache, generating it on a cold miss.
+
+    Args:
+        generate: zero-argument callable returning the generate_student_lesson() result
+
+    Returns:
+        Same shape as generate_student_lesson(): {"success": bool, "lesson": dict, ...}
+        plus "cached": True when served from the cache.
+    """
+    lesson = get_cached_lesson(subject, grade, topic, character, chapter_id)
+    if lesson:
+        return {"success": True, "lesson": lesson, "cached": True}
+
+    key = tuple(_key_filters(subject, grade, topic, chapter_id, character).values())
+
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        is_leader = flight is None
+        if is_leader:
+            flight = {"event": threading.Event(), "result": None}
+            _inflight[key] = flight
+
+    if not is_leader:
+        flight["event"].wait(GENERATION_WAIT_SECONDS)
+        if flight["result"] is not None:
+            return flight["result"]
+        return generate()
+
+    try:
+        flight["result"] = _generate_and_store(subject, grade, topic, character, chapter_id, generate)
+        return flight["result"]
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        flight["event"].set()
+
+
+def invalidate_lessons(subject=None, grade=None, topic=None, chapter_id=None, character=None):
+    """
+    Delete cached lessons matching the given filters (all versions).
+    Call with no arguments to clear the whole cache.
+
+    Returns:
+        Number of cached lessons removed
+    """
+    query = LessonContentCache.query
+    if subject:
+        query = query.filter_by(subject=subject)
+    if grade is not None:
+        query = query.filter_by(grade=str(grade))
+    if topic:
+        query = query.filter_by(topic=topic)
+    if chapter_id:
+        query = query.filter_by(chapter_id=chapter_id)
+    if character:
+        query = query.filter_by(character=character)
+
+    removed = query.delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def purge_expired_lessons():
+    """Delete expired and outdated-version lessons. Returns rows removed."""
+    removed = LessonContentCache.query.filter(
+        db.or_(
+            LessonContentCache.expires_at <= datetime.utcnow(),
+            LessonContentCache.content_version != LESSON_CONTENT_VERSION
+        )
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
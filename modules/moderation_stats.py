@@ -0,0 +1,202 @@
+# modules/moderation_stats.py
+"""
+Moderation statistics.
+
+Counts question logs for the admin moderation dashboard (total, flagged,
+blocked, parent notifications, severity breakdown) without one COUNT per
+number:
+
+- Completed UTC days are pre-aggregated into moderation_daily_stats the
+  first time they are asked for, in one grouped query. Long periods
+  ("all time", 90 days) sum those rows instead of scanning question_logs.
+- The parts of the period that aren't whole completed days (today, and the
+  partial first day) are counted from question_logs in a single
+  conditional-aggregate query over idx_question_log_moderation, which
+  covers every column it reads.
+
+Logs change after the fact only when an admin notifies a parent; that
+route calls invalidate_day() so the day is re-aggregated on next view.
+
+Usage:
+    summary = moderation_summary(start_date, trend_days=14)
+    summary["counts"]["flagged"], summary["daily_flagged"]
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.exc import IntegrityError
+
+from models import db, ModerationDailyStat, QuestionLog
+
+COUNTERS = ("total", "flagged", "blocked", "notified", "high", "medium", "low")
+
+
+# ============================================================
+# QUERIES
+# ============================================================
+
+def _counter_columns():
+    """Every counter as one conditional aggregate over question_logs"""
+    def when(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    return [
+        func.count().label("total"),
+        when(QuestionLog.flagged == True).label("flagged"),
+        when(QuestionLog.allowed == False).label("blocked"),
+        when(QuestionLog.parent_notified == True).label("notified"),
+        when(QuestionLog.severity == "high").label("high"),
+        when(QuestionLog.severity == "medium").label("medium"),
+        when(QuestionLog.severity == "low").label("low"),
+    ]
+
+
+def _as_date(value) -> date:
+    """func.date() returns a date on PostgreSQL and a string on SQLite"""
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, time.min)
+
+
+def _empty_counts() -> Dict[str, int]:
+    return {name: 0 for name in COUNTERS}
+
+
+# ============================================================
+# DAILY BUCKETS
+# ============================================================
+
+def ensure_buckets(first_day: date, last_day: date):
+    """
+    Make sure every completed day in [first_day, last_day] has a bucket.
+    Missing days are aggregated together in one grouped query.
+    """
+    if first_day > last_day:
+        return
+
+    existing = set(db.session.execute(
+        select(ModerationDailyStat.day)
+        .where(ModerationDailyStat.day >= first_day, ModerationDailyStat.day <= last_day)
+    ).scalars())
+
+    span = (last_day - first_day).days + 1
+    if len(existing) == span:
+        return
+
+    # Days before the first log are known to be empty - don't store them
+    first_log = db.session.execute(select(func.min(QuestionLog.created_at))).scalar()
+    if first_log is None:
+        return
+    first_day = max(first_day, first_log.date())
+
+    missing = [
+        first_day + timedelta(days=i)
+        for i in range((last_day - first_day).days + 1)
+        if first_day + timedelta(days=i) not in existing
+    ]
+    if not missing:
+        return
+
+    log_day = func.date(QuestionLog.created_at)
+    rows = db.session.execute(
+        select(log_day.label("day"), *_counter_columns())
+        .where(QuestionLog.created_at >= _midnight(missing[0]),
+               QuestionLog.created_at < _midnight(missing[-1] + timedelta(days=1)))
+        .group_by(log_day)
+    ).all()
+    by_day = {_as_date(row.day): row for row in rows}
+
+    for day in missing:
+        row = by_day.get(day)
+        db.session.add(ModerationDailyStat(
+            day=day, **{name: (getattr(row, name) if row else 0) for name in COUNTERS}
+        ))
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request aggregated the same days first - theirs are identical
+        db.session.rollback()
+
+
+def invalidate_day(day: date):
+    """Drop a completed day's bucket after one of its logs changed. The caller commits."""
+    if day < datetime.utcnow().date():
+        ModerationDailyStat.query.filter_by(day=day).delete(synchronize_session=False)
+
+
+# ============================================================
+# SUMMARY
+# ============================================================
+
+def moderation_summary(start: datetime, trend_days: int = 14, now: datetime = None) -> Dict:
+    """
+    Moderation counters for logs created since `start`, plus flagged
+    counts for each of the last `trend_days` days (today included).
+
+    Returns:
+        {"counts": {"total", "flagged", "blocked", "notified", "high", "medium", "low"},
+         "daily_flagged": [(date, flagged), ...]}   # oldest first
+    """
+    now = now or datetime.utcnow()
+    today = now.date()
+    today_start = _midnight(today)
+
+    first_full_day = start.date() if start == _midnight(start.date()) else start.date() + timedelta(days=1)
+    first_full_day = min(first_full_day, today)
+    trend_first_day = today - timedelta(days=max(trend_days, 1) - 1)
+    yesterday = today - timedelta(days=1)
+
+    ensure_buckets(min(first_full_day, trend_first_day), yesterday)
+
+    # Completed days in the period
+    counts = _empty_counts()
+    if first_full_day <= yesterday:
+        totals = db.session.execute(
+            select(*[func.coalesce(func.sum(getattr(ModerationDailyStat, name)), 0).label(name) for name in COUNTERS])
+            .where(ModerationDailyStat.day >= first_full_day, ModerationDailyStat.day <= yesterday)
+        ).one()
+        counts = {name: int(getattr(totals, name)) for name in COUNTERS}
+
+    # Today plus the partial first day, straight from the log
+    edge_end = max(start, _midnight(first_full_day))
+    segment = case((QuestionLog.created_at >= today_start, "today"), else_="edge").label("segment")
+    raw = {
+        row.segment: row for row in db.session.execute(
+            select(segment, *_counter_columns())
+            .where(or_(
+                and_(QuestionLog.created_at >= start, QuestionLog.created_at < edge_end),
+                QuestionLog.created_at >= max(start, today_start),
+            ))
+            .group_by(segment)
+        ).all()
+    }
+    for row in raw.values():
+        for name in COUNTERS:
+            counts[name] += int(getattr(row, name))
+
+    # Flagged per day for the trend chart
+    flagged_by_day = dict(db.session.execute(
+        select(ModerationDailyStat.day, ModerationDailyStat.flagged)
+        .where(ModerationDailyStat.day >= trend_first_day, ModerationDailyStat.day <= yesterday)
+    ).all())
+    flagged_by_day[today] = int(raw["today"].flagged) if "today" in raw else 0
+
+    daily_flagged: List[Tuple[date, int]] = []
+    for i in range(trend_days):
+        day = trend_first_day + timedelta(days=i)
+        daily_flagged.append((day, flagged_by_day.get(day, 0)))
+
+    return {"counts": counts, "daily_flagged": daily_flagged}
+
+
+def ensure_moderation_index():
+    """Create idx_question_log_moderation on databases that predate it"""
+    for index in QuestionLog.__table__.indexes:
+        if index.name == "idx_question_log_moderation":
+            index.create(db.engine, checkfirst=True)
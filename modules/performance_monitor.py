@@ -5,46 +5,244 @@ Performance Monitoring System for CozmicLearning
 Tracks:
 - User signups/logins
 - AI question volume
-- Response times
+- Response times (p50/p95/p99 per route and per AI feature)
 - Error rates
 - Active users
+- Cache hit rates (answer cache, ...)
+
+Every gunicorn worker counts into per-thread shards (no locks on the hot
+path); a background thread flushes the deltas to a shared store every
+METRICS_FLUSH_SECONDS. Latencies go into fixed-bucket histograms, so
+percentiles can be merged across workers and days. Summaries read the
+merged store, so every worker reports the same numbers and nothing is lost
+on restart.
 
 Usage:
     from modules.performance_monitor import track_event, get_metrics_summary
 
+    # Once, at startup (without it metrics stay in this process)
+    init_metrics_store(app, db)
+
     # Track events
     track_event('signup', user_type='student')
     track_event('ai_question', subject='num_forge', response_time=3.2)
+    track_event('request', route='/subject', response_time=0.4)
+    track_event('cache', cache='answer', outcome='hit')
 
     # Get summary
     summary = get_metrics_summary()
 """
 
+import atexit
 import os
-import json
+import threading
+import time
+import weakref
+from bisect import bisect_left
 from datetime import datetime, timedelta
 from collections import defaultdict
 import logging
 
+from sqlalchemy import and_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import MetricCounter
+
 logger = logging.getLogger(__name__)
 
 
 # -------------------------------------------------------
-# IN-MEMORY METRICS STORAGE
-# (For production, use Redis or database)
+# CONFIGURATION
 # -------------------------------------------------------
-_metrics = {
-    'signups': defaultdict(int),      # {date: count}
-    'logins': defaultdict(int),       # {date: count}
-    'ai_questions': defaultdict(int), # {date: count}
-    'errors': defaultdict(int),       # {date: count}
-    'response_times': [],             # [time1, time2, ...]
-    'active_users': set(),            # {user_id1, user_id2, ...}
-}
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "30"))
+
+# Latency histogram bucket upper bounds (ms); one extra bucket catches the rest
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
 
-_daily_metrics = {
-    'last_reset': datetime.utcnow().date()
-}
+# Outcomes that count as a cache hit when computing hit rates
+CACHE_HIT_OUTCOMES = ('hit', 'near_hit')
+
+# Daily counters shown on the dashboard
+DAILY_COUNTERS = ('signups', 'logins', 'ai_questions', 'errors')
+
+
+# -------------------------------------------------------
+# PER-THREAD SHARDS
+# -------------------------------------------------------
+class _Shard:
+    """
+    Counters written by exactly one thread, so increments need no lock.
+    The flusher copies `counts` and remembers what it already sent.
+    A shard is retired when its thread moves on to a new day or exits
+    (request, SSE and executor threads are short-lived); the next flush
+    sends what is left and drops it.
+    """
+    __slots__ = ('counts', 'flushed', 'day', 'retired', 'thread')
+
+    def __init__(self, day):
+        self.counts = {}   # (day, name, label, field) -> value
+        self.flushed = {}  # same keys, value already sent to the store
+        self.day = day
+        self.retired = False
+        self.thread = weakref.ref(threading.current_thread())
+
+    def finished(self):
+        """No more writes can come: retired, or the owning thread has exited"""
+        if self.retired:
+            return True
+        thread = self.thread()
+        return thread is None or not thread.is_alive()
+
+
+_shards = []
+_shards_lock = threading.Lock()  # only taken when a shard is created or dropped
+_local = threading.local()
+
+
+def _shard(day):
+    shard = getattr(_local, 'shard', None)
+    if shard is None or shard.day != day:
+        if shard is not None:
+            shard.retired = True
+        shard = _Shard(day)
+        _local.shard = shard
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
+
+
+def _add(shard, name, label, field='count', amount=1):
+    key = (shard.day, name, str(label), field)
+    shard.counts[key] = shard.counts.get(key, 0) + amount
+
+
+def _observe(shard, name, label, seconds):
+    """Add one latency sample to a histogram"""
+    ms = seconds * 1000
+    _add(shard, name, label, 'count')
+    _add(shard, name, label, 'sum', ms)
+    _add(shard, name, label, f'b{bisect_left(LATENCY_BUCKETS_MS, ms)}')
+
+
+# -------------------------------------------------------
+# SHARED STORES
+# -------------------------------------------------------
+class SqlMetricsBackend:
+    """
+    Metric totals in the metric_counters table (SQLite or PostgreSQL).
+    Deltas are applied with INSERT ... ON CONFLICT DO UPDATE, so workers
+    flushing at the same time add up instead of overwriting each other.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.table = MetricCounter.__table__
+
+    def _upsert(self, conn, values):
+        dialect = {'postgresql': postgresql, 'sqlite': sqlite}.get(self.engine.dialect.name)
+        if dialect is not None:
+            stmt = dialect.insert(self.table).values(**values)
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=['day', 'name', 'label', 'field'],
+                set_={'value': self.table.c.value + stmt.excluded.value},
+            ))
+            return
+
+        updated = conn.execute(
+            update(self.table)
+            .where(and_(*(self.table.c[col] == values[col] for col in ('day', 'name', 'label', 'field'))))
+            .values(value=self.table.c.value + values['value'])
+        ).rowcount
+        if not updated:
+            conn.execute(self.table.insert().values(**values))
+
+    def add(self, deltas):
+        with self.engine.begin() as conn:
+            for (day, name, label, field), amount in deltas.items():
+                self._upsert(conn, {'day': day, 'name': name, 'label': label, 'field': field, 'value': amount})
+
+    def read(self, since):
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(self.table.c.day, self.table.c.name, self.table.c.label,
+                       self.table.c.field, self.table.c.value)
+                .where(self.table.c.day >= since)
+            ).all()
+        return {(r.day, r.name, r.label, r.field): r.value for r in rows}
+
+
+class MemoryMetricsBackend:
+    """Process-local store (used until init_metrics_store() is called, e.g. in scripts)"""
+
+    def __init__(self):
+        self._totals = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def add(self, deltas):
+        with self._lock:
+            for key, amount in deltas.items():
+                self._totals[key] += amount
+
+    def read(self, since):
+        with self._lock:
+            return {key: value for key, value in self._totals.items() if key[0] >= since}
+
+
+_backend = MemoryMetricsBackend()
+_flush_lock = threading.Lock()
+_flusher_pid = None
+
+
+def init_metrics_store(app, db):
+    """Send metrics from every worker to the metric_counters table"""
+    global _backend
+    with app.app_context():
+        _backend = SqlMetricsBackend(db.engine)
+
+
+def flush_metrics():
+    """Send unflushed counts from every thread's shard to the store"""
+    with _flush_lock:
+        with _shards_lock:
+            shards = list(_shards)
+
+        for shard in shards:
+            retired = shard.finished()  # read first: a finished shard gets no more writes
+            counts = shard.counts.copy()
+            deltas = {key: value - shard.flushed.get(key, 0) for key, value in counts.items()}
+            deltas = {key: delta for key, delta in deltas.items() if delta}
+
+            if deltas:
+                try:
+                    _backend.add(deltas)
+                except Exception as e:
+                    logger.error(f"Error flushing metrics (will retry): {e}")
+                    return
+            shard.flushed = counts
+
+            if retired:
+                with _shards_lock:
+                    _shards.remove(shard)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        flush_metrics()
+
+
+def _ensure_flusher():
+    """Start the flush thread once per process (gunicorn forks after import)"""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _flush_lock:
+        if _flusher_pid != os.getpid():
+            threading.Thread(target=_flush_loop, daemon=True, name="metrics-flush").start()
+            _flusher_pid = os.getpid()
+
+
+atexit.register(flush_metrics)
 
 
 # -------------------------------------------------------
@@ -55,66 +253,169 @@ def track_event(event_type: str, **kwargs):
     Track a performance event.
 
     Args:
-        event_type: 'signup', 'login', 'ai_question', 'error', 'page_view'
-        **kwargs: Additional context (user_type, subject, response_time, etc.)
+        event_type: 'signup', 'login', 'ai_question', 'request', 'error', 'page_view', 'cache'
+        **kwargs: Additional context (user_type, subject, route, response_time, etc.)
 
     Examples:
         track_event('signup', user_type='student')
         track_event('login', user_id=123)
         track_event('ai_question', subject='num_forge', response_time=3.2)
+        track_event('request', route='/subject', response_time=0.4)
         track_event('error', error_type='timeout', route='/ask')
+        track_event('cache', cache='answer', outcome='near_hit')  # hit / near_hit / miss / bypass
     """
-    today = datetime.utcnow().date()
-
-    # Reset daily metrics if new day
-    if _daily_metrics['last_reset'] != today:
-        reset_daily_metrics()
-
     try:
+        _ensure_flusher()
+        shard = _shard(datetime.utcnow().date())
+
         if event_type == 'signup':
-            _metrics['signups'][str(today)] += 1
             user_type = kwargs.get('user_type', 'unknown')
+            _add(shard, 'signups', user_type)
             logger.info(f"📊 METRIC: New {user_type} signup")
 
         elif event_type == 'login':
-            _metrics['logins'][str(today)] += 1
             user_id = kwargs.get('user_id')
+            _add(shard, 'logins', kwargs.get('user_type', 'unknown'))
             if user_id:
-                _metrics['active_users'].add(user_id)
+                _add(shard, 'active_user', user_id)
             logger.info(f"📊 METRIC: User login (ID: {user_id})")
 
         elif event_type == 'ai_question':
-            _metrics['ai_questions'][str(today)] += 1
             subject = kwargs.get('subject', 'unknown')
             response_time = kwargs.get('response_time', 0)
+            _add(shard, 'ai_questions', subject)
             if response_time:
-                _metrics['response_times'].append(response_time)
+                _observe(shard, 'ai_latency', subject, response_time)
             logger.info(f"📊 METRIC: AI question - {subject} ({response_time:.2f}s)")
 
+        elif event_type == 'request':
+            _observe(shard, 'route_latency', kwargs.get('route', 'unknown'), kwargs.get('response_time', 0))
+
         elif event_type == 'error':
-            _metrics['errors'][str(today)] += 1
             error_type = kwargs.get('error_type', 'unknown')
             route = kwargs.get('route', 'unknown')
+            _add(shard, 'errors', error_type)
             logger.error(f"📊 METRIC: Error - {error_type} on {route}")
 
+        elif event_type == 'cache':
+            cache_name = kwargs.get('cache', 'unknown')
+            outcome = kwargs.get('outcome', 'miss')
+            _add(shard, 'cache', cache_name, outcome)
+            logger.debug(f"📊 METRIC: {cache_name} cache {outcome}")
+
         elif event_type == 'page_view':
             # Track page views if needed
             page = kwargs.get('page', 'unknown')
             logger.debug(f"📊 METRIC: Page view - {page}")
 
-        # Keep response_times list manageable (last 1000 only)
-        if len(_metrics['response_times']) > 1000:
-            _metrics['response_times'] = _metrics['response_times'][-1000:]
-
     except Exception as e:
         logger.error(f"Error tracking metric: {e}")
 
 
-def reset_daily_metrics():
-    """Reset metrics for new day."""
-    _daily_metrics['last_reset'] = datetime.utcnow().date()
-    _metrics['active_users'].clear()
-    logger.info("📊 Daily metrics reset")
+# -------------------------------------------------------
+# READING THE STORE
+# -------------------------------------------------------
+def _read_window(days: int) -> dict:
+    """Merged totals for the last N days (this worker's unflushed counts included)"""
+    flush_metrics()
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    try:
+        return _backend.read(since)
+    except Exception as e:
+        logger.error(f"Error reading metrics: {e}")
+        return {}
+
+
+def _percentile(buckets: list, count: float, q: float) -> float:
+    """Estimate a percentile (ms) from histogram bucket counts"""
+    target = q * count
+    seen = 0
+    for index, in_bucket in enumerate(buckets):
+        if in_bucket and seen + in_bucket >= target:
+            lower = LATENCY_BUCKETS_MS[index - 1] if index > 0 else 0
+            if index >= len(LATENCY_BUCKETS_MS):
+                return float(lower)  # overflow bucket has no upper bound
+            upper = LATENCY_BUCKETS_MS[index]
+            return lower + (upper - lower) * (target - seen) / in_bucket
+        seen += in_bucket
+    return 0.0
+
+
+def _histograms(totals: dict, name: str) -> dict:
+    """{label: {'count', 'sum', 'buckets'}} for one histogram, merged across days"""
+    merged = defaultdict(lambda: {'count': 0, 'sum': 0.0, 'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1)})
+    for (_, metric, label, field), value in totals.items():
+        if metric != name:
+            continue
+        if field.startswith('b'):
+            merged[label]['buckets'][int(field[1:])] += value
+        else:
+            merged[label][field] += value
+    return merged
+
+
+def _latency_summary(histogram: dict) -> dict:
+    count = histogram['count']
+    return {
+        'count': int(count),
+        'avg': round(histogram['sum'] / count / 1000, 2) if count else 0.0,
+        'p50': round(_percentile(histogram['buckets'], count, 0.50) / 1000, 2),
+        'p95': round(_percentile(histogram['buckets'], count, 0.95) / 1000, 2),
+        'p99': round(_percentile(histogram['buckets'], count, 0.99) / 1000, 2),
+    }
+
+
+def get_latency_stats(days: int = 1, totals: dict = None) -> dict:
+    """
+    Latency percentiles (seconds) across all workers.
+
+    Returns:
+        {'routes': {route: {'count', 'avg', 'p50', 'p95', 'p99'}},
+         'ai_features': {subject: {...}}}
+    """
+    totals = totals if totals is not None else _read_window(days)
+    return {
+        'routes': {label: _latency_summary(h) for label, h in _histograms(totals, 'route_latency').items()},
+        'ai_features': {label: _latency_summary(h) for label, h in _histograms(totals, 'ai_latency').items()},
+    }
+
+
+def _ai_latency_overall(totals: dict) -> dict:
+    overall = {'count': 0, 'sum': 0.0, 'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1)}
+    for histogram in _histograms(totals, 'ai_latency').values():
+        overall['count'] += histogram['count']
+        overall['sum'] += histogram['sum']
+        overall['buckets'] = [a + b for a, b in zip(overall['buckets'], histogram['buckets'])]
+    return _latency_summary(overall)
+
+
+# -------------------------------------------------------
+# CACHE STATS
+# -------------------------------------------------------
+def get_cache_stats(days: int = 1, totals: dict = None) -> dict:
+    """
+    Hit/miss counts per cache across all workers.
+
+    Returns:
+        {cache_name: {'hits': n, 'misses': n, 'hit_rate': pct, 'outcomes': {...}}}
+    """
+    totals = totals if totals is not None else _read_window(days)
+    caches = defaultdict(lambda: defaultdict(int))
+    for (_, name, cache_name, outcome), value in totals.items():
+        if name == 'cache':
+            caches[cache_name][outcome] += int(value)
+
+    stats = {}
+    for cache_name, outcomes in caches.items():
+        hits = sum(outcomes.get(o, 0) for o in CACHE_HIT_OUTCOMES)
+        lookups = hits + outcomes.get('miss', 0)
+        stats[cache_name] = {
+            'hits': hits,
+            'misses': outcomes.get('miss', 0),
+            'hit_rate': round(hits / lookups * 100, 1) if lookups else 0.0,
+            'outcomes': dict(outcomes),
+        }
+    return stats
 
 
 # -------------------------------------------------------
@@ -122,7 +423,7 @@ def reset_daily_metrics():
 # -------------------------------------------------------
 def get_metrics_summary(days: int = 7) -> dict:
     """
-    Get summary of metrics for last N days.
+    Get summary of metrics for last N days, merged across all workers.
 
     Args:
         days: Number of days to include (default 7)
@@ -131,35 +432,31 @@ def get_metrics_summary(days: int = 7) -> dict:
         dict with metrics summary
     """
     today = datetime.utcnow().date()
-    date_range = [(today - timedelta(days=i)).isoformat() for i in range(days)]
+    dates = [today - timedelta(days=i) for i in range(days)]
+    totals = _read_window(days)
 
-    # Calculate totals
-    total_signups = sum(_metrics['signups'].get(d, 0) for d in date_range)
-    total_logins = sum(_metrics['logins'].get(d, 0) for d in date_range)
-    total_questions = sum(_metrics['ai_questions'].get(d, 0) for d in date_range)
-    total_errors = sum(_metrics['errors'].get(d, 0) for d in date_range)
+    daily = {name: {d.isoformat(): 0 for d in dates} for name in DAILY_COUNTERS}
+    active_users_today = 0
+    for (day, name, _, field), value in totals.items():
+        if name in daily and field == 'count':
+            daily[name][day.isoformat()] += int(value)
+        elif name == 'active_user' and day == today:
+            active_users_today += 1
 
-    # Calculate average response time
-    response_times = _metrics['response_times']
-    avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-
-    # Active users today
-    active_users_count = len(_metrics['active_users'])
+    ai_latency = _ai_latency_overall(totals)
 
     summary = {
         'period': f'Last {days} days',
-        'total_signups': total_signups,
-        'total_logins': total_logins,
-        'total_ai_questions': total_questions,
-        'total_errors': total_errors,
-        'active_users_today': active_users_count,
-        'avg_response_time': round(avg_response_time, 2),
-        'daily_breakdown': {
-            'signups': {d: _metrics['signups'].get(d, 0) for d in date_range},
-            'logins': {d: _metrics['logins'].get(d, 0) for d in date_range},
-            'ai_questions': {d: _metrics['ai_questions'].get(d, 0) for d in date_range},
-            'errors': {d: _metrics['errors'].get(d, 0) for d in date_range},
-        }
+        'total_signups': sum(daily['signups'].values()),
+        'total_logins': sum(daily['logins'].values()),
+        'total_ai_questions': sum(daily['ai_questions'].values()),
+        'total_errors': sum(daily['errors'].values()),
+        'active_users_today': active_users_today,
+        'avg_response_time': ai_latency['avg'],
+        'ai_latency': ai_latency,
+        'latency': get_latency_stats(totals=totals),
+        'caches': get_cache_stats(totals=totals),
+        'daily_breakdown': daily,
     }
 
     return summary
@@ -178,7 +475,16 @@ def print_metrics_summary(days: int = 7):
     print(f"   AI Questions:   {summary['total_ai_questions']}")
     print(f"   Errors:         {summary['total_errors']}")
     print(f"   Active Today:   {summary['active_users_today']}")
-    print(f"   Avg Response:   {summary['avg_response_time']}s")
+    print(f"   Avg Response:   {summary['avg_response_time']}s "
+          f"(p95 {summary['ai_latency']['p95']}s, p99 {summary['ai_latency']['p99']}s)")
+    for cache_name, cache in summary['caches'].items():
+        print(f"   {cache_name.title()} cache: {cache['hit_rate']}% hits ({cache['hits']}/{cache['hits'] + cache['misses']})")
+
+    slowest = sorted(summary['latency']['routes'].items(), key=lambda item: item[1]['p95'], reverse=True)[:5]
+    if slowest:
+        print(f"\n🐢 SLOWEST ROUTES (p95):")
+        for route, stats in slowest:
+            print(f"   {route:<35} p50 {stats['p50']}s | p95 {stats['p95']}s | p99 {stats['p99']}s ({stats['count']} req)")
     print("="*60 + "\n")
 
 
@@ -187,24 +493,24 @@ def print_metrics_summary(days: int = 7):
 # -------------------------------------------------------
 def check_performance_alerts() -> list:
     """
-    Check for performance issues and return alerts.
+    Check for performance issues (today, all workers) and return alerts.
 
     Returns:
         list of alert messages
     """
     alerts = []
+    summary = get_metrics_summary(days=1)
 
     # Check response times
-    response_times = _metrics['response_times']
-    if response_times:
-        avg_response = sum(response_times) / len(response_times)
-        if avg_response > 5:
-            alerts.append(f"⚠️ High average response time: {avg_response:.2f}s")
+    if summary['ai_latency']['count']:
+        if summary['avg_response_time'] > 5:
+            alerts.append(f"⚠️ High average response time: {summary['avg_response_time']:.2f}s")
+        if summary['ai_latency']['p95'] > 15:
+            alerts.append(f"⚠️ Slow AI tail latency: p95 {summary['ai_latency']['p95']:.2f}s")
 
     # Check error rate
-    today = datetime.utcnow().date().isoformat()
-    errors_today = _metrics['errors'].get(today, 0)
-    questions_today = _metrics['ai_questions'].get(today, 0)
+    errors_today = summary['total_errors']
+    questions_today = summary['total_ai_questions']
 
     if questions_today > 0:
         error_rate = (errors_today / questions_today) * 100
@@ -212,56 +518,13 @@ def check_performance_alerts() -> list:
             alerts.append(f"⚠️ High error rate: {error_rate:.1f}%")
 
     # Check active users (approaching capacity)
-    active_users = len(_metrics['active_users'])
+    active_users = summary['active_users_today']
     if active_users > 40:
         alerts.append(f"⚠️ High concurrent users: {active_users} (approaching capacity)")
 
     return alerts
 
 
-# -------------------------------------------------------
-# SAVE/LOAD METRICS (PERSISTENCE)
-# -------------------------------------------------------
-def save_metrics_to_file(filepath: str = 'metrics_backup.json'):
-    """Save metrics to file for persistence."""
-    try:
-        metrics_serializable = {
-            'signups': dict(_metrics['signups']),
-            'logins': dict(_metrics['logins']),
-            'ai_questions': dict(_metrics['ai_questions']),
-            'errors': dict(_metrics['errors']),
-            'response_times': _metrics['response_times'],
-            'active_users': list(_metrics['active_users']),
-            'last_updated': datetime.utcnow().isoformat()
-        }
-
-        with open(filepath, 'w') as f:
-            json.dump(metrics_serializable, f, indent=2)
-
-        logger.info(f"Metrics saved to {filepath}")
-    except Exception as e:
-        logger.error(f"Error saving metrics: {e}")
-
-
-def load_metrics_from_file(filepath: str = 'metrics_backup.json'):
-    """Load metrics from file."""
-    try:
-        if os.path.exists(filepath):
-            with open(filepath, 'r') as f:
-                data = json.load(f)
-
-            _metrics['signups'] = defaultdict(int, data.get('signups', {}))
-            _metrics['logins'] = defaultdict(int, data.get('logins', {}))
-            _metrics['ai_questions'] = defaultdict(int, data.get('ai_questions', {}))
-            _metrics['errors'] = defaultdict(int, data.get('errors', {}))
-            _metrics['response_times'] = data.get('response_times', [])
-            _metrics['active_users'] = set(data.get('active_users', []))
-
-            logger.info(f"Metrics loaded from {filepath}")
-    except Exception as e:
-        logger.error(f"Error loading metrics: {e}")
-
-
 # -------------------------------------------------------
 # WEEKLY REPORT GENERATOR
 # -------------------------------------------------------
@@ -289,6 +552,7 @@ def generate_weekly_report() -> str:
    Errors:             {summary['total_errors']:>6}
    Active Users Today: {summary['active_users_today']:>6}
    Avg Response Time:  {summary['avg_response_time']:>6.2f}s
+   p95 Response Time:  {summary['ai_latency']['p95']:>6.2f}s
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
 📈 DAILY BREAKDOWN:
@@ -320,10 +584,3 @@ def generate_weekly_report() -> str:
     report += "\n" + "="*60 + "\n"
 
     return report
-
-
-# -------------------------------------------------------
-# INITIALIZE ON IMPORT
-# -------------------------------------------------------
-# Try to load existing metrics on startup
-load_metrics_from_file()
@@ -0,0 +1,384 @@
+# modules/performance_rollup.py
+"""
+Student performance rollups.
+
+Keeps per-student running totals up to date as scores are written, so
+ability tiers, dashboards and analytics read one row instead of
+re-reading raw AssessmentResult / StudentSubmission / GameSession rows.
+
+Each write updates the rollup rows it belongs to:
+    (student, source, "*", "*")          everything from that source
+    (student, source, subject, "*")      one subject (or arcade game)
+    (student, source, subject, topic)    one topic (assessments only)
+
+Every row holds all-time sums/counts plus a ring buffer of the last 20
+scores, from which the last-10 / previous-10 windows and trend delta are
+kept. Writes are O(1); rebuild_rollups() replays history after a
+migration or if rollups ever drift.
+
+Rows are created with INSERT ... ON CONFLICT DO NOTHING, so two requests
+writing a student's first score at once don't fail on the unique key.
+ensure_rollups() backfills students whose rollups don't cover their raw
+history (an existing deployment, or a deleted submission); the analytics
+pages call it before reading, and startup migrations call it for everyone.
+
+Usage:
+    db.session.add(result)
+    record_assessment(result)
+    update_student_ability(student)
+    db.session.commit()
+"""
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from models import (
+    db, AssessmentResult, AssignedPractice, GameSession, Student,
+    StudentPerformanceRollup, StudentSubmission,
+)
+
+ALL = "*"
+WINDOW_SIZE = 10
+RING_SIZE = 2 * WINDOW_SIZE
+
+ASSESSMENT = "assessment"
+ASSIGNMENT = "assignment"
+ARCADE = "arcade"
+
+_NO_PREVIOUS = object()
+
+_verified_students = set()  # rollups known to cover the student's history (this process)
+_verified_lock = threading.Lock()
+
+
+# ============================================================
+# ROLLUP MATH
+# ============================================================
+
+def _new_rollup(student_id, source, subject, topic):
+    return StudentPerformanceRollup(
+        student_id=student_id, source=source, subject=subject, topic=topic,
+        results_count=0, scored_count=0, score_sum=0.0, recent_scores_json="[]",
+        last_results=0, last_scored=0, last_sum=0.0, prev_scored=0, prev_sum=0.0,
+        trend_delta=0.0,
+    )
+
+
+def _apply(rollup, score, at, previous=_NO_PREVIOUS):
+    """
+    Add one score to a rollup (or swap `previous` for it, for a regrade).
+    Only the 20-entry ring buffer is touched, so this is O(1).
+    """
+    recent = json.loads(rollup.recent_scores_json or "[]")
+
+    if previous is _NO_PREVIOUS:
+        recent.insert(0, score)
+        del recent[RING_SIZE:]
+        rollup.results_count += 1
+    else:
+        if previous in recent:
+            recent[recent.index(previous)] = score
+        if previous is not None:
+            rollup.score_sum -= previous
+            rollup.scored_count -= 1
+
+    if score is not None:
+        rollup.score_sum += score
+        rollup.scored_count += 1
+
+    last = [s for s in recent[:WINDOW_SIZE] if s is not None]
+    prev = [s for s in recent[WINDOW_SIZE:] if s is not None]
+    rollup.recent_scores_json = json.dumps(recent)
+    rollup.last_results = len(recent[:WINDOW_SIZE])
+    rollup.last_scored = len(last)
+    rollup.last_sum = sum(last)
+    rollup.prev_scored = len(prev)
+    rollup.prev_sum = sum(prev)
+    rollup.trend_delta = round(sum(last) / len(last) - sum(prev) / len(prev), 2) if last and prev else 0.0
+    if at and (rollup.last_result_at is None or at > rollup.last_result_at):
+        rollup.last_result_at = at
+
+
+def _keys(source, subject, topic):
+    """Rollup rows one score contributes to"""
+    subject = subject or ""
+    keys = [(source, ALL, ALL), (source, subject, ALL)]
+    if topic is not None:
+        keys.append((source, subject, topic or ""))
+    return keys
+
+
+def recent_average(rollup) -> float:
+    """Average of the last 10 results, unscored ones counting as 0"""
+    if not rollup or not rollup.last_results:
+        return 0.0
+    return rollup.last_sum / rollup.last_results
+
+
+def overall_average(rollup) -> float:
+    """All-time average, unscored results counting as 0"""
+    if not rollup or not rollup.results_count:
+        return 0.0
+    return rollup.score_sum / rollup.results_count
+
+
+# ============================================================
+# INCREMENTAL UPDATES
+# ============================================================
+
+def record_score(student_id, source, score, subject=None, topic=None, at=None, previous=_NO_PREVIOUS):
+    """
+    Add one score to the student's rollups. The caller commits.
+
+    Args:
+        source: ASSESSMENT / ASSIGNMENT / ARCADE
+        score: 0-100, or None for an unscored result
+        topic: pass a topic to also keep a per-topic rollup
+        previous: the score being replaced, when a result is regraded
+    """
+    if not student_id:
+        return
+
+    at = at or datetime.utcnow()
+    for source_key, subject_key, topic_key in _keys(source, subject, topic):
+        _apply(_locked_rollup(student_id, source_key, subject_key, topic_key), score, at, previous)
+
+
+def _locked_rollup(student_id, source, subject, topic):
+    """The rollup row, locked for update; created first if missing (safe against concurrent creators)"""
+    query = (
+        StudentPerformanceRollup.query
+        .filter_by(student_id=student_id, source=source, subject=subject, topic=topic)
+        .with_for_update()
+    )
+    rollup = query.first()
+    if rollup is not None:
+        return rollup
+
+    table = StudentPerformanceRollup.__table__
+    values = {
+        column.name: getattr(_new_rollup(student_id, source, subject, topic), column.name)
+        for column in table.columns if column.name not in ("id", "last_result_at", "updated_at")
+    }
+    dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(db.session.get_bind().dialect.name)
+    if dialect is not None:
+        db.session.execute(
+            dialect.insert(table).values(**values)
+            .on_conflict_do_nothing(index_elements=["student_id", "source", "subject", "topic"])
+        )
+    else:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(**values))
+        except IntegrityError:
+            pass  # Created by a concurrent request first
+    return query.first()
+
+
+def record_assessment(result: AssessmentResult):
+    """Roll up a new AssessmentResult"""
+    record_score(
+        result.student_id, ASSESSMENT, result.score_percent,
+        subject=result.subject, topic=result.topic or "", at=result.created_at,
+    )
+
+
+def record_submission(submission: StudentSubmission, subject: Optional[str], previous_score=_NO_PREVIOUS):
+    """Roll up a graded submission. Pass previous_score when regrading."""
+    if submission.score is None and previous_score is _NO_PREVIOUS:
+        return
+    record_score(
+        submission.student_id, ASSIGNMENT, submission.score,
+        subject=subject, at=submission.graded_at, previous=previous_score,
+    )
+
+
+def record_game_session(game_session: GameSession):
+    """Roll up a completed arcade game (accuracy, per game_key)"""
+    record_score(
+        game_session.student_id, ARCADE, game_session.accuracy,
+        subject=game_session.game_key, at=game_session.completed_at,
+    )
+
+
+# ============================================================
+# READS
+# ============================================================
+
+def get_rollup(student_id, source=ASSESSMENT, subject=ALL, topic=ALL):
+    return StudentPerformanceRollup.query.filter_by(
+        student_id=student_id, source=source, subject=subject, topic=topic
+    ).first()
+
+
+def ability_tier(avg: float) -> str:
+    if avg >= 85:
+        return "advanced"
+    if avg < 60:
+        return "struggling"
+    return "on_level"
+
+
+def update_student_ability(student: Student):
+    """
+    Set ability_level / average_score from the last 10 assessments (one row read).
+    Returns the tier. The caller commits.
+    """
+    rollup = get_rollup(student.id)
+    if not rollup or not rollup.last_results:
+        student.ability_level = "on_level"
+        student.average_score = 0.0
+    else:
+        student.average_score = recent_average(rollup)
+        student.ability_level = ability_tier(student.average_score)
+    return student.ability_level
+
+
+def get_class_rollups(class_id, source=ASSESSMENT, subjects_only=False, topics_only=False):
+    """All rollups for a class's students (one query)"""
+    query = (
+        StudentPerformanceRollup.query
+        .join(Student, StudentPerformanceRollup.student_id == Student.id)
+        .filter(Student.class_id == class_id, StudentPerformanceRollup.source == source)
+    )
+    if subjects_only:
+        query = query.filter(StudentPerformanceRollup.subject != ALL, StudentPerformanceRollup.topic == ALL)
+    if topics_only:
+        query = query.filter(StudentPerformanceRollup.topic != ALL)
+    return query.order_by(StudentPerformanceRollup.id).all()
+
+
+# ============================================================
+# REBUILD
+# ============================================================
+
+def _history(student_ids):
+    """Every score in write order: (student_id, source, score, subject, topic, at)"""
+    def scoped(query, column):
+        return query.filter(column.in_(student_ids)) if student_ids is not None else query
+
+    results = scoped(AssessmentResult.query, AssessmentResult.student_id).order_by(
+        AssessmentResult.created_at, AssessmentResult.id
+    )
+    for r in results.yield_per(1000):
+        yield r.student_id, ASSESSMENT, r.score_percent, r.subject, r.topic or "", r.created_at
+
+    submissions = scoped(
+        db.session.query(StudentSubmission, AssignedPractice.subject)
+        .join(AssignedPractice, StudentSubmission.assignment_id == AssignedPractice.id)
+        .filter(StudentSubmission.status == "graded", StudentSubmission.score.isnot(None)),
+        StudentSubmission.student_id,
+    ).order_by(StudentSubmission.graded_at, StudentSubmission.id)
+    for submission, subject in submissions.yield_per(1000):
+        yield submission.student_id, ASSIGNMENT, submission.score, subject, None, submission.graded_at
+
+    games = scoped(
+        GameSession.query.filter(GameSession.completed_at.isnot(None)), GameSession.student_id
+    ).order_by(GameSession.completed_at, GameSession.id)
+    for game in games.yield_per(1000):
+        yield game.student_id, ARCADE, game.accuracy, game.game_key, None, game.completed_at
+
+
+def _raw_counts(student_ids) -> Dict[tuple, int]:
+    """Results per (student, source) in the raw tables, as _history() would replay them"""
+    counts = {}
+    queries = (
+        (ASSESSMENT, db.session.query(AssessmentResult.student_id, func.count(AssessmentResult.id))
+            .filter(AssessmentResult.student_id.in_(student_ids))
+            .group_by(AssessmentResult.student_id)),
+        (ASSIGNMENT, db.session.query(StudentSubmission.student_id, func.count(StudentSubmission.id))
+            .join(AssignedPractice, StudentSubmission.assignment_id == AssignedPractice.id)
+            .filter(StudentSubmission.student_id.in_(student_ids),
+                    StudentSubmission.status == "graded", StudentSubmission.score.isnot(None))
+            .group_by(StudentSubmission.student_id)),
+        (ARCADE, db.session.query(GameSession.student_id, func.count(GameSession.id))
+            .filter(GameSession.student_id.in_(student_ids), GameSession.completed_at.isnot(None))
+            .group_by(GameSession.student_id)),
+    )
+    for source, query in queries:
+        for student_id, count in query:
+            counts[(student_id, source)] = count
+    return counts
+
+
+def stale_students(student_ids: Iterable[int]) -> List[int]:
+    """Students whose overall rollups don't count the same results as their raw history (4 queries)"""
+    student_ids = list(student_ids)
+    if not student_ids:
+        return []
+    raw = _raw_counts(student_ids)
+    rolled = dict(
+        ((student_id, source), count) for student_id, source, count in
+        db.session.query(StudentPerformanceRollup.student_id, StudentPerformanceRollup.source,
+                         StudentPerformanceRollup.results_count)
+        .filter(StudentPerformanceRollup.student_id.in_(student_ids),
+                StudentPerformanceRollup.subject == ALL, StudentPerformanceRollup.topic == ALL)
+    )
+    return sorted({key[0] for key in set(raw) | set(rolled) if raw.get(key, 0) != rolled.get(key, 0)})
+
+
+def ensure_rollups(student_ids: Iterable[int]) -> int:
+    """
+    Rebuild rollups for any of these students they don't cover yet, e.g. on
+    an existing deployment before the first rebuild. Each student is checked
+    once per process. Returns the number rebuilt (rebuilding commits).
+    """
+    with _verified_lock:
+        pending = [sid for sid in set(student_ids) if sid and sid not in _verified_students]
+    if not pending:
+        return 0
+
+    stale = stale_students(pending)
+    if stale:
+        rebuild_rollups(stale)
+    with _verified_lock:
+        _verified_students.update(pending)
+    return len(stale)
+
+
+def rebuild_rollups(student_ids: Optional[Iterable[int]] = None) -> Dict[str, int]:
+    """
+    Recompute rollups from raw history (all students, or just student_ids)
+    and refresh each student's ability tier. Commits.
+    """
+    student_ids = list(student_ids) if student_ids is not None else None
+
+    rollups = {}
+    for student_id, source, score, subject, topic, at in _history(student_ids):
+        if not student_id:
+            continue
+        for source_key, subject_key, topic_key in _keys(source, subject, topic):
+            key = (student_id, source_key, subject_key, topic_key)
+            if key not in rollups:
+                rollups[key] = _new_rollup(*key)
+            _apply(rollups[key], score, at)
+
+    stale = StudentPerformanceRollup.query
+    if student_ids is not None:
+        stale = stale.filter(StudentPerformanceRollup.student_id.in_(student_ids))
+    stale.delete(synchronize_session=False)
+
+    db.session.add_all(rollups.values())
+    db.session.flush()
+
+    students = Student.query
+    if student_ids is not None:
+        students = students.filter(Student.id.in_(student_ids))
+    overall = {
+        key[0]: rollup for key, rollup in rollups.items()
+        if key[1:] == (ASSESSMENT, ALL, ALL)
+    }
+    updated = 0
+    for student in students.yield_per(500):
+        rollup = overall.get(student.id)
+        student.average_score = recent_average(rollup)
+        student.ability_level = ability_tier(student.average_score) if rollup and rollup.last_results else "on_level"
+        updated += 1
+
+    db.session.commit()
+    return {"rollups": len(rollups), "students": updated}
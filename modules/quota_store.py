@@ -0,0 +1,364 @@
+"""
+Quota Store
+===========
+One place for per-user quotas and rate limits, shared by every worker and node.
+
+- Token buckets: "10 per 5 minutes" is a bucket holding 10 tokens that
+  refills at 10 tokens / 300s. Each check reads and writes one small record
+  instead of counting rows.
+- Pluggable backends:
+    SqlQuotaBackend     quota_buckets table (SQLite or PostgreSQL),
+                        updated with compare-and-swap so workers never
+                        lose each other's writes
+    RedisQuotaBackend   any Redis-protocol server (Redis, Valkey, KeyDB),
+                        one atomic Lua script per check
+    MemoryQuotaBackend  in-process stand-in with the same semantics as the
+                        Redis backend - for local development and scripts
+- Plan limits (questions per day, lesson plans per month, ...) live in the
+  same backend, seeded from the PLAN_LIMITS defaults in app.py, so a limit
+  can be changed for every worker at once.
+
+Usage:
+    quota = QuotaStore(SqlQuotaBackend(db), plan_defaults=PLAN_LIMITS)
+    result = quota.consume(f"study_buddy:{student_id}", limit=10, period_seconds=300)
+    if not result.allowed:
+        ...429, retry in result.retry_after seconds...
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import and_, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import PlanLimitSetting, QuotaBucket
+
+try:
+    import redis
+except ImportError:  # only needed for QUOTA_BACKEND=redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+QuotaResult = namedtuple("QuotaResult", ["allowed", "remaining", "retry_after"])
+
+# Compare-and-swap attempts before giving up on a hot bucket
+MAX_CAS_ATTEMPTS = 5
+
+# Plan limits are re-read from the backend at most this often per worker
+PLAN_LIMITS_CACHE_SECONDS = 60
+
+
+def _refill(tokens, updated_at, capacity, rate, now):
+    """Tokens in a bucket after refilling from updated_at until now"""
+    return min(capacity, tokens + max(0.0, now - updated_at) * rate)
+
+
+def _take(tokens, capacity, rate, cost):
+    """Apply one check to a refilled bucket. Returns (QuotaResult, new token count)"""
+    if tokens >= cost:
+        return QuotaResult(True, int(tokens - cost), 0.0), tokens - cost
+    return QuotaResult(False, int(tokens), (cost - tokens) / rate), tokens
+
+
+def _plan_field(role, plan, name):
+    return f"{role}/{plan}/{name}"
+
+
+# ============================================================
+# STORAGE BACKENDS
+# ============================================================
+
+class SqlQuotaBackend:
+    """
+    Token buckets in the quota_buckets table, plan limits in plan_limit_settings.
+
+    Uses short-lived engine connections instead of db.session (like the
+    session store), so a quota check never commits a view's pending changes.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.table = QuotaBucket.__table__
+        self.limits_table = PlanLimitSetting.__table__
+
+    def take(self, key, capacity, rate, cost, now):
+        for _ in range(MAX_CAS_ATTEMPTS):
+            with self.db.engine.connect() as conn:
+                row = conn.execute(
+                    select(self.table.c.tokens, self.table.c.updated_at, self.table.c.version)
+                    .where(self.table.c.bucket_key == key)
+                ).first()
+
+            tokens = capacity if row is None else _refill(row.tokens, row.updated_at, capacity, rate, now)
+            result, tokens = _take(tokens, capacity, rate, cost)
+            if cost == 0:
+                return result
+
+            values = {
+                "tokens": tokens,
+                "updated_at": now,
+                "full_at": now + (capacity - tokens) / rate,
+            }
+            try:
+                with self.db.engine.begin() as conn:
+                    if row is None:
+                        conn.execute(insert(self.table).values(bucket_key=key, version=0, **values))
+                        return result
+
+                    swapped = conn.execute(
+                        update(self.table)
+                        .where(and_(self.table.c.bucket_key == key, self.table.c.version == row.version))
+                        .values(version=row.version + 1, **values)
+                    ).rowcount
+                if swapped:
+                    return result
+            except IntegrityError:
+                pass  # another worker created the bucket first - retry against its row
+
+        raise RuntimeError(f"Quota bucket {key} is too contended")
+
+    def purge_full(self, now):
+        """Delete buckets that have refilled completely. Returns rows removed."""
+        with self.db.engine.begin() as conn:
+            result = conn.execute(delete(self.table).where(self.table.c.full_at <= now))
+        return result.rowcount
+
+    def load_plan_limits(self):
+        with self.db.engine.connect() as conn:
+            rows = conn.execute(select(
+                self.limits_table.c.role, self.limits_table.c.plan,
+                self.limits_table.c.name, self.limits_table.c.value
+            )).all()
+        return {_plan_field(r.role, r.plan, r.name): r.value for r in rows}
+
+    def seed_plan_limits(self, fields):
+        """Insert limits that aren't stored yet (never overwrites edited values)"""
+        existing = self.load_plan_limits()
+        missing = [
+            dict(zip(("role", "plan", "name"), field.split("/")), value=value)
+            for field, value in fields.items() if field not in existing
+        ]
+        if missing:
+            try:
+                with self.db.engine.begin() as conn:
+                    conn.execute(insert(self.limits_table), missing)
+            except IntegrityError:
+                pass  # another worker seeded at the same time
+        return len(missing)
+
+    def set_plan_limit(self, field, value):
+        role, plan, name = field.split("/")
+        with self.db.engine.begin() as conn:
+            updated = conn.execute(
+                update(self.limits_table)
+                .where(and_(
+                    self.limits_table.c.role == role,
+                    self.limits_table.c.plan == plan,
+                    self.limits_table.c.name == name,
+                ))
+                .values(value=value)
+            ).rowcount
+            if not updated:
+                conn.execute(insert(self.limits_table).values(role=role, plan=plan, name=name, value=value))
+
+
+# Refill + take in one atomic step. Returns {allowed, tokens}.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+
+local allowed = 0
+if tokens >= cost then
+    allowed = 1
+    tokens = tokens - cost
+end
+
+if cost > 0 then
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+end
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisQuotaBackend:
+    """Token buckets as Redis hashes; they expire on their own once full"""
+
+    key_prefix = "quota:"
+    plan_limits_key = "quota:plan_limits"
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError("QUOTA_BACKEND=redis needs the 'redis' package (pip install redis)")
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def take(self, key, capacity, rate, cost, now):
+        allowed, tokens = self.script(keys=[self.key_prefix + key], args=[capacity, rate, cost, now])
+        tokens = float(tokens)
+        if allowed:
+            return QuotaResult(True, int(tokens), 0.0)
+        return QuotaResult(False, int(tokens), (cost - tokens) / rate)
+
+    def purge_full(self, now):
+        return 0  # keys carry their own TTL
+
+    def load_plan_limits(self):
+        return {field: int(value) for field, value in self.client.hgetall(self.plan_limits_key).items()}
+
+    def seed_plan_limits(self, fields):
+        pipe = self.client.pipeline()
+        for field, value in fields.items():
+            pipe.hsetnx(self.plan_limits_key, field, value)
+        return sum(pipe.execute())
+
+    def set_plan_limit(self, field, value):
+        self.client.hset(self.plan_limits_key, field, value)
+
+
+class MemoryQuotaBackend:
+    """
+    In-process stand-in for RedisQuotaBackend (same bucket semantics).
+    Limits only hold within one worker - use for development and scripts.
+    """
+
+    def __init__(self):
+        self._buckets = {}  # key -> (tokens, updated_at, full_at)
+        self._plan_limits = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost, now):
+        with self._lock:
+            state = self._buckets.get(key)
+            tokens = capacity if state is None else _refill(state[0], state[1], capacity, rate, now)
+            result, tokens = _take(tokens, capacity, rate, cost)
+            if cost > 0:
+                self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            return result
+
+    def purge_full(self, now):
+        with self._lock:
+            full = [key for key, state in self._buckets.items() if state[2] <= now]
+            for key in full:
+                del self._buckets[key]
+        return len(full)
+
+    def load_plan_limits(self):
+        with self._lock:
+            return dict(self._plan_limits)
+
+    def seed_plan_limits(self, fields):
+        with self._lock:
+            missing = {f: v for f, v in fields.items() if f not in self._plan_limits}
+            self._plan_limits.update(missing)
+        return len(missing)
+
+    def set_plan_limit(self, field, value):
+        with self._lock:
+            self._plan_limits[field] = value
+
+
+# ============================================================
+# QUOTA STORE
+# ============================================================
+
+class QuotaStore:
+    """
+    Token-bucket quotas and plan limits on top of one backend.
+
+    Backend errors fail open (the request is allowed and the error logged),
+    the same way content moderation does - a storage hiccup should not lock
+    students out.
+    """
+
+    # Roughly one write in N also clears out buckets that have refilled
+    purge_probability = 0.002
+
+    def __init__(self, backend, plan_defaults=None):
+        self.backend = backend
+        self.plan_defaults = plan_defaults or {}
+        self._plan_cache = None
+        self._plan_cache_loaded_at = 0.0
+        self._plan_lock = threading.Lock()
+
+    def _check(self, key, limit, period_seconds, cost):
+        if limit <= 0:
+            return QuotaResult(False, 0, float(period_seconds))
+
+        now = time.time()
+        try:
+            result = self.backend.take(key, float(limit), limit / period_seconds, cost, now)
+            if cost and random.random() < self.purge_probability:
+                self.backend.purge_full(now)
+            return result
+        except Exception as e:
+            logger.error(f"Quota check failed for {key}, allowing: {e}")
+            return QuotaResult(True, limit, 0.0)
+
+    def consume(self, key, limit, period_seconds, cost=1):
+        """
+        Take cost tokens from a bucket of `limit` tokens per `period_seconds`.
+        Nothing is taken when the bucket doesn't hold enough.
+        """
+        return self._check(key, limit, period_seconds, cost)
+
+    def peek(self, key, limit, period_seconds):
+        """Current state of a bucket without taking anything"""
+        return self._check(key, limit, period_seconds, 0)
+
+    # --------------------------------------------------------
+    # PLAN LIMITS
+    # --------------------------------------------------------
+
+    def _default_fields(self):
+        return {
+            _plan_field(role, plan, name): value
+            for role, plans in self.plan_defaults.items()
+            for plan, limits in plans.items()
+            for name, value in limits.items()
+        }
+
+    def seed_plan_limits(self):
+        """Store any PLAN_LIMITS defaults the backend doesn't have yet. Returns count added."""
+        added = self.backend.seed_plan_limits(self._default_fields())
+        self._plan_cache = None
+        return added
+
+    def _stored_plan_limits(self):
+        now = time.monotonic()
+        with self._plan_lock:
+            if self._plan_cache is None or now - self._plan_cache_loaded_at > PLAN_LIMITS_CACHE_SECONDS:
+                try:
+                    self._plan_cache = self.backend.load_plan_limits()
+                except Exception as e:
+                    logger.error(f"Could not load plan limits, using defaults: {e}")
+                    self._plan_cache = self._plan_cache or {}
+                self._plan_cache_loaded_at = now
+            return self._plan_cache
+
+    def plan_limits(self, role, plan):
+        """Limits for one plan: stored values over the PLAN_LIMITS defaults"""
+        limits = dict(self.plan_defaults.get(role, {}).get(plan, {}))
+        prefix = _plan_field(role, plan, "")
+        for field, value in self._stored_plan_limits().items():
+            if field.startswith(prefix):
+                limits[field[len(prefix):]] = value
+        return limits
+
+    def set_plan_limit(self, role, plan, name, value):
+        """Change one limit for every worker (picked up within PLAN_LIMITS_CACHE_SECONDS)"""
+        self.backend.set_plan_limit(_plan_field(role, plan, name), int(value))
+        with self._plan_lock:
+            self._plan_cache = None
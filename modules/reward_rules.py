@@ -0,0 +1,136 @@
+# modules/reward_rules.py
+"""
+Badge & achievement rules engine.
+
+Arcade badges and dashboard achievements are both "reach N of something"
+rules. Instead of loading every rule and every earned reward on each
+check, and querying counters inside the loop:
+
+- RuleCatalog caches the rule table in process (refreshed every
+  RULES_CACHE_SECONDS), indexed by (requirement_type, game_key), so a
+  check only looks at rules that can apply to the event.
+- Counters loads each counter at most once, and only when a still-unearned
+  rule needs it.
+- evaluate() compares rules against counters; callers fetch the earned
+  rewards among the candidates in one query and insert one row per award.
+
+Usage:
+    badge_rules = RuleCatalog(ArcadeBadge, type_attr="requirement_type")
+    candidates = badge_rules.rules_for(["score", "time"], game_key="speed_math")
+    counters = Counters({"score": 950}, loaders={"streak": load_streak})
+    earned = evaluate(unearned_candidates, counters)
+"""
+import threading
+import time
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, List
+
+RULES_CACHE_SECONDS = 300
+
+Rule = namedtuple(
+    "Rule",
+    "id name description icon category requirement_type requirement_value game_key tier",
+)
+
+# Counters where a lower value is better (e.g. finishing time)
+AT_MOST = {"time"}
+
+
+class RuleCatalog:
+    """One reward table (ArcadeBadge, Achievement, ...) cached and indexed by (type, game_key)"""
+
+    def __init__(self, model, type_attr: str, cache_seconds: int = RULES_CACHE_SECONDS):
+        self.model = model
+        self.type_attr = type_attr
+        self.cache_seconds = cache_seconds
+        self._index: Dict[tuple, List[Rule]] = {}
+        self._rules: List[Rule] = []
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        rules = [
+            Rule(
+                id=row.id,
+                name=row.name,
+                description=row.description,
+                icon=row.icon,
+                category=row.category,
+                requirement_type=getattr(row, self.type_attr),
+                requirement_value=row.requirement_value,
+                game_key=getattr(row, "game_key", None),
+                tier=getattr(row, "tier", None),
+            )
+            for row in self.model.query.order_by(self.model.id).all()
+        ]
+        index: Dict[tuple, List[Rule]] = {}
+        for rule in rules:
+            index.setdefault((rule.requirement_type, rule.game_key), []).append(rule)
+
+        with self._lock:
+            self._rules = rules
+            self._index = index
+            self._loaded_at = time.monotonic()
+
+    def _fresh(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.cache_seconds:
+            self._load()
+
+    def all(self) -> List[Rule]:
+        self._fresh()
+        return list(self._rules)
+
+    def rules_for(self, requirement_types: Iterable[str], game_key: str = None) -> List[Rule]:
+        """Rules of these types that apply to every game or to `game_key`, in id order"""
+        self._fresh()
+        rules = []
+        for requirement_type in requirement_types:
+            rules.extend(self._index.get((requirement_type, None), []))
+            if game_key is not None:
+                rules.extend(self._index.get((requirement_type, game_key), []))
+        return sorted(rules, key=lambda rule: rule.id)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+class Counters:
+    """Counter values, fetched lazily: each loader runs at most once, on first use"""
+
+    def __init__(self, values: Dict = None, loaders: Dict[str, Callable] = None):
+        self._values = dict(values or {})
+        self._loaders = loaders or {}
+
+    def __contains__(self, name):
+        return name in self._values or name in self._loaders
+
+    def get(self, name):
+        if name not in self._values:
+            loader = self._loaders.get(name)
+            loaded = loader() if loader else None
+            # A loader may fill several counters at once (e.g. one aggregate query)
+            if isinstance(loaded, dict):
+                self._values.update(loaded)
+                self._values.setdefault(name, None)
+            else:
+                self._values[name] = loaded
+        return self._values[name]
+
+
+def evaluate(rules: Iterable[Rule], counters: Counters) -> List[Rule]:
+    """Rules whose requirement the counters meet (rules without a counter never match)"""
+    earned = []
+    for rule in rules:
+        if rule.requirement_type not in counters or rule.requirement_value is None:
+            continue
+        value = counters.get(rule.requirement_type)
+        if value is None:
+            continue
+        if rule.requirement_type in AT_MOST:
+            met = value <= rule.requirement_value
+        else:
+            met = value >= rule.requirement_value
+        if met:
+            earned.append(rule)
+    return earned
@@ -262,65 +262,33 @@ def auto_vacuum_database(db_session):
 # API CALL SELF-HEALING
 # ============================================================
 
-def resilient_api_call(api_function, *args, max_retries=3, timeout=10, **kwargs):
+def resilient_api_call(api_function, *args, max_retries=3, timeout=10, budget=None, **kwargs):
     """
     Makes API calls with automatic retry on failure.
     Handles timeouts, network errors, and rate limits.
 
+    Retries use the AI gateway's jittered backoff and stop once the time
+    budget (default: timeout * max_retries seconds) is used up, so a failing
+    API can't hold a request thread for longer than that.
+
     Usage:
         from modules.self_healing import resilient_api_call
 
         response = resilient_api_call(
-            openai.ChatCompletion.create,
-            model="gpt-4",
+            client.chat.completions.create,
+            model="gpt-4o-mini",
             messages=[{"role": "user", "content": "Hello"}]
         )
     """
-    last_exception = None
-
-    for attempt in range(max_retries):
-        try:
-            # Set a timeout to prevent hanging
-            result = api_function(*args, **kwargs)
-            return result
-
-        except Exception as e:
-            last_exception = e
-            error_str = str(e).lower()
-
-            # Determine if we should retry
-            should_retry = any([
-                'timeout' in error_str,
-                'connection' in error_str,
-                'rate limit' in error_str,
-                '429' in error_str,
-                '500' in error_str,
-                '502' in error_str,
-                '503' in error_str,
-            ])
-
-            if should_retry and attempt < max_retries - 1:
-                # Exponential backoff for rate limits
-                if 'rate limit' in error_str or '429' in error_str:
-                    wait_time = 2 ** (attempt + 1)
-                else:
-                    wait_time = 0.5 * (2 ** attempt)
-
-                logging.warning(
-                    f"API call failed (attempt {attempt + 1}/{max_retries}). "
-                    f"Retrying in {wait_time}s... Error: {str(e)}"
-                )
-
-                time.sleep(wait_time)
-            else:
-                logging.error(
-                    f"API call failed after {max_retries} attempts or error is not retryable. "
-                    f"Error: {str(e)}"
-                )
-                break
-
-    # All retries failed
-    raise last_exception
+    from modules.ai_gateway import call_with_budget
+
+    return call_with_budget(
+        api_function,
+        *args,
+        budget=budget or timeout * max_retries,
+        max_attempts=max_retries,
+        **kwargs
+    )
 
 
 # ============================================================
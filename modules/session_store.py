@@ -0,0 +1,380 @@
+"""
+Server-Side Session Store
+=========================
+Replaces Flask's signed-cookie sessions with sessions stored on the server.
+
+- The cookie only carries a signed "<session_id>.<version>" token
+- Payloads live in the server_sessions table (SQLite or PostgreSQL)
+- An in-process LRU cache serves repeat reads without touching the database.
+  The version in the cookie changes on every save, so a worker never serves
+  a stale copy written by another worker.
+- The session id is replaced whenever the logged-in identity changes
+  (login, logout, switching accounts), so an id planted before login is
+  useless afterwards (session fixation).
+- Sessions that are only read still have their expiry pushed forward, at
+  most once per touch_after, so active users aren't logged out mid-use.
+
+Session data is serialized with Flask's TaggedJSONSerializer, so everything
+that worked in cookie sessions (datetimes, tuples, nested dicts) works here.
+"""
+
+import logging
+import random
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from itsdangerous import BadSignature, Signer
+from sqlalchemy import delete, insert, select, update
+
+from models import ServerSession
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================
+# SESSION OBJECT
+# ============================================================
+
+# Keys that say who is logged in - a change to any of them gets a new session id
+AUTH_KEYS = ("user_role", "user_id", "student_id", "teacher_id", "parent_id", "admin_authenticated", "is_owner")
+
+
+def _identity(data):
+    return tuple(data.get(key) for key in AUTH_KEYS)
+
+
+class ServerSideSession(SecureCookieSession):
+    """Session dict that remembers which server-side record it came from"""
+
+    def __init__(self, initial=None, sid=None, version=None, expires_at=None, stale_cookie=False):
+        super().__init__(initial)
+        self.sid = sid
+        self.version = version
+        self.expires_at = expires_at
+        self.loaded_identity = _identity(self)
+        # The cookie named an older version than the stored one (see persist())
+        self.stale_cookie = stale_cookie
+
+
+# ============================================================
+# STORAGE BACKENDS
+# ============================================================
+
+class SqlSessionBackend:
+    """
+    Stores session payloads in the server_sessions table.
+
+    Uses short-lived engine connections instead of db.session, so saving the
+    session at the end of a request never commits a view's pending changes.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.table = ServerSession.__table__
+
+    def load(self, sid):
+        """Return (payload, version, expires_at) for a live session, or None"""
+        query = select(self.table.c.data, self.table.c.version, self.table.c.expires_at).where(
+            self.table.c.session_id == sid,
+            self.table.c.expires_at > datetime.utcnow()
+        )
+        with self.db.engine.connect() as conn:
+            row = conn.execute(query).first()
+        return (row.data, row.version, row.expires_at) if row else None
+
+    def store(self, sid, payload, version, expires_at):
+        """Insert or update a session payload"""
+        values = {
+            "data": payload,
+            "version": version,
+            "expires_at": expires_at,
+            "updated_at": datetime.utcnow(),
+        }
+        with self.db.engine.begin() as conn:
+            result = conn.execute(
+                update(self.table).where(self.table.c.session_id == sid).values(**values)
+            )
+            if result.rowcount == 0:
+                conn.execute(insert(self.table).values(session_id=sid, **values))
+
+    def touch(self, sid, expires_at):
+        """Push a session's expiry forward without rewriting its payload"""
+        with self.db.engine.begin() as conn:
+            conn.execute(
+                update(self.table).where(self.table.c.session_id == sid).values(expires_at=expires_at)
+            )
+
+    def delete(self, sid):
+        with self.db.engine.begin() as conn:
+            conn.execute(delete(self.table).where(self.table.c.session_id == sid))
+
+    def purge_expired(self):
+        """Delete expired sessions. Returns number of rows removed."""
+        with self.db.engine.begin() as conn:
+            result = conn.execute(
+                delete(self.table).where(self.table.c.expires_at <= datetime.utcnow())
+            )
+        return result.rowcount
+
+
+class LRUSessionCache:
+    """
+    Thread-safe in-process LRU of serialized session payloads and their expiry.
+    Entries are keyed by session id and only returned for a matching version.
+    """
+
+    def __init__(self, max_entries=2000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sid, version):
+        """Return (payload, expires_at), or None"""
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(sid)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, sid, version, payload, expires_at):
+        with self._lock:
+            self._entries[sid] = (version, payload, expires_at)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def touch(self, sid, expires_at):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is not None:
+                self._entries[sid] = (entry[0], entry[1], expires_at)
+
+    def discard(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total * 100, 1) if total else 0.0,
+            }
+
+
+# ============================================================
+# FLASK SESSION INTERFACE
+# ============================================================
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Flask session interface backed by a pluggable storage backend.
+
+    Usage:
+        app.session_interface = ServerSideSessionInterface(SqlSessionBackend(db))
+    """
+
+    session_class = ServerSideSession
+    serializer = TaggedJSONSerializer()
+    salt = "cozmic-server-session"
+
+    # Roughly one save in N also clears out expired rows
+    purge_probability = 0.002
+
+    # Sessions that are read but not modified extend their expiry at most this often
+    touch_after = timedelta(minutes=10)
+
+    def __init__(self, backend, cache=None):
+        self.backend = backend
+        self.cache = cache if cache is not None else LRUSessionCache()
+
+    def _get_signer(self, app):
+        if not app.secret_key:
+            return None
+        return Signer(app.secret_key, salt=self.salt)
+
+    def _read_cookie(self, app, request):
+        """Return (sid, version) from a valid cookie, or (None, None)"""
+        signer = self._get_signer(app)
+        value = request.cookies.get(self.get_cookie_name(app))
+        if not value or signer is None:
+            return None, None
+
+        try:
+            token = signer.unsign(value).decode("utf-8")
+        except BadSignature:
+            return None, None
+
+        sid, _, version = token.partition(".")
+        return (sid, version) if sid and version else (None, None)
+
+    def open_session(self, app, request):
+        if self._get_signer(app) is None:
+            return None
+
+        sid, version = self._read_cookie(app, request)
+        if sid is None:
+            return self.session_class()
+
+        cookie_version = version
+        cached = self.cache.get(sid, version)
+        if cached is not None:
+            payload, expires_at = cached
+        else:
+            try:
+                loaded = self.backend.load(sid)
+            except Exception as e:
+                logger.error(f"Session load failed, starting fresh session: {e}")
+                return self.session_class()
+
+            if loaded is None:
+                # Expired or unknown id - start over with a brand new id
+                return self.session_class()
+
+            payload, version, expires_at = loaded
+            self.cache.put(sid, version, payload, expires_at)
+
+        try:
+            data = self.serializer.loads(payload)
+        except Exception as e:
+            logger.error(f"Corrupted session payload for {sid[:8]}...: {e}")
+            return self.session_class()
+
+        return self.session_class(data, sid=sid, version=version, expires_at=expires_at,
+                                  stale_cookie=version != cookie_version)
+
+    def _discard(self, sid):
+        try:
+            self.backend.delete(sid)
+        except Exception as e:
+            logger.error(f"Session delete failed: {e}")
+        self.cache.discard(sid)
+
+    def _touch(self, app, session):
+        """Extend an unmodified session's expiry, at most once per touch_after"""
+        if not session.sid or session.expires_at is None:
+            return
+        expires_at = datetime.utcnow() + app.permanent_session_lifetime
+        if expires_at - session.expires_at < self.touch_after:
+            return
+        try:
+            self.backend.touch(session.sid, expires_at)
+        except Exception as e:
+            logger.warning(f"Session expiry refresh failed: {e}")
+            return
+        self.cache.touch(session.sid, expires_at)
+        session.expires_at = expires_at
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        # Add a "Vary: Cookie" header if the session was accessed at all.
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        # Session cleared (e.g. logout) - drop the record and the cookie
+        if not session:
+            if session.modified:
+                if session.sid:
+                    self._discard(session.sid)
+                response.delete_cookie(
+                    name,
+                    domain=domain,
+                    path=path,
+                    secure=secure,
+                    samesite=samesite,
+                    httponly=httponly,
+                )
+                response.vary.add("Cookie")
+            return
+
+        # Logged in, out or as someone else - move the data to a fresh id
+        rotate = session.sid is not None and _identity(session) != session.loaded_identity
+
+        if not session.modified:
+            self._touch(app, session)
+
+        if not rotate and not session.stale_cookie and not self.should_set_cookie(app, session):
+            return
+
+        sid = session.sid if session.sid and not rotate else secrets.token_urlsafe(32)
+        version = session.version
+
+        if session.modified or rotate or not version:
+            version = secrets.token_hex(8)
+            payload = self.serializer.dumps(dict(session))
+            expires_at = datetime.utcnow() + app.permanent_session_lifetime
+            try:
+                self.backend.store(sid, payload, version, expires_at)
+            except Exception as e:
+                # Keep the previous cookie so the user isn't logged out by a blip
+                logger.error(f"Session save failed: {e}")
+                return
+            self.cache.put(sid, version, payload, expires_at)
+            if rotate:
+                self._discard(session.sid)
+            session.sid, session.version, session.expires_at = sid, version, expires_at
+            session.loaded_identity = _identity(session)
+
+            if random.random() < self.purge_probability:
+                try:
+                    self.backend.purge_expired()
+                except Exception as e:
+                    logger.warning(f"Expired session purge failed: {e}")
+
+        token = self._get_signer(app).sign(f"{sid}.{version}".encode("utf-8"))
+        response.set_cookie(
+            name,
+            token.decode("utf-8"),
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite,
+        )
+        response.vary.add("Cookie")
+
+    def persist(self, app, session):
+        """
+        Write the session to the store right now, without touching the cookie.
+
+        Used by streamed responses: the cookie went out with the headers, so
+        changes made while streaming are saved here instead, under a new
+        version. event_stream_response() marks the session modified, so the
+        cookie carries a version written just before streaming that no
+        worker has cached: the next request misses every worker's cache,
+        loads this payload and gets a cookie for its version.
+        Returns False if the session has no server-side record yet.
+        """
+        if not session.sid:
+            return False
+
+        version = secrets.token_hex(8)
+        payload = self.serializer.dumps(dict(session))
+        expires_at = datetime.utcnow() + app.permanent_session_lifetime
+        try:
+            self.backend.store(session.sid, payload, version, expires_at)
+        except Exception as e:
+            logger.error(f"Session persist failed: {e}")
+            return False
+
+        self.cache.put(session.sid, version, payload, expires_at)
+        session.version, session.expires_at = version, expires_at
+        return True
@@ -1,14 +1,51 @@
 # modules/shared_ai.py
-import os
 import re
+import threading
+from contextlib import contextmanager
+
+from modules.ai_gateway import chat_text, get_shared_client, stream_chat
 
 
 # -------------------------------
-# Lazy-load OpenAI client
+# Shared OpenAI client (one pooled client per worker)
 # -------------------------------
 def get_client():
-    from openai import OpenAI
-    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return get_shared_client()
+
+
+# -------------------------------
+# TOKEN STREAMING
+# -------------------------------
+_token_sink = threading.local()
+
+
+@contextmanager
+def stream_tokens_to(callback):
+    """
+    While active (in this thread), study_buddy_ai and
+    conversational_followup_ai stream from the API and call
+    callback(text) for every token delta. They still return the full text,
+    so subject helpers that post-process it work unchanged.
+    """
+    previous = getattr(_token_sink, "callback", None)
+    _token_sink.callback = callback
+    try:
+        yield
+    finally:
+        _token_sink.callback = previous
+
+
+def _complete_text(messages: list, model: str) -> str:
+    """Full completion text, streamed to the active token sink if there is one"""
+    callback = getattr(_token_sink, "callback", None)
+    if callback is None:
+        return chat_text(messages, model=model)
+
+    parts = []
+    for delta in stream_chat(messages, model=model):
+        parts.append(delta)
+        callback(delta)
+    return "".join(parts)
 
 
 # -------------------------------
@@ -356,18 +393,14 @@ GRADE RULE:
 {depth_rule}
 """
 
-    client = get_client()
-
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
+    return _complete_text(
+        [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": prompt},
         ],
+        "gpt-4o-mini",
     )
 
-    return response.choices[0].message.content
-
 
 # -------------------------------------------------------
 # CONVERSATIONAL FOLLOWUP AI (For Chat Continuations)
@@ -440,19 +473,12 @@ AGE-APPROPRIATE CONTENT:
 • Keep responses safe, educational, and encouraging
 """
 
-    client = get_client()
-
     # Build messages with conversation history
     messages = [{"role": "system", "content": system_prompt}]
     messages.extend(conversation_history)
     messages.append({"role": "user", "content": message})
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
-    )
-
-    return response.choices[0].message.content
+    return _complete_text(messages, "gpt-4o-mini")
 
 
 # -------------------------------------------------------
@@ -547,16 +573,12 @@ GRADE LEVEL DEPTH:
 {depth_rule}
 """
 
-    client = get_client()
-
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
+    return chat_text(
+        [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": prompt},
         ],
+        model="gpt-4o",
     )
 
-    return response.choices[0].message.content
-
 
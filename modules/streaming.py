@@ -0,0 +1,178 @@
+"""
+Streaming Responses
+===================
+Helpers for Server-Sent Events (SSE) responses that forward AI tokens to
+the browser as they are generated, instead of waiting for the whole answer.
+
+Replies that need output moderation go through ModeratedStream: tokens are
+buffered into sentences and each sentence is moderated before it is sent,
+so nothing reaches the student unchecked.
+
+Event stream format (one JSON payload per event):
+    event: token     {"text": "..."}                  token delta (a moderated sentence for moderated replies)
+    event: section   {"section": "overview", "delta": "..."} parsed section update
+    event: done      {...}                            final, moderated result
+    event: error     {"error": "..."}
+"""
+
+import json
+import queue
+import re
+import threading
+
+from flask import Response, request, session, stream_with_context
+
+from modules.shared_ai import stream_tokens_to
+
+# Give up on a stream if no token arrives for this long
+STREAM_IDLE_TIMEOUT_SECONDS = 120
+
+# Moderated replies are sent in pieces of at least this many characters,
+# cut at the end of a sentence (fewer moderation calls for short sentences)
+MODERATED_CHUNK_MIN_CHARS = 80
+
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|\n+")
+
+
+def wants_event_stream():
+    """True if the client asked for a streamed reply (?stream=1 or Accept: text/event-stream)"""
+    if request.args.get("stream") == "1":
+        return True
+    return "text/event-stream" in request.headers.get("Accept", "")
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def event_stream_response(events):
+    """
+    Wrap a generator of sse_event() strings in a streaming response.
+    The request context (session, db) stays available while it runs.
+
+    The session is marked modified so the cookie sent with the headers
+    carries a fresh version that no worker has cached yet; whatever the
+    stream changes is saved afterwards by persist_session().
+    """
+    session.modified = True
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # stop proxies buffering the stream
+        },
+    )
+
+
+class ModeratedStream:
+    """
+    Holds streamed text back until it has been moderated.
+
+    feed() buffers token deltas and returns the complete sentences that
+    passed moderate(text); flush() does the same for the rest at the end.
+    Once a piece is flagged nothing more is released, and `flagged` holds
+    its moderation result so the caller can reject the whole reply.
+    result_for(reply) hands the outcome on, so a reply the stream has
+    already checked isn't sent to moderation a second time.
+
+    Usage:
+        gate = ModeratedStream(moderate_content)
+        for delta in deltas:
+            for text in gate.feed(delta):
+                yield sse_event("token", {"text": text})
+        for text in gate.flush():
+            yield sse_event("token", {"text": text})
+        moderation = gate.result_for(reply)  # None: moderate the reply yourself
+    """
+
+    def __init__(self, moderate, clean=None, min_chars=MODERATED_CHUNK_MIN_CHARS):
+        self.moderate = moderate
+        self.clean = clean
+        self.min_chars = min_chars
+        self.flagged = None
+        self._buffer = ""
+        self._passed = []
+        self._scores = {}
+
+    def feed(self, delta):
+        if self.flagged:
+            return []
+        self._buffer += delta
+
+        cut = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            if match.end() >= self.min_chars:
+                cut = match.end()
+        if not cut:
+            return []
+
+        chunk, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        return self._release(chunk)
+
+    def flush(self):
+        if self.flagged or not self._buffer:
+            return []
+        chunk, self._buffer = self._buffer, ""
+        return self._release(chunk)
+
+    def result_for(self, reply):
+        """
+        A moderate_content()-shaped result covering `reply`, or None when the
+        stream didn't moderate exactly that text (e.g. the reply was
+        post-processed after streaming).
+        """
+        if self.flagged:
+            return self.flagged
+        if self._buffer or "".join(self._passed).strip() != (reply or "").strip():
+            return None
+        return {
+            'flagged': False,
+            'categories': {},
+            'category_scores': dict(self._scores),
+            'reason': None,
+            'source': 'stream'
+        }
+
+    def _release(self, chunk):
+        result = self.moderate(chunk)
+        if result.get("flagged"):
+            self.flagged = result
+            return []
+        self._passed.append(chunk)
+        for category, score in (result.get("category_scores") or {}).items():
+            self._scores[category] = max(score, self._scores.get(category, 0))
+        return [self.clean(chunk) if self.clean else chunk]
+
+
+def iter_streamed_call(func, *args, **kwargs):
+    """
+    Run func(*args, **kwargs) in a background thread with AI token
+    streaming turned on (see shared_ai.stream_tokens_to).
+
+    Yields ("token", text) for each token as it arrives, then
+    ("result", return value). Re-raises anything func raises.
+    """
+    items = queue.Queue()
+
+    def run():
+        try:
+            with stream_tokens_to(lambda text: items.put(("token", text))):
+                items.put(("result", func(*args, **kwargs)))
+        except Exception as e:
+            items.put(("error", e))
+
+    threading.Thread(target=run, daemon=True, name="ai-stream").start()
+
+    while True:
+        try:
+            kind, value = items.get(timeout=STREAM_IDLE_TIMEOUT_SECONDS)
+        except queue.Empty:
+            raise TimeoutError("AI stream stalled")
+
+        if kind == "error":
+            raise value
+        yield kind, value
+        if kind == "result":
+            return
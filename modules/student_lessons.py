@@ -186,6 +186,30 @@ def get_lessons_for_subject_grade(subject: str, grade: int) -> List[str]:
     return LESSON_TOPICS[subject][grade]
 
 
+def build_chapter_context(chapter: Dict, topic: str) -> Optional[Dict]:
+    """
+    Build the chapter context passed to generate_student_lesson for a lesson
+    opened from a chapter. Returns None if the topic isn't in the chapter.
+    """
+    if not chapter:
+        return None
+
+    lessons = chapter.get("lessons", [])
+    try:
+        lesson_index = lessons.index(topic)
+    except ValueError:
+        # Topic not in this chapter's lessons
+        return None
+
+    return {
+        "chapter_title": chapter.get("title"),
+        "chapter_description": chapter.get("description"),
+        "lesson_number": lesson_index + 1,
+        "total_lessons": len(lessons),
+        "previous_lessons": lessons[:lesson_index] if lesson_index > 0 else []
+    }
+
+
 def generate_student_lesson(
     subject: str,
     grade: int,
@@ -6,6 +6,7 @@ Depends on:
 - practice_helper.generate_practice_session and apply_differentiation
 - shared_ai.study_buddy_ai for lesson plan generation
 - models for AssessmentResult and relationships
+- class_analytics for set-based class analytics and early warnings
 """
 from datetime import datetime
 from typing import Dict, List, Optional
@@ -13,8 +14,9 @@ from typing import Dict, List, Optional
 from modules.practice_helper import generate_practice_session, apply_differentiation
 from modules.shared_ai import study_buddy_ai, build_character_voice, grade_depth_instruction
 from modules.answer_formatter import format_answer
-from modules.visual_generator import add_visual_to_question
-from models import db, Student, Teacher, Class, AssessmentResult
+from modules.visual_generator import add_visuals_to_questions
+from modules.class_analytics import compute_class_analytics, compute_early_warnings, compute_teacher_class_analytics
+from models import db, Teacher, Class, AssessmentResult
 
 
 def assign_practice(subject: str, grade: str, differentiation_mode: str, student_ids: List[int], character: str) -> Dict:
@@ -200,19 +202,19 @@ def assign_questions(
         if "difficulty" in s:
             question_data["difficulty"] = s["difficulty"]
 
-        # Add visual aid if appropriate for this question
-        visual_data = add_visual_to_question(
-            question_text=question_data["prompt"],
-            topic=topic,
-            subject=subject,
-            grade=grade
-        )
+        questions.append(question_data)
+
+    # Add visual aids where appropriate - generated together, not one question at a time
+    visuals = add_visuals_to_questions(
+        [{"question_text": q["prompt"], "topic": topic} for q in questions],
+        subject=subject,
+        grade=grade
+    )
+    for question_data, visual_data in zip(questions, visuals):
         question_data["visual_type"] = visual_data["visual_type"]
         question_data["visual_content"] = visual_data["visual_content"]
         question_data["visual_caption"] = visual_data["visual_caption"]
 
-        questions.append(question_data)
-
     payload = {
         "created_at": datetime.utcnow().isoformat(),
         "subject": subject,
@@ -236,80 +238,12 @@ def message_parents(class_id: int, teacher_id: int, message: str) -> Dict:
 
 def get_class_analytics(class_id: int) -> Dict:
     """Compute class analytics from AssessmentResult: averages, ability tiers, per-subject breakdown, and trend deltas."""
-    students = Student.query.filter_by(class_id=class_id).all()
-    summary: Dict = {"class_id": class_id, "students": [], "subjects": {}, "flags": []}
-
-    # Per-student analytics
-    for s in students:
-        results = (
-            AssessmentResult.query.filter_by(student_id=s.id)
-            .order_by(AssessmentResult.created_at.desc())
-            .limit(20)
-            .all()
-        )
-        last10 = results[:10]
-        prev10 = results[10:20]
-        scores_last = [r.score for r in last10 if r.score is not None]
-        scores_prev = [r.score for r in prev10 if r.score is not None]
-        avg_last = sum(scores_last) / len(scores_last) if scores_last else 0
-        avg_prev = sum(scores_prev) / len(scores_prev) if scores_prev else 0
-        delta = round(avg_last - avg_prev, 2)
-
-        # Ability tier based on last10
-        if avg_last < 60:
-            tier = "struggling"
-        elif avg_last < 85:
-            tier = "on_level"
-        else:
-            tier = "advanced"
-
-        # Per-subject breakdown (last10)
-        subject_avgs: Dict[str, float] = {}
-        subject_groups: Dict[str, List[float]] = {}
-        for r in last10:
-            subj = getattr(r, "subject", "unknown") or "unknown"
-            if r.score is None:
-                continue
-            subject_groups.setdefault(subj, []).append(r.score)
-        for subj, arr in subject_groups.items():
-            subject_avgs[subj] = round(sum(arr) / len(arr), 2)
-
-        # Flag low subjects for intervention
-        weak_subjects = [subj for subj, a in subject_avgs.items() if a < 70]
-        suggested_mode = "adaptive" if tier == "on_level" else ("scaffold" if tier == "struggling" else "mastery")
-
-        summary["students"].append({
-            "student_id": s.id,
-            "name": getattr(s, "name", "Student"),
-            "avg": round(avg_last, 2),
-            "prev_avg": round(avg_prev, 2),
-            "delta": delta,
-            "ability": tier,
-            "subjects": subject_avgs,
-            "weak_subjects": weak_subjects,
-            "suggested_mode": suggested_mode,
-        })
-
-        # Aggregate class-level subjects
-        for subj, a in subject_avgs.items():
-            agg = summary["subjects"].setdefault(subj, {"scores": []})
-            agg["scores"].append(a)
-
-        # Class flags: student with steep negative trend or multiple weak subjects
-        if delta < -10 or len(weak_subjects) >= 2:
-            summary["flags"].append({
-                "student_id": s.id,
-                "name": getattr(s, "name", "Student"),
-                "delta": delta,
-                "weak_subjects": weak_subjects,
-            })
-
-    # Compute class-level subject averages
-    for subj, agg in summary["subjects"].items():
-        arr = agg.get("scores", [])
-        summary["subjects"][subj] = {"avg": round(sum(arr) / len(arr), 2) if arr else 0, "n": len(arr)}
-
-    return summary
+    return compute_class_analytics(class_id)
+
+
+def get_teacher_class_analytics(teacher_id: int) -> Dict[int, Dict]:
+    """get_class_analytics() for all of a teacher's classes, keyed by class id, in a fixed number of queries."""
+    return compute_teacher_class_analytics(teacher_id)
 
 
 def build_progress_report(student_id: int) -> Dict:
@@ -329,128 +263,8 @@ def get_early_warnings(teacher_id: int) -> Dict:
     """
     Get comprehensive early warning alerts for all students across teacher's classes.
     Returns at-risk students categorized by warning type.
-    """
-    from models import Student, Class, AssessmentResult, ActivityLog
-    from datetime import datetime, timedelta
-
-    classes = Class.query.filter_by(teacher_id=teacher_id).all()
-    warnings = {
-        "declining_performance": [],  # Delta < -10
-        "low_performance": [],  # 2+ subjects < 60%
-        "inactive": [],  # No login in 7+ days
-        "no_recent_activity": [],  # No activity in 7+ days
-        "critical": []  # Multiple warning types
-    }
 
-    now = datetime.utcnow()
-    week_ago = now - timedelta(days=7)
-
-    for cls in classes:
-        students = Student.query.filter_by(class_id=cls.id).all()
-
-        for student in students:
-            student_warnings = []
-
-            # Check 1: Declining performance (delta < -10)
-            results = (
-                AssessmentResult.query.filter_by(student_id=student.id)
-                .order_by(AssessmentResult.created_at.desc())
-                .limit(20)
-                .all()
-            )
-
-            if len(results) >= 10:
-                last10 = results[:10]
-                prev10 = results[10:20]
-                scores_last = [r.score_percent for r in last10 if r.score_percent is not None]
-                scores_prev = [r.score_percent for r in prev10 if r.score_percent is not None]
-
-                if scores_last and scores_prev:
-                    avg_last = sum(scores_last) / len(scores_last)
-                    avg_prev = sum(scores_prev) / len(scores_prev)
-                    delta = avg_last - avg_prev
-
-                    if delta < -10:
-                        student_warnings.append("declining")
-                        warnings["declining_performance"].append({
-                            "student_id": student.id,
-                            "student_name": student.student_name,
-                            "class_name": cls.class_name,
-                            "class_id": cls.id,
-                            "delta": round(delta, 1),
-                            "current_avg": round(avg_last, 1),
-                            "previous_avg": round(avg_prev, 1)
-                        })
-
-            # Check 2: Low performance in multiple subjects
-            if len(results) >= 5:
-                subject_groups = {}
-                for r in results[:10]:
-                    if r.subject and r.score_percent is not None:
-                        subject_groups.setdefault(r.subject, []).append(r.score_percent)
-
-                weak_subjects = []
-                for subj, scores in subject_groups.items():
-                    avg = sum(scores) / len(scores)
-                    if avg < 60:
-                        weak_subjects.append({"subject": subj, "avg": round(avg, 1)})
-
-                if len(weak_subjects) >= 2:
-                    student_warnings.append("low_performance")
-                    warnings["low_performance"].append({
-                        "student_id": student.id,
-                        "student_name": student.student_name,
-                        "class_name": cls.class_name,
-                        "class_id": cls.id,
-                        "weak_subjects": weak_subjects,
-                        "count": len(weak_subjects)
-                    })
-
-            # Check 3: Haven't logged in recently
-            if student.last_login:
-                days_since_login = (now - student.last_login).days
-                if days_since_login >= 7:
-                    student_warnings.append("inactive")
-                    warnings["inactive"].append({
-                        "student_id": student.id,
-                        "student_name": student.student_name,
-                        "class_name": cls.class_name,
-                        "class_id": cls.id,
-                        "days_since_login": days_since_login,
-                        "last_login": student.last_login.strftime("%Y-%m-%d") if student.last_login else "Never"
-                    })
-
-            # Check 4: No recent activity
-            recent_activity = ActivityLog.query.filter(
-                ActivityLog.student_id == student.id,
-                ActivityLog.created_at >= week_ago
-            ).count()
-
-            if recent_activity == 0 and len(results) > 0:  # Has history but no recent activity
-                student_warnings.append("no_activity")
-                warnings["no_recent_activity"].append({
-                    "student_id": student.id,
-                    "student_name": student.student_name,
-                    "class_name": cls.class_name,
-                    "class_id": cls.id,
-                    "days_inactive": 7
-                })
-
-            # Critical: Multiple warning types
-            if len(student_warnings) >= 2:
-                warnings["critical"].append({
-                    "student_id": student.id,
-                    "student_name": student.student_name,
-                    "class_name": cls.class_name,
-                    "class_id": cls.id,
-                    "warning_types": student_warnings,
-                    "warning_count": len(student_warnings)
-                })
-
-    # Calculate totals
-    warnings["total_at_risk"] = len(set(
-        [w["student_id"] for category in ["declining_performance", "low_performance", "inactive", "no_recent_activity"]
-         for w in warnings[category]]
-    ))
-
-    return warnings
\ No newline at end of file
+    Runs a fixed number of queries however many classes/students the teacher has
+    (see modules/class_analytics.py).
+    """
+    return compute_early_warnings(teacher_id)
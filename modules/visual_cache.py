@@ -0,0 +1,161 @@
+"""
+Visual Aid Cache
+================
+Content-addressed store of generated visual aids, shared by every worker.
+
+The same concept at the same grade (coordinate planes, fraction bars, the
+water cycle) gets the same diagram, so a visual is generated once and
+reused before any AI call is made.
+
+- Keyed by sha256(VISUAL_CONTENT_VERSION, visual type, grade band,
+  normalized concept text); normalization only lowercases and collapses
+  whitespace, so "y = 2x + 3" and "y = 2x - 3" never share a diagram
+- Lookups for a whole assignment are one query; hits bump hit_count
+- Fallback output from a failed generation is never stored
+- Reads and writes use their own short transactions, so they never
+  commit (or roll back) the caller's session
+- Failures degrade to "not cached" - a broken cache never blocks a visual
+
+Hit/miss counts are reported to modules/performance_monitor.py as the
+"visual" cache; /admin/visual-cache shows them with the most reused entries.
+"""
+
+import hashlib
+import re
+from datetime import datetime
+from typing import Dict, Iterable
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, VisualCache
+from modules.answer_cache import grade_band
+from modules.performance_monitor import track_event
+
+
+# ============================================================
+# CACHE CONFIGURATION
+# ============================================================
+
+# Bump when the visual prompts in visual_generator.py (or the key
+# normalization below) change - rows from older versions are ignored and
+# regenerated on demand.
+VISUAL_CONTENT_VERSION = 2
+
+MAX_CONCEPT_LENGTH = 500
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+# ============================================================
+# KEYS
+# ============================================================
+
+def normalize_concept(text: str) -> str:
+    """Lowercase and collapse whitespace - operators and symbols are kept"""
+    return _WHITESPACE.sub(" ", (text or "").lower()).strip()[:MAX_CONCEPT_LENGTH]
+
+
+def visual_key(visual_type: str, text: str, grade) -> str:
+    """Content address of a visual: same type, grade band and concept -> same key"""
+    raw = f"{VISUAL_CONTENT_VERSION}|{visual_type}|{grade_band(grade)}|{normalize_concept(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ============================================================
+# LOOKUP + STORE
+# ============================================================
+
+def get_cached_visuals(keys: Iterable[str]) -> Dict[str, str]:
+    """Cached content for each key that has an entry (one query for all keys)"""
+    keys = list(set(keys))
+    if not keys:
+        return {}
+
+    table = VisualCache.__table__
+    try:
+        with db.engine.begin() as conn:
+            found = dict(conn.execute(
+                select(table.c.content_key, table.c.content).where(table.c.content_key.in_(keys))
+            ).all())
+            if found:
+                conn.execute(
+                    update(table)
+                    .where(table.c.content_key.in_(list(found)))
+                    .values(hit_count=table.c.hit_count + 1, last_used_at=datetime.utcnow())
+                )
+    except Exception as e:
+        print(f"⚠️ Visual cache lookup failed: {e}")
+        found = {}
+
+    for key in keys:
+        track_event("cache", cache="visual", outcome="hit" if key in found else "miss")
+    return found
+
+
+def store_visual(key: str, visual_type: str, text: str, grade, content: str):
+    """Save a generated visual. A concurrent store of the same key wins."""
+    if not content:
+        return
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(insert(VisualCache.__table__).values(
+                content_key=key,
+                visual_type=visual_type,
+                grade_band=grade_band(grade),
+                concept=normalize_concept(text),
+                content_version=VISUAL_CONTENT_VERSION,
+                content=content,
+                hit_count=0,
+                created_at=datetime.utcnow(),
+                last_used_at=datetime.utcnow(),
+            ))
+    except IntegrityError:
+        pass  # Same visual stored by another request first
+    except Exception as e:
+        print(f"⚠️ Could not cache visual: {e}")
+
+
+# ============================================================
+# ADMIN
+# ============================================================
+
+def visual_cache_summary(top: int = 10) -> Dict:
+    """Entries and reuse per visual type, plus the most reused concepts"""
+    by_type = db.session.execute(
+        select(
+            VisualCache.visual_type,
+            func.count(VisualCache.id),
+            func.coalesce(func.sum(VisualCache.hit_count), 0),
+        )
+        .where(VisualCache.content_version == VISUAL_CONTENT_VERSION)
+        .group_by(VisualCache.visual_type)
+    ).all()
+
+    most_reused = db.session.execute(
+        select(VisualCache.visual_type, VisualCache.grade_band, VisualCache.concept, VisualCache.hit_count)
+        .where(VisualCache.content_version == VISUAL_CONTENT_VERSION, VisualCache.hit_count > 0)
+        .order_by(VisualCache.hit_count.desc())
+        .limit(top)
+    ).all()
+
+    return {
+        "entries": sum(count for _, count, _ in by_type),
+        "reuses": sum(int(hits) for _, _, hits in by_type),
+        "by_type": {visual_type: {"entries": count, "reuses": int(hits)} for visual_type, count, hits in by_type},
+        "most_reused": [
+            {"visual_type": row.visual_type, "grade_band": row.grade_band,
+             "concept": row.concept, "hits": row.hit_count}
+            for row in most_reused
+        ],
+    }
+
+
+def invalidate_visuals(visual_type: str = None) -> int:
+    """Delete cached visuals (all, or one visual type). Returns rows removed."""
+    query = VisualCache.query
+    if visual_type:
+        query = query.filter_by(visual_type=visual_type)
+    removed = query.delete(synchronize_session=False)
+    db.session.commit()
+    return removed
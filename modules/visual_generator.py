@@ -1,14 +1,33 @@
 """
 Visual Generator for Assignments and Lessons
 Generates ASCII art, Mermaid diagrams, and visual descriptions for educational content
+
+Generated visuals are cached by concept, visual type and grade band
+(modules/visual_cache.py) and reused before any AI call.
 """
 
 import os
-from typing import Dict, Optional, Literal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Literal
 from modules.ai_client import client
+from modules.visual_cache import get_cached_visuals, store_visual, visual_key
 
 VisualType = Literal["ascii", "mermaid", "description", "none"]
 
+# Caption shown above each kind of visual
+CAPTIONS = {
+    "ascii": "Diagram:",
+    "mermaid": "Visual diagram:",
+    "description": "Visualize this:",
+}
+
+# Visuals generated at once per worker process (see add_visuals_to_questions)
+VISUAL_WORKERS = int(os.getenv("VISUAL_WORKERS", "6"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
 
 def should_include_visual(question_text: str, topic: str = "") -> bool:
     """
@@ -78,6 +97,15 @@ def detect_visual_type(content: str, subject: str = "") -> VisualType:
     return "none"
 
 
+def _fallback_visual(visual_type: str, prompt: str) -> str:
+    """Placeholder content returned when generation fails (never cached)"""
+    if visual_type == "ascii":
+        return f"[Visual diagram for: {prompt[:100]}...]"
+    if visual_type == "mermaid":
+        return f"graph TD\n    A[{prompt[:50]}...]"
+    return ""
+
+
 def generate_ascii_visual(prompt: str, context: str = "") -> str:
     """
     Generate ASCII art or text-based diagram for a question/concept.
@@ -162,7 +190,7 @@ Return ONLY the ASCII diagram with a brief caption. Keep it simple and education
 
     except Exception as e:
         print(f"❌ Error generating ASCII visual: {e}")
-        return f"[Visual diagram for: {prompt[:100]}...]"
+        return _fallback_visual("ascii", prompt)
 
 
 def generate_mermaid_diagram(prompt: str, context: str = "") -> str:
@@ -259,7 +287,7 @@ Return ONLY the Mermaid code (starting with ```mermaid). Keep it educational and
 
     except Exception as e:
         print(f"❌ Error generating Mermaid diagram: {e}")
-        return f"graph TD\n    A[{prompt[:50]}...]"
+        return _fallback_visual("mermaid", prompt)
 
 
 def generate_visual_description(prompt: str, context: str = "") -> str:
@@ -321,7 +349,56 @@ Help students visualize this concept clearly."""
 
     except Exception as e:
         print(f"❌ Error generating visual description: {e}")
-        return ""
+        return _fallback_visual("description", prompt)
+
+
+def _no_visual() -> Dict[str, str]:
+    return {
+        "visual_type": "none",
+        "visual_content": "",
+        "visual_caption": ""
+    }
+
+
+def plan_visual(question_text: str, topic: str = "", subject: str = "") -> VisualType:
+    """Decide which visual (if any) a question gets - local checks only, no AI call"""
+    if not should_include_visual(question_text, topic):
+        return "none"
+    return detect_visual_type(question_text + " " + topic, subject)
+
+
+def _generate_visual(visual_type: VisualType, question_text: str, context: str) -> Dict[str, str]:
+    """Run the AI generator for one planned visual"""
+    if visual_type == "ascii":
+        visual_content = generate_ascii_visual(question_text, context)
+    elif visual_type == "mermaid":
+        visual_content = generate_mermaid_diagram(question_text, context)
+    elif visual_type == "description":
+        visual_content = generate_visual_description(question_text, context)
+    else:
+        return _no_visual()
+
+    return {
+        "visual_type": visual_type,
+        "visual_content": visual_content,
+        "visual_caption": CAPTIONS[visual_type]
+    }
+
+
+def _cached_visual(visual_type: VisualType, content: str) -> Dict[str, str]:
+    return {
+        "visual_type": visual_type,
+        "visual_content": content,
+        "visual_caption": CAPTIONS[visual_type]
+    }
+
+
+def _store_generated(key: str, question_text: str, grade, visual: Dict[str, str]):
+    """Cache a freshly generated visual unless generation fell back to a placeholder"""
+    visual_type = visual["visual_type"]
+    if visual_type == "none" or visual["visual_content"] == _fallback_visual(visual_type, question_text):
+        return
+    store_visual(key, visual_type, question_text, grade, visual["visual_content"])
 
 
 def add_visual_to_question(question_text: str, topic: str = "", subject: str = "", grade: str = "8") -> Dict[str, str]:
@@ -335,88 +412,127 @@ def add_visual_to_question(question_text: str, topic: str = "", subject: str = "
             "visual_caption": "brief caption/title for the visual"
         }
     """
-    # Check if visual would be helpful
-    if not should_include_visual(question_text, topic):
-        return {
-            "visual_type": "none",
-            "visual_content": "",
-            "visual_caption": ""
-        }
-
-    # Detect best visual type
-    visual_type = detect_visual_type(question_text + " " + topic, subject)
-
+    visual_type = plan_visual(question_text, topic, subject)
     if visual_type == "none":
-        return {
-            "visual_type": "none",
-            "visual_content": "",
-            "visual_caption": ""
-        }
+        return _no_visual()
+
+    # Reuse the same concept's visual for this grade band if we've made it before
+    key = visual_key(visual_type, question_text, grade)
+    cached = get_cached_visuals([key])
+    if key in cached:
+        return _cached_visual(visual_type, cached[key])
 
     context = f"Subject: {subject}, Grade: {grade}, Topic: {topic}"
+    visual = _generate_visual(visual_type, question_text, context)
+    _store_generated(key, question_text, grade, visual)
+    return visual
 
-    # Generate the appropriate visual
-    visual_content = ""
-    visual_caption = ""
 
-    if visual_type == "ascii":
-        visual_content = generate_ascii_visual(question_text, context)
-        visual_caption = "Diagram:"
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=VISUAL_WORKERS, thread_name_prefix="visuals")
+    return _executor
 
-    elif visual_type == "mermaid":
-        visual_content = generate_mermaid_diagram(question_text, context)
-        visual_caption = "Visual diagram:"
 
-    elif visual_type == "description":
-        visual_content = generate_visual_description(question_text, context)
-        visual_caption = "Visualize this:"
+def add_visuals_to_questions(items: List[Dict], subject: str = "", grade: str = "8") -> List[Dict[str, str]]:
+    """
+    Visual aids for many questions at once.
 
-    return {
-        "visual_type": visual_type,
-        "visual_content": visual_content,
-        "visual_caption": visual_caption
-    }
+    Every item is planned first (plan_visual, no AI calls). Planned visuals
+    are looked up in the visual cache in one query; the misses - once per
+    distinct concept - are generated concurrently on a pool of
+    VISUAL_WORKERS threads, so the wait is close to one generation rather
+    than one per question. A generation that fails gets no visual; the
+    others are unaffected.
+
+    Args:
+        items: [{"question_text": str, "topic": str (optional)}, ...]
+
+    Returns:
+        One add_visual_to_question()-style dict per item, in order
+    """
+    results = [_no_visual() for _ in items]
+
+    planned = []  # (index, visual_type, key)
+    for index, item in enumerate(items):
+        visual_type = plan_visual(item["question_text"], item.get("topic", ""), subject)
+        if visual_type != "none":
+            planned.append((index, visual_type, visual_key(visual_type, item["question_text"], grade)))
+    if not planned:
+        return results
+
+    cached = get_cached_visuals(key for _, _, key in planned)
+
+    # One generation per distinct concept that isn't cached
+    to_generate = {}  # key -> (visual_type, question_text, context)
+    for index, visual_type, key in planned:
+        if key in cached:
+            results[index] = _cached_visual(visual_type, cached[key])
+        elif key not in to_generate:
+            item = items[index]
+            context = f"Subject: {subject}, Grade: {grade}, Topic: {item.get('topic', '')}"
+            to_generate[key] = (visual_type, item["question_text"], context)
+
+    generated = {}
+    if len(to_generate) == 1:
+        key, args = next(iter(to_generate.items()))
+        generated[key] = _generate_visual(*args)
+    else:
+        futures = {key: _get_executor().submit(_generate_visual, *args) for key, args in to_generate.items()}
+        for key, future in futures.items():
+            try:
+                generated[key] = future.result()
+            except Exception as e:
+                print(f"❌ Error generating visual: {e}")
+
+    # Store in this thread - the pool threads have no app context
+    for key, visual in generated.items():
+        _store_generated(key, to_generate[key][1], grade, visual)
+
+    for index, _, key in planned:
+        if key in generated:
+            results[index] = dict(generated[key])
+
+    return results
 
 
 def add_visual_to_lesson(lesson_data: Dict, subject: str = "", grade: int = 8) -> Dict:
     """
     Add visual aids to lesson content where appropriate.
 
-    Modifies the lesson_data dict in place, adding visual fields.
+    Modifies the lesson_data dict in place, adding visual fields. The
+    explanation and example visuals are generated together
+    (add_visuals_to_questions).
 
     Returns:
         Updated lesson_data with visual fields added
     """
+    targets = []  # (dict that gets the visual, item to generate)
+
     # Add visual to explanation if it would help
     if "explanation" in lesson_data:
         explanation = lesson_data["explanation"]
         title = lesson_data.get("title", "")
 
         if should_include_visual(explanation, title):
-            visual = add_visual_to_question(
-                f"{title}: {explanation[:500]}",
-                topic=title,
-                subject=subject,
-                grade=str(grade)
-            )
-
-            if visual["visual_type"] != "none":
-                lesson_data["visual"] = visual
+            targets.append((lesson_data, {"question_text": f"{title}: {explanation[:500]}", "topic": title}))
 
     # Add visuals to examples if they would help
     if "examples" in lesson_data and isinstance(lesson_data["examples"], list):
-        for i, example in enumerate(lesson_data["examples"]):
+        for example in lesson_data["examples"]:
             if isinstance(example, dict) and "scenario" in example:
                 scenario = example["scenario"]
 
                 if should_include_visual(scenario):
-                    visual = add_visual_to_question(
-                        scenario,
-                        subject=subject,
-                        grade=str(grade)
-                    )
-
-                    if visual["visual_type"] != "none":
-                        lesson_data["examples"][i]["visual"] = visual
+                    targets.append((example, {"question_text": scenario}))
+
+    if targets:
+        visuals = add_visuals_to_questions([item for _, item in targets], subject=subject, grade=str(grade))
+        for (target, _), visual in zip(targets, visuals):
+            if visual["visual_type"] != "none":
+                target["visual"] = visual
 
     return lesson_data
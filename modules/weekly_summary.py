@@ -1,13 +1,215 @@
 """
 Parent Weekly Summary Email System
 Sends automated weekly progress reports to parents
+
+Batch mode (send_all_weekly_summaries) works through opted-in parents in
+batches of SUMMARY_BATCH_SIZE:
+- the week's activity for every student in the batch is aggregated in a
+  few grouped queries (aggregate_week), not several queries per student
+- emails are rendered on the calling thread while SUMMARY_SEND_WORKERS
+  threads send the ones already rendered, each over one reused SMTP
+  connection (reopened after a failure). Rendering is only string
+  formatting, so no process pool (forking with live sender threads can
+  deadlock)
+- sent summaries are recorded in weekly_summary_deliveries every
+  SUMMARY_CHECKPOINT_SENDS sends, in their own short transaction, so a
+  run that stops part way resumes with the parents it hadn't reached and
+  resends at most that many
 """
 
-from datetime import datetime, timedelta
+import queue
+import threading
+import time as timer
+from datetime import datetime, time, timedelta
+from types import SimpleNamespace
 from typing import List, Dict
+from flask import current_app
 from flask_mail import Message
-from models import db, Parent, Student, AssessmentResult, AssignedQuestion
-from sqlalchemy import func
+from models import (
+    db,
+    Parent,
+    Student,
+    AssessmentResult,
+    AssignedPractice,
+    AssignedQuestion,
+    StudentSubmission,
+    WeeklySummaryDelivery,
+)
+from sqlalchemy import and_, case, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+SUMMARY_BATCH_SIZE = 200  # parents per batch
+SUMMARY_SEND_WORKERS = 2  # concurrent SMTP connections
+SUMMARY_CHECKPOINT_SENDS = 10  # deliveries recorded at least this often
+MINUTES_PER_QUESTION = 2  # rough time-spent estimate
+IN_CLAUSE_CHUNK = 500
+
+
+# ============================================================
+# WEEKLY ACTIVITY
+# ============================================================
+
+def week_bounds(today=None):
+    """Monday 00:00 of this week and of next week"""
+    today = today or datetime.today().date()
+    week_start = datetime.combine(today - timedelta(days=today.weekday()), time.min)
+    return week_start, week_start + timedelta(days=7)
+
+
+def _chunks(items: List, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _subject_title(subject: str) -> str:
+    return subject.replace('_', ' ').title()
+
+
+def aggregate_week(student_ids: List[int], week_start: datetime, week_end: datetime) -> Dict[int, Dict]:
+    """
+    The week's activity for many students at once - three grouped queries
+    per IN_CLAUSE_CHUNK students.
+
+    Returns:
+        {student_id: {"assignments_completed", "questions_answered", "subjects",
+                      "incomplete", "grades_count", "score_sum", "low_subjects"}}
+    """
+    activity = {
+        student_id: {
+            "assignments_completed": 0,
+            "questions_answered": 0,
+            "subjects": set(),
+            "incomplete": 0,
+            "grades_count": 0,
+            "score_sum": 0.0,
+            "low_subjects": set(),
+        }
+        for student_id in student_ids
+    }
+
+    questions_per_assignment = (
+        select(AssignedQuestion.practice_id, func.count(AssignedQuestion.id).label("questions"))
+        .group_by(AssignedQuestion.practice_id)
+        .subquery()
+    )
+
+    for chunk in _chunks(list(student_ids), IN_CLAUSE_CHUNK):
+        # Assignments submitted this week, per subject
+        rows = db.session.execute(
+            select(
+                StudentSubmission.student_id,
+                AssignedPractice.subject,
+                func.count(StudentSubmission.id).label("completed"),
+                func.coalesce(func.sum(questions_per_assignment.c.questions), 0).label("questions"),
+            )
+            .join(AssignedPractice, StudentSubmission.assignment_id == AssignedPractice.id)
+            .outerjoin(questions_per_assignment, questions_per_assignment.c.practice_id == AssignedPractice.id)
+            .where(
+                StudentSubmission.student_id.in_(chunk),
+                StudentSubmission.submitted_at >= week_start,
+                StudentSubmission.submitted_at < week_end,
+            )
+            .group_by(StudentSubmission.student_id, AssignedPractice.subject)
+        ).all()
+        for row in rows:
+            entry = activity[row.student_id]
+            entry["assignments_completed"] += row.completed
+            entry["questions_answered"] += int(row.questions)
+            if row.subject:
+                entry["subjects"].add(row.subject)
+
+        # Assignments started but not submitted
+        rows = db.session.execute(
+            select(StudentSubmission.student_id, func.count(StudentSubmission.id))
+            .where(StudentSubmission.student_id.in_(chunk), StudentSubmission.submitted_at.is_(None))
+            .group_by(StudentSubmission.student_id)
+        ).all()
+        for student_id, incomplete in rows:
+            activity[student_id]["incomplete"] = incomplete
+
+        # Grades received this week, per subject
+        score = AssessmentResult.score_percent
+        rows = db.session.execute(
+            select(
+                AssessmentResult.student_id,
+                AssessmentResult.subject,
+                func.count(AssessmentResult.id).label("grades"),
+                func.coalesce(func.sum(func.coalesce(score, 0)), 0).label("score_sum"),
+                func.coalesce(func.sum(case((and_(score > 0, score < 70), 1), else_=0)), 0).label("low"),
+            )
+            .where(
+                AssessmentResult.student_id.in_(chunk),
+                AssessmentResult.created_at >= week_start,
+                AssessmentResult.created_at < week_end,
+            )
+            .group_by(AssessmentResult.student_id, AssessmentResult.subject)
+        ).all()
+        for row in rows:
+            entry = activity[row.student_id]
+            entry["grades_count"] += row.grades
+            entry["score_sum"] += float(row.score_sum)
+            if row.low:
+                entry["low_subjects"].add(row.subject or "Unknown")
+
+    return activity
+
+
+def _student_summary(student, activity: Dict) -> Dict:
+    """Turn one student's aggregated week into the dict the templates render"""
+    areas_needing_attention = [
+        f"{_subject_title(subject)} - scores below 70%"
+        for subject in sorted(activity["low_subjects"])[:3]
+    ]
+    if activity["incomplete"] > 3:
+        areas_needing_attention.append(f"{activity['incomplete']} incomplete assignments")
+
+    grades_count = activity["grades_count"]
+    time_spent_minutes = activity["questions_answered"] * MINUTES_PER_QUESTION
+
+    return {
+        'student': SimpleNamespace(id=student.id, name=student.student_name),
+        'assignments_completed': activity["assignments_completed"],
+        'average_score': round(activity["score_sum"] / grades_count, 1) if grades_count else 0,
+        'subjects_practiced': [_subject_title(s) for s in sorted(activity["subjects"])],
+        'time_spent_hours': round(time_spent_minutes / 60, 1),
+        'areas_needing_attention': areas_needing_attention,
+        'grades_count': grades_count
+    }
+
+
+def build_weekly_summaries(parents: List[Parent], week_start: datetime, week_end: datetime) -> List[Dict]:
+    """
+    Summary data for many parents at once. Parents without students are
+    left out. Entries hold plain values only, so they can be rendered in
+    another process.
+    """
+    parent_ids = [parent.id for parent in parents]
+    students_by_parent: Dict[int, List] = {}
+    for chunk in _chunks(parent_ids, IN_CLAUSE_CHUNK):
+        rows = db.session.execute(
+            select(Student.id, Student.student_name, Student.parent_id)
+            .where(Student.parent_id.in_(chunk))
+            .order_by(Student.id)
+        ).all()
+        for row in rows:
+            students_by_parent.setdefault(row.parent_id, []).append(row)
+
+    student_ids = [s.id for students in students_by_parent.values() for s in students]
+    activity = aggregate_week(student_ids, week_start, week_end)
+
+    summaries = []
+    for parent in parents:
+        students = students_by_parent.get(parent.id)
+        if not students:
+            continue
+        summaries.append({
+            'parent': SimpleNamespace(id=parent.id, name=parent.name, email=parent.email),
+            'student_summaries': [_student_summary(s, activity[s.id]) for s in students],
+            'week_start': week_start.strftime('%B %d, %Y'),
+            'week_end': (week_start + timedelta(days=6)).strftime('%B %d, %Y')
+        })
+    return summaries
+
 
 def generate_weekly_summary(parent_id: int) -> Dict:
     """
@@ -22,102 +224,35 @@ def generate_weekly_summary(parent_id: int) -> Dict:
     if not parent:
         return None
 
-    # Get week boundaries (Monday to Sunday)
-    today = datetime.today()
-    week_start = today - timedelta(days=today.weekday())  # Monday
-    week_end = week_start + timedelta(days=6)  # Sunday
-
-    week_start_str = week_start.strftime('%Y-%m-%d')
-    week_end_str = week_end.strftime('%Y-%m-%d')
-
-    # Get all students for this parent
-    students = Student.query.filter_by(parent_id=parent_id).all()
-
-    student_summaries = []
-
-    for student in students:
-        summary = generate_student_summary(student, week_start_str, week_end_str)
-        student_summaries.append(summary)
+    week_start, week_end = week_bounds()
+    summaries = build_weekly_summaries([parent], week_start, week_end)
+    if summaries:
+        return summaries[0]
 
     return {
-        'parent': parent,
-        'student_summaries': student_summaries,
+        'parent': SimpleNamespace(id=parent.id, name=parent.name, email=parent.email),
+        'student_summaries': [],
         'week_start': week_start.strftime('%B %d, %Y'),
-        'week_end': week_end.strftime('%B %d, %Y')
+        'week_end': (week_start + timedelta(days=6)).strftime('%B %d, %Y')
     }
 
 
-def generate_student_summary(student: Student, week_start: str, week_end: str) -> Dict:
+def generate_student_summary(student: Student, week_start: datetime, week_end: datetime) -> Dict:
     """
     Generate summary for a single student for the week.
     """
-    # Get assignments completed this week
-    assignments_completed = db.session.query(func.count(AssignedQuestion.id)).filter(
-        AssignedQuestion.student_id == student.id,
-        AssignedQuestion.submitted_at >= week_start,
-        AssignedQuestion.submitted_at <= week_end
-    ).scalar() or 0
-
-    # Get grades received this week
-    grades = AssessmentResult.query.filter(
-        AssessmentResult.student_id == student.id,
-        AssessmentResult.completed_at >= week_start,
-        AssessmentResult.completed_at <= week_end
-    ).all()
-
-    avg_score = 0
-    if grades:
-        total_score = sum(g.score or 0 for g in grades)
-        avg_score = round(total_score / len(grades), 1)
-
-    # Get subjects practiced
-    subjects_practiced = db.session.query(
-        func.distinct(AssignedQuestion.subject)
-    ).filter(
-        AssignedQuestion.student_id == student.id,
-        AssignedQuestion.submitted_at >= week_start,
-        AssignedQuestion.submitted_at <= week_end
-    ).all()
-
-    subjects_list = [s[0].replace('_', ' ').title() for s in subjects_practiced]
-
-    # Estimate time spent (rough calculation)
-    # Assume 2 minutes per question on average
-    time_spent_minutes = assignments_completed * 2
-    time_spent_hours = round(time_spent_minutes / 60, 1)
-
-    # Get new badges (if tracking exists)
-    # For now, we'll skip badges - can be added later
-
-    # Determine areas needing attention
-    areas_needing_attention = []
-
-    # Check for assignments with low scores
-    low_score_assignments = [g for g in grades if g.score and g.score < 70]
-    if low_score_assignments:
-        low_subjects = set(a.assignment.subject if hasattr(a.assignment, 'subject') else 'Unknown'
-                          for a in low_score_assignments[:3])
-        for subj in low_subjects:
-            areas_needing_attention.append(f"{subj.replace('_', ' ').title()} - scores below 70%")
-
-    # Check for incomplete assignments
-    incomplete_count = db.session.query(func.count(AssignedQuestion.id)).filter(
-        AssignedQuestion.student_id == student.id,
-        AssignedQuestion.submitted_at.is_(None)
-    ).scalar() or 0
-
-    if incomplete_count > 3:
-        areas_needing_attention.append(f"{incomplete_count} incomplete assignments")
+    activity = aggregate_week([student.id], week_start, week_end)
+    return _student_summary(student, activity[student.id])
 
-    return {
-        'student': student,
-        'assignments_completed': assignments_completed,
-        'average_score': avg_score,
-        'subjects_practiced': subjects_list,
-        'time_spent_hours': time_spent_hours,
-        'areas_needing_attention': areas_needing_attention,
-        'grades_count': len(grades)
-    }
+
+def _summary_message(data: Dict, rendered=None) -> Message:
+    html_body, text_body = rendered or render_summary(data)
+    return Message(
+        subject=f"CozmicLearning Weekly Summary - {data['week_end']}",
+        recipients=[data['parent'].email],
+        html=html_body,
+        body=text_body
+    )
 
 
 def send_weekly_summary_email(mail, parent_id: int) -> bool:
@@ -143,19 +278,7 @@ def send_weekly_summary_email(mail, parent_id: int) -> bool:
         print(f"No email for parent {parent_id}")
         return False
 
-    # Generate HTML email
-    html_body = render_email_template(summary_data)
-
-    # Generate plain text version
-    text_body = render_text_email(summary_data)
-
-    # Create message
-    msg = Message(
-        subject=f"CozmicLearning Weekly Summary - {summary_data['week_end']}",
-        recipients=[parent.email],
-        html=html_body,
-        body=text_body
-    )
+    msg = _summary_message(summary_data)
 
     try:
         mail.send(msg)
@@ -166,6 +289,11 @@ def send_weekly_summary_email(mail, parent_id: int) -> bool:
         return False
 
 
+def render_summary(data: Dict):
+    """HTML and plain text bodies for one summary"""
+    return render_email_template(data), render_text_email(data)
+
+
 def render_email_template(data: Dict) -> str:
     """Generate HTML email content."""
     parent = data['parent']
@@ -458,29 +586,163 @@ Update preferences: https://cozmiclearning.com/parent/email-preferences
     return text
 
 
-def send_all_weekly_summaries(mail) -> Dict:
+# ============================================================
+# BATCH SENDING
+# ============================================================
+
+def _close(connection):
+    if connection is not None and connection.host:
+        try:
+            connection.host.quit()
+        except Exception:
+            pass
+
+
+def _send_loop(app, mail, outbox: queue.Queue, results: queue.Queue):
+    """One sender thread: sends everything from the outbox over a single SMTP connection"""
+    with app.app_context():
+        connection = None
+        while True:
+            item = outbox.get()
+            if item is None:
+                break
+            parent_id, msg = item
+            try:
+                if connection is None:
+                    connection = mail.connect().__enter__()
+                connection.send(msg)
+                results.put((parent_id, None))
+            except Exception as e:
+                results.put((parent_id, e))
+                _close(connection)  # the next message gets a fresh connection
+                connection = None
+        _close(connection)
+
+
+def _record_deliveries(parent_ids: List[int], week_start: datetime):
+    """Checkpoint sent summaries in their own transaction (the caller's session is left alone)"""
+    if not parent_ids:
+        return
+    table = WeeklySummaryDelivery.__table__
+    dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(db.engine.dialect.name)
+    # --no-resume sends to parents that already have this week's row
+    stmt = dialect.insert(table).on_conflict_do_nothing() if dialect is not None else insert(table)
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(stmt, [
+                {"parent_id": parent_id, "week_start": week_start.date(), "sent_at": datetime.utcnow()}
+                for parent_id in parent_ids
+            ])
+    except Exception as e:
+        print(f"⚠️ Could not record weekly summary deliveries: {e}")
+
+
+def send_all_weekly_summaries(mail, batch_size: int = SUMMARY_BATCH_SIZE,
+                              send_workers: int = SUMMARY_SEND_WORKERS,
+                              resume: bool = True) -> Dict:
     """
     Send weekly summaries to all parents who have opted in.
 
-    Returns dict with stats on how many were sent successfully.
+    With resume=True, parents already sent this week's summary (by an
+    earlier, interrupted run) are skipped.
+
+    Returns dict with stats on how many were sent successfully, plus
+    seconds spent in each stage.
     """
+    started = timer.perf_counter()
+    week_start, week_end = week_bounds()
+
     # Get all parents with email enabled
     parents = Parent.query.filter(
         Parent.email.isnot(None),
         Parent.email_weekly_summary == True
-    ).all()
+    ).order_by(Parent.id).all()
+
+    already_sent = set()
+    if resume:
+        already_sent = set(db.session.execute(
+            select(WeeklySummaryDelivery.parent_id)
+            .where(WeeklySummaryDelivery.week_start == week_start.date())
+        ).scalars())
 
     stats = {
         'total': len(parents),
         'sent': 0,
-        'failed': 0
+        'failed': 0,
+        'skipped': 0,  # no students
+        'resumed': len([p for p in parents if p.id in already_sent]),
+        'aggregate_seconds': 0.0,
+        'render_seconds': 0.0,
+        'send_seconds': 0.0,
     }
-
-    for parent in parents:
-        success = send_weekly_summary_email(mail, parent.id)
-        if success:
+    parents = [p for p in parents if p.id not in already_sent]
+
+    app = current_app._get_current_object()
+    outbox = queue.Queue(maxsize=send_workers * 4)  # bounds rendered mail waiting for SMTP
+    results = queue.Queue()
+    senders = [
+        threading.Thread(target=_send_loop, args=(app, mail, outbox, results), daemon=True)
+        for _ in range(max(send_workers, 1))
+    ]
+    for sender in senders:
+        sender.start()
+
+    emails = {}
+    delivered = []  # sent since the last checkpoint
+
+    def collect(block: bool):
+        """Record one send result (None if not blocking and none is ready)"""
+        try:
+            parent_id, error = results.get(block=block)
+        except queue.Empty:
+            return None
+        if error is None:
             stats['sent'] += 1
+            delivered.append(parent_id)
+            if len(delivered) >= SUMMARY_CHECKPOINT_SENDS:
+                _record_deliveries(delivered, week_start)
+                delivered.clear()
         else:
             stats['failed'] += 1
+            print(f"❌ Failed to send weekly summary to {emails[parent_id]}: {error}")
+        return parent_id
 
+    try:
+        for batch in _chunks(parents, batch_size):
+            stage = timer.perf_counter()
+            summaries = build_weekly_summaries(batch, week_start, week_end)
+            stats['skipped'] += len(batch) - len(summaries)
+            stats['aggregate_seconds'] += timer.perf_counter() - stage
+
+            outstanding = 0
+            for data in summaries:
+                stage = timer.perf_counter()
+                parent_id = data['parent'].id
+                emails[parent_id] = data['parent'].email
+                msg = _summary_message(data, render_summary(data))
+                stats['render_seconds'] += timer.perf_counter() - stage
+
+                stage = timer.perf_counter()
+                outbox.put((parent_id, msg))  # blocks while the senders are behind
+                outstanding += 1
+                while outstanding and collect(block=False) is not None:
+                    outstanding -= 1
+                stats['send_seconds'] += timer.perf_counter() - stage
+
+            stage = timer.perf_counter()
+            for _ in range(outstanding):
+                collect(block=True)
+            stats['send_seconds'] += timer.perf_counter() - stage
+
+            print(f"   📬 {stats['sent'] + stats['failed'] + stats['skipped']}/{len(parents)} parents processed")
+    finally:
+        for _ in senders:
+            outbox.put(None)
+        for sender in senders:
+            sender.join()
+        while collect(block=False) is not None:
+            pass
+        _record_deliveries(delivered, week_start)
+
+    stats['elapsed_seconds'] = timer.perf_counter() - started
     return stats
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Rebuild Student Performance Rollups
+Recomputes the student_performance_rollups table from raw history.
+
+Rollups are normally kept current on every write (assessment results,
+graded submissions, arcade games). Run this once after deploying the
+table, or any time rollups look out of sync with the raw data.
+
+For each student this script:
+1. Replays assessment results, graded submissions and game sessions in order
+2. Replaces the student's rollup rows
+3. Refreshes ability_level / average_score from the new rollups
+
+With --stale only students whose rollups don't count the same results as
+their raw history are rebuilt; startup migrations run this on every deploy.
+
+Usage:
+    python3 rebuild_performance_rollups.py            # every student
+    python3 rebuild_performance_rollups.py 12 45 46   # just these student ids
+    python3 rebuild_performance_rollups.py --stale    # only out-of-date students
+"""
+
+import sys
+import time
+
+from app import app
+from models import db, Student
+from modules.performance_rollup import ensure_rollups, rebuild_rollups
+
+# Students rebuilt per transaction
+BATCH_SIZE = 200
+
+
+def backfill_stale():
+    """Rebuild only students the rollups don't cover (startup migrations). Returns True on success."""
+    with app.app_context():
+        student_ids = [sid for (sid,) in Student.query.with_entities(Student.id).order_by(Student.id)]
+        print(f"\n📊 Checking performance rollups for {len(student_ids)} students...")
+        rebuilt = 0
+        for i in range(0, len(student_ids), BATCH_SIZE):
+            try:
+                rebuilt += ensure_rollups(student_ids[i:i + BATCH_SIZE])
+            except Exception as e:
+                print(f"   ❌ Batch starting at student {student_ids[i]} failed: {e}")
+                db.session.rollback()
+                return False
+        print(f"✅ Rebuilt rollups for {rebuilt} out-of-date students")
+    return True
+
+
+def main():
+    if sys.argv[1:] == ["--stale"]:
+        sys.exit(0 if backfill_stale() else 1)
+
+    student_ids = [int(arg) for arg in sys.argv[1:]]
+
+    with app.app_context():
+        if not student_ids:
+            student_ids = [sid for (sid,) in Student.query.with_entities(Student.id).order_by(Student.id)]
+
+        print(f"\n📊 Rebuilding performance rollups for {len(student_ids)} students...")
+        start = time.time()
+        totals = {"rollups": 0, "students": 0}
+
+        for i in range(0, len(student_ids), BATCH_SIZE):
+            batch = student_ids[i:i + BATCH_SIZE]
+            try:
+                counts = rebuild_rollups(batch)
+            except Exception as e:
+                print(f"   ❌ Batch starting at student {batch[0]} failed: {e}")
+                db.session.rollback()
+                continue
+
+            totals["rollups"] += counts["rollups"]
+            totals["students"] += counts["students"]
+            print(f"   ✓ {min(i + BATCH_SIZE, len(student_ids))}/{len(student_ids)} students")
+
+        print(f"\n✅ Rebuilt {totals['rollups']} rollups for {totals['students']} students "
+              f"in {time.time() - start:.1f}s\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Refill Arcade Question Pool
+Tops up the pre-generated arcade question pool so games load without AI calls.
+
+For every pooled game and difficulty this script:
+1. Retires questions that have been served too many times
+2. Generates fresh questions in batches until the pool reaches its target size
+
+Usage:
+    python3 refill_arcade_question_pool.py              # all pooled games
+    python3 refill_arcade_question_pool.py vocab_builder
+
+Or schedule it with cron (every night at 3am):
+    0 3 * * * cd /path/to/cozmiclearning && python3 refill_arcade_question_pool.py
+"""
+
+import sys
+
+from app import app
+from generate_question_banks import generate_vocab_questions
+from modules.arcade_question_pool import (
+    POOL_GAMES,
+    POOL_DIFFICULTIES,
+    add_questions_to_pool,
+    retire_overserved_questions,
+    get_pool_size,
+    get_pool_stats,
+)
+
+# AI generator for each pooled game - signature: (difficulty, count) -> list of questions
+POOL_GENERATORS = {
+    "vocab_builder": generate_vocab_questions,
+}
+
+# Stop retrying a game/difficulty after this many batches that add nothing new
+MAX_EMPTY_BATCHES = 3
+
+
+def refill_game(game_key, config):
+    """Retire over-served questions and top up one game's pool for every difficulty"""
+    generator = POOL_GENERATORS[game_key]
+
+    for difficulty in POOL_DIFFICULTIES:
+        retired = retire_overserved_questions(game_key, difficulty, config["retire_after"])
+        size = get_pool_size(game_key, difficulty)
+        print(f"\n🎮 {game_key} ({difficulty}): {size} pooled, {retired} retired")
+
+        empty_batches = 0
+        while size < config["target_size"] and empty_batches < MAX_EMPTY_BATCHES:
+            try:
+                batch = generator(difficulty, config["batch_size"])
+                added = add_questions_to_pool(game_key, difficulty, batch)
+            except Exception as e:
+                print(f"   ⚠️ Batch failed: {e}")
+                added = 0
+
+            empty_batches = empty_batches + 1 if added == 0 else 0
+            size += added
+            print(f"   ✓ Added {added} questions ({size}/{config['target_size']})")
+
+        if size < config["target_size"]:
+            print(f"   ⚠️ Pool still below target after {MAX_EMPTY_BATCHES} empty batches")
+
+
+if __name__ == '__main__':
+    requested = sys.argv[1:] or list(POOL_GAMES.keys())
+
+    unknown = [g for g in requested if g not in POOL_GAMES]
+    if unknown:
+        print(f"❌ Unknown pooled game(s): {', '.join(unknown)}")
+        print(f"   Available: {', '.join(POOL_GAMES.keys())}")
+        sys.exit(1)
+
+    with app.app_context():
+        print("🧠 Refilling arcade question pool...")
+        print("=" * 60)
+
+        for game_key in requested:
+            refill_game(game_key, POOL_GAMES[game_key])
+
+        print("\n" + "=" * 60)
+        print("📊 Pool Status:")
+        for (game_key, difficulty), stats in sorted(get_pool_stats().items()):
+            print(f"   {game_key} ({difficulty}): {stats['size']} questions, {stats['served']} total serves")
+        print("=" * 60)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Background Job Worker
+Runs queued background jobs (parent/teacher emails, weekly reports) from
+the background_jobs table. See modules/job_queue.py.
+
+The web service runs an embedded job thread (JOB_WORKER_EMBEDDED=1 in its
+start command); run this as a separate process to take that work off the
+web workers (drop JOB_WORKER_EMBEDDED=1 from the start command), or to
+drain the queue by hand.
+Any number of these can run at once.
+
+Usage:
+    python3 run_job_worker.py            # run until stopped
+    python3 run_job_worker.py --once     # run every due job, then exit
+    python3 run_job_worker.py --stats    # print queue counts and dead jobs
+"""
+
+import argparse
+import os
+import sys
+
+# Add project directory to path
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, BASE_DIR)
+
+# This process is the worker - don't start another one inside the app
+os.environ["JOB_WORKER_EMBEDDED"] = "0"
+
+from app import app
+from modules.job_queue import JOB_POLL_SECONDS, dead_jobs, queue_stats, run_due_jobs, run_worker
+
+
+def print_stats():
+    with app.app_context():
+        counts = queue_stats()
+        print("📊 " + ", ".join(f"{count} {status}" for status, count in counts.items()))
+        for job in dead_jobs():
+            print(f"   ❌ #{job.id} {job.kind} ({job.attempts} attempts): {job.last_error}")
+
+
+def drain():
+    totals = {"done": 0, "pending": 0, "dead": 0}
+    with app.app_context():
+        while True:
+            counts = run_due_jobs()
+            if not any(counts.values()):
+                break
+            for status, count in counts.items():
+                totals[status] += count
+    print(f"✅ {totals['done']} done, {totals['pending']} to retry, {totals['dead']} dead")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background jobs")
+    parser.add_argument("--once", action="store_true", help="run every due job, then exit")
+    parser.add_argument("--stats", action="store_true", help="print queue counts and dead jobs")
+    parser.add_argument("--poll", type=int, default=JOB_POLL_SECONDS, help="seconds between polls when idle")
+    args = parser.parse_args()
+
+    if args.stats:
+        print_stats()
+    elif args.once:
+        drain()
+    else:
+        print(f"🚀 Job worker started (pid {os.getpid()}, polling every {args.poll}s)")
+        try:
+            run_worker(app, poll_seconds=args.poll)
+        except KeyboardInterrupt:
+            print("👋 Job worker stopped")
+
+
+if __name__ == "__main__":
+    main()
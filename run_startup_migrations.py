@@ -134,6 +134,30 @@ def run_migrations():
         logger.error(f"❌ Error in add_output_moderation_columns: {e}")
         success = False
 
+    # Migration 9: Add graded_by column to student_submissions
+    # Records whether a grade came from auto-grading or the teacher, so bulk regrades keep teacher grades
+    try:
+        logger.info("\n📋 Migration 9: Add graded_by column")
+        from migrations.add_graded_by_postgres import migrate as migrate_graded_by
+        if not migrate_graded_by():
+            logger.error("❌ Failed to add graded_by column")
+            success = False
+    except Exception as e:
+        logger.error(f"❌ Error in add_graded_by: {e}")
+        success = False
+
+    # Migration 10: Backfill performance rollups
+    # Rebuilds rollups (and ability tiers) for students whose rollups don't cover their history yet
+    try:
+        logger.info("\n📋 Migration 10: Backfill performance rollups")
+        from rebuild_performance_rollups import backfill_stale
+        if not backfill_stale():
+            logger.error("❌ Failed to backfill performance rollups")
+            success = False
+    except Exception as e:
+        logger.error(f"❌ Error in backfill_stale: {e}")
+        success = False
+
     if success:
         logger.info("\n✅ All startup migrations completed successfully!")
     else:
@@ -13,6 +13,10 @@ class CostTracker:
             "input": 0.00015,   # $0.150 per 1M tokens
             "output": 0.0006,   # $0.600 per 1M tokens
         },
+        "gpt-4o": {
+            "input": 0.0025,    # $2.50 per 1M tokens
+            "output": 0.01,     # $10.00 per 1M tokens
+        },
         "gpt-4.1-mini": {
             "input": 0.00015,
             "output": 0.0006,
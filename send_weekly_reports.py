@@ -9,6 +9,9 @@ Setup instructions:
 3. Add line: 0 9 * * 0 /path/to/cozmiclearning/send_weekly_reports.py
 
 Or use a task scheduler like Render Cron Jobs, Heroku Scheduler, or AWS EventBridge.
+
+Reports are queued as background jobs; the app's job workers (or
+run_job_worker.py) deliver them.
 """
 
 import os
@@ -18,6 +21,9 @@ import sys
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 sys.path.insert(0, BASE_DIR)
 
+# Only queue the emails here - the long-running job workers send them
+os.environ.setdefault("JOB_WORKER_EMBEDDED", "0")
+
 # Set up Flask app context
 from app import app, db, Parent, send_weekly_report_email
 from datetime import datetime
@@ -46,17 +52,17 @@ def send_all_weekly_reports():
                 
                 if success:
                     success_count += 1
-                    print(f"✅ Sent report to {parent.email}")
+                    print(f"✅ Queued report for {parent.email}")
                 else:
                     skip_count += 1
                     print(f"⏭️  Skipped {parent.email} (no activity or disabled)")
                     
             except Exception as e:
                 error_count += 1
-                print(f"❌ Error sending to {parent.email}: {e}")
+                print(f"❌ Error queueing report for {parent.email}: {e}")
         
         print(f"\n[{datetime.now()}] Job complete!")
-        print(f"📊 Results: {success_count} sent, {skip_count} skipped, {error_count} errors")
+        print(f"📊 Results: {success_count} queued, {skip_count} skipped, {error_count} errors")
         
         return success_count, skip_count, error_count
 
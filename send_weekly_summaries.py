@@ -3,28 +3,65 @@
 Send Weekly Summary Emails
 Run this script every Sunday to send weekly progress reports to parents
 
+Parents are processed in batches; each sent summary is recorded, so
+running the script again in the same week only sends the ones an
+interrupted run didn't reach.
+
 Usage:
     python3 send_weekly_summaries.py
+    python3 send_weekly_summaries.py --batch-size 500 --send-workers 4
+    python3 send_weekly_summaries.py --no-resume     # resend to everyone
 
 Or schedule it with cron (every Sunday at 6pm):
     0 18 * * 0 cd /path/to/cozmiclearning && python3 send_weekly_summaries.py
 """
 
+import argparse
+import os
+
+# Only this script sends the summaries - no background job thread needed
+os.environ.setdefault("JOB_WORKER_EMBEDDED", "0")
+
 from app import app, mail
-from modules.weekly_summary import send_all_weekly_summaries
+from modules.weekly_summary import (
+    SUMMARY_BATCH_SIZE,
+    SUMMARY_SEND_WORKERS,
+    send_all_weekly_summaries,
+)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Send weekly summary emails to parents")
+    parser.add_argument("--batch-size", type=int, default=SUMMARY_BATCH_SIZE, help="parents per batch")
+    parser.add_argument("--send-workers", type=int, default=SUMMARY_SEND_WORKERS, help="concurrent SMTP connections")
+    parser.add_argument("--no-resume", action="store_true", help="also send to parents already sent this week's summary")
+    args = parser.parse_args()
+
     with app.app_context():
         print("📧 Sending weekly summary emails to parents...")
         print("=" * 60)
 
-        stats = send_all_weekly_summaries(mail)
+        stats = send_all_weekly_summaries(
+            mail,
+            batch_size=args.batch_size,
+            send_workers=args.send_workers,
+            resume=not args.no_resume,
+        )
+
+        elapsed = stats['elapsed_seconds']
+        processed = stats['sent'] + stats['failed']
 
         print("\n" + "=" * 60)
         print("📊 Summary Results:")
         print(f"   Total parents: {stats['total']}")
         print(f"   ✅ Sent successfully: {stats['sent']}")
         print(f"   ❌ Failed: {stats['failed']}")
+        print(f"   ⏭️  Skipped (no students): {stats['skipped']}")
+        print(f"   🔁 Already sent this week: {stats['resumed']}")
+        print("\n⏱️  Throughput:")
+        print(f"   Aggregate: {stats['aggregate_seconds']:.2f}s")
+        print(f"   Render:    {stats['render_seconds']:.2f}s")
+        print(f"   Send:      {stats['send_seconds']:.2f}s")
+        print(f"   Total:     {elapsed:.2f}s ({processed / elapsed if elapsed else 0:.1f} emails/s)")
         print("=" * 60)
 
         if stats['sent'] > 0:
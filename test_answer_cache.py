@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Regression checks for the subject answer cache (modules/answer_cache.py).
+Questions that differ only in an operator, a number or a content word must
+never share a cached answer, exact or near-duplicate.
+
+Usage:
+    python3 test_answer_cache.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from modules.answer_cache import AnswerCache, normalize_question
+
+# Questions that must each get their own cache key
+DISTINCT = [
+    ["what is 2+3", "what is 2-3", "what is 2*3", "what is 2/3", "what is 2^3"],
+    ["is 5 > 3", "is 5 < 3", "is 5 = 3"],
+    ["solve 2x + 3 = 7 and show every step of the working please",
+     "solve 2x - 3 = 7 and show every step of the working please"],
+    ["what is 12 x 13", "what is 12 x 14"],
+]
+
+PHOTOSYNTHESIS = ("Explain how the process of photosynthesis in green plants converts sunlight, "
+                  "water and carbon dioxide into glucose and oxygen, and why this matters for animals")
+
+# (cached question, question that must not get its answer) - one content word apart
+NEAR_MISSES = [
+    (PHOTOSYNTHESIS, PHOTOSYNTHESIS.replace("photosynthesis", "cellular respiration")),
+    ("What were the main causes of the fall of the Western Roman Empire in the fifth century",
+     "What were the main causes of the fall of the Eastern Roman Empire in the fifth century"),
+    ("What were the most important causes and consequences of the American Civil War for ordinary families",
+     "What were the most important causes and consequences of the American Revolutionary War for ordinary families"),
+    ("Does eating sugar cause diabetes in children", "Does diabetes cause eating sugar in children"),
+]
+
+# (cached question, reworded question that may reuse it) - same content words
+NEAR_HITS = [
+    (PHOTOSYNTHESIS, PHOTOSYNTHESIS.replace("sunlight, water", "water, sunlight")),
+]
+
+# Questions that should still share one
+SAME = [
+    ["What is 2+3?", "what is 2 + 3", "Can you tell me what's 2+3"],
+    ["Explain photosynthesis", "explain photosynthesis please!"],
+]
+
+
+def run_keys():
+    failures = []
+    for group in DISTINCT:
+        keys = [normalize_question(q) for q in group]
+        if len(set(keys)) != len(keys):
+            failures.append(f"same key for {group}: {keys}")
+    for group in SAME:
+        keys = {normalize_question(q) for q in group}
+        if len(keys) != 1:
+            failures.append(f"different keys for {group}: {keys}")
+    return failures
+
+
+def run_lookups():
+    """A cached answer is only served for its own operator/number sequence"""
+    failures = []
+    for group in DISTINCT:
+        cache = AnswerCache()
+        cache.put("num_forge", 7, "everly", group[0], {"answer": group[0]})
+        for question in group[1:]:
+            result, match = cache.get("num_forge", 7, "everly", question)
+            if result is not None:
+                failures.append(f"{question!r} got {match} hit on {group[0]!r}")
+        result, match = cache.get("num_forge", 7, "everly", group[0])
+        if match != "exact":
+            failures.append(f"{group[0]!r} missed its own entry")
+
+    for cached, question in NEAR_MISSES:
+        cache = AnswerCache()
+        cache.put("science", 7, "nova", cached, {"answer": cached})
+        result, match = cache.get("science", 7, "nova", question)
+        if result is not None:
+            failures.append(f"{question!r} got {match} hit on {cached!r}")
+
+    for cached, question in NEAR_HITS:
+        cache = AnswerCache()
+        cache.put("science", 7, "nova", cached, {"answer": cached})
+        result, match = cache.get("science", 7, "nova", question)
+        if match != "near":
+            failures.append(f"{question!r} missed near-duplicate {cached!r}")
+    return failures
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("ANSWER CACHE KEYS")
+    print("=" * 70)
+
+    failures = run_keys() + run_lookups()
+    for failure in failures:
+        print(f"❌ {failure}")
+    print(f"{'✅' if not failures else '❌'} {len(failures)} failures")
+
+    sys.exit(1 if failures else 0)
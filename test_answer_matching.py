@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Correctness corpus for the shared answer checker (modules/answer_matching.py).
+Every auto-graded path (practice, assignments, hybrid adaptive, chapter
+quizzes) uses it, so a change in what counts as a match shows up here.
+
+Usage:
+    python3 test_answer_matching.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from modules.answer_matching import answers_match, build_answer_key, grade_many
+
+# (student answer, expected answer, should match, category)
+CORPUS = [
+    # Exact text
+    ("Paris", "paris", True, "case"),
+    ("  photosynthesis ", "Photosynthesis", True, "whitespace"),
+    ("new  york", "New York", True, "inner whitespace"),
+    ("mitochondria", "chloroplast", False, "different words"),
+    ("", "", False, "empty"),
+    ("", "4", False, "empty student answer"),
+
+    # Multiple choice letters
+    ("b", "B. 4", True, "letter vs lettered choice"),
+    ("B", "b", True, "letter case"),
+    ("B. 4", "b", True, "lettered choice vs letter"),
+    ("(b) 4", "B. 4", True, "parenthesised letter"),
+    ("b) 4", "b", True, "letter with paren"),
+    ("4", "B. 4", True, "choice text vs lettered choice"),
+    ("B. 4", "4", True, "lettered choice vs choice text"),
+    ("c. 4", "b. 4", False, "different letters, same text"),
+    ("c", "B. 4", False, "different letter"),
+    ("b", "4", False, "letter vs unlettered answer"),
+    ("a", "apple", False, "letter vs word starting with it"),
+    ("a dog", "a", False, "article is not a letter"),
+    ("C. Fast", "c. fast", True, "whole choice"),
+
+    # Numbers and formatting
+    ("50", "50.0", True, "trailing zero"),
+    ("50.00", "50", True, "trailing zeros"),
+    (".5", "0.5", True, "leading dot"),
+    ("1,000", "1000", True, "thousands separator"),
+    ("1,000,000", "1000000", True, "several separators"),
+    ("1, 2", "12", False, "list is not a thousands separator"),
+    ("1 2", "12", False, "space between digits"),
+    ("12", "1 2", False, "space between digits, reversed"),
+    ("-3", "-3.0", True, "negative"),
+    ("-3", "3", False, "sign matters"),
+    ("3.14", "3.145", False, "close is not equal"),
+    ("0.33", "0.333", False, "decimals must agree"),
+    ("x = 5", "5", True, "variable assignment"),
+    ("5", "x = 5", True, "expected has the left-hand side"),
+    ("x=5", "x = 5", True, "same left-hand side"),
+    ("x = 2x+3", "y=2x+3", False, "different left-hand sides"),
+    ("y = 2x + 3", "y=2x+3", True, "equation spacing"),
+    ("The answer is 12", "12", True, "answer phrase"),
+    ("answer: 12", "12", True, "answer label"),
+    ("3x + 2", "3x+2", True, "spacing in expressions"),
+    ("12", "13", False, "different numbers"),
+
+    # Fractions
+    ("1/2", "0.5", True, "fraction vs decimal"),
+    ("0.5", "1/2", True, "decimal vs fraction"),
+    ("2/4", "1/2", True, "equivalent fractions"),
+    ("1 1/2", "1.5", True, "mixed number"),
+    ("3 / 4", "3/4", True, "spaced fraction"),
+    ("0.33", "1/3", True, "rounded to two places"),
+    ("0.333", "1/3", True, "rounded to three places"),
+    ("0.67", "2/3", True, "rounded up"),
+    ("0.66", "2/3", False, "truncated, not rounded"),
+    ("0.3", "1/3", False, "one place is too coarse"),
+    ("1/0", "0", False, "division by zero"),
+
+    # Percent
+    ("25%", "25", True, "percent sign"),
+    ("25 percent", "25%", True, "percent word"),
+    ("25 per cent", "25%", True, "per cent"),
+    ("0.25", "25%", True, "decimal vs percent"),
+    ("25%", "0.25", True, "percent vs decimal"),
+    ("25", "0.25", False, "no percent marker"),
+    ("1", "100", False, "not a percent"),
+    ("perception", "perception", True, "word containing 'perc'"),
+
+    # Currency and units
+    ("$50", "50", True, "currency symbol"),
+    ("50 dollars", "$50", True, "currency word"),
+    ("$1,250.50", "1250.5", True, "currency with separator"),
+    ("5 cm", "5", True, "unit vs bare number"),
+    ("5", "5 cm", True, "bare number vs unit"),
+    ("5cm", "5 cm", True, "unit spacing"),
+    ("5 m", "5 cm", False, "different units"),
+    ("3 inches", "3 inch", True, "plural unit"),
+    ("12 boxes", "12 box", True, "plural -es"),
+    ("90°", "90", True, "degree sign"),
+    ("3/4 cup", "0.75 cups", True, "fraction with unit"),
+]
+
+
+def run_corpus():
+    failures = []
+    for student, expected, should_match, category in CORPUS:
+        result = answers_match(student, expected)
+        if result != should_match:
+            failures.append((student, expected, should_match, result, category))
+    return failures
+
+
+def run_bulk():
+    """grade_many gives the same results as answers_match one by one"""
+    steps = [
+        {"type": "multiple_choice", "expected": ["B. 4"]},
+        {"expected": ["1/2"]},
+        {"type": "free", "expected": ["anything"]},  # manual grading
+        {"type": "multiple_choice", "expected": [], "correct_answer": "25%"},
+        {"type": "multiple_choice", "expected": ["", None]},  # no answer -> manual
+    ]
+    sets = [
+        {"0": "b", "1": "0.5", "2": "x", "3": "0.25"},
+        {"0": "c", "1": "2/4", "3": "25"},
+        {"0": {"answer": "c", "correct": True}, "1": {"answer": "1/3"}},
+        {},
+    ]
+    expected_results = [
+        [True, True, None, True, None],
+        [False, True, None, True, None],
+        [True, False, None, False, None],
+        [False, False, None, False, None],
+    ]
+    key = build_answer_key(steps)
+    return [
+        (i, graded.results, expected)
+        for i, (graded, expected) in enumerate(zip(grade_many(key, sets), expected_results))
+        if graded.results != expected or graded.gradable != 3 or graded.correct != sum(r for r in expected if r)
+    ]
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("ANSWER MATCHING CORPUS")
+    print("=" * 70)
+
+    failures = run_corpus()
+    for student, expected, should_match, result, category in failures:
+        print(f"❌ [{category}] {student!r} vs {expected!r}: expected {should_match}, got {result}")
+    print(f"\n{len(CORPUS) - len(failures)}/{len(CORPUS)} corpus cases passed")
+
+    bulk_failures = run_bulk()
+    for index, results, expected in bulk_failures:
+        print(f"❌ grade_many set {index}: {results} != {expected}")
+    print(f"{'✅' if not bulk_failures else '❌'} grade_many bulk grading")
+
+    sys.exit(1 if failures or bulk_failures else 0)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Regression checks for the server-side session store (modules/session_store.py).
+A reply saved by persist() after a streamed response must be seen by every
+worker, not only the one that streamed it - even when the route changed the
+session in place without setting session.modified.
+
+Two ServerSideSessionInterface instances share one database, standing in
+for two gunicorn workers with their own in-process caches.
+
+Usage:
+    python3 test_session_store.py
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from flask import Flask, session
+
+from models import db
+from modules.session_store import ServerSideSessionInterface, SqlSessionBackend
+from modules.streaming import event_stream_response, sse_event
+
+
+def build_app():
+    app = Flask(__name__)
+    app.secret_key = "test-session-store"
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "sessions.db")
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+
+    backend = SqlSessionBackend(db)
+    workers = [ServerSideSessionInterface(backend), ServerSideSessionInterface(backend)]
+
+    @app.route("/start")
+    def start():
+        session["conversation"] = [{"role": "user", "content": "hi"}]
+        return "ok"
+
+    @app.route("/read")
+    def read():
+        return str(len(session.get("conversation", [])))
+
+    @app.route("/stream")
+    def stream():
+        # Same shape as followup_message: changed in place, modified never set
+        conversation = session.get("conversation", [])
+        conversation.append({"role": "user", "content": "why?"})
+
+        def events():
+            conversation.append({"role": "assistant", "content": "because"})
+            session["conversation"] = conversation
+            app.session_interface.persist(app, session)
+            yield sse_event("done", {"reply": "because"})
+
+        return event_stream_response(events())
+
+    return app, workers
+
+
+def run():
+    app, (worker_a, worker_b) = build_app()
+    client = app.test_client()
+    failures = []
+
+    def on(worker, path):
+        app.session_interface = worker
+        return client.get(path).get_data(as_text=True)
+
+    on(worker_a, "/start")
+    if on(worker_b, "/read") != "1":  # worker B now caches the one-turn session
+        failures.append("worker B could not read the new session")
+
+    on(worker_a, "/stream")
+    for name, worker in (("worker B", worker_b), ("worker A", worker_a)):
+        turns = on(worker, "/read")
+        if turns != "3":
+            failures.append(f"{name} sees {turns} turns after the stream, expected 3")
+
+    # The stale cookie is replaced, so later reads are cache hits again
+    hits = worker_b.cache.hits
+    on(worker_b, "/read")
+    if worker_b.cache.hits != hits + 1:
+        failures.append("worker B still misses its cache after the cookie was refreshed")
+
+    return failures
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("SERVER-SIDE SESSIONS")
+    print("=" * 70)
+
+    failures = run()
+    for failure in failures:
+        print(f"❌ {failure}")
+    print(f"{'✅' if not failures else '❌'} {len(failures)} failures")
+
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Regression checks for visual aid cache keys (modules/visual_cache.py).
+Concepts that differ only in an operator or symbol must never share a
+cached diagram; formatting differences should.
+
+Usage:
+    python3 test_visual_cache.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from modules.visual_cache import visual_key
+
+# (visual type, (text, grade), (text, grade), should share a key)
+CASES = [
+    ("graph", ("Graph y = 2x + 3", 8), ("Graph y = 2x - 3", 8), False),
+    ("graph", ("Graph y = x^2", 8), ("Graph y = x*2", 8), False),
+    ("fraction", ("1/2", 4), ("1*2", 4), False),
+    ("number_line", ("x > 3", 6), ("x < 3", 6), False),
+    ("graph", ("Graph y = 2x + 3", 8), ("graph  y = 2x + 3 ", 8), True),
+    ("graph", ("Graph y = 2x + 3", 7), ("Graph y = 2x + 3", 8), True),   # same grade band
+    ("graph", ("Graph y = 2x + 3", 8), ("Graph y = 2x + 3", 11), False),  # different grade band
+]
+
+
+if __name__ == "__main__":
+    print("=" * 70)
+    print("VISUAL CACHE KEYS")
+    print("=" * 70)
+
+    failures = 0
+    for visual_type, (text_a, grade_a), (text_b, grade_b), should_share in CASES:
+        shared = visual_key(visual_type, text_a, grade_a) == visual_key(visual_type, text_b, grade_b)
+        if shared != should_share:
+            failures += 1
+            print(f"❌ {text_a!r} (grade {grade_a}) vs {text_b!r} (grade {grade_b}): "
+                  f"shared={shared}, expected {should_share}")
+    print(f"{'✅' if not failures else '❌'} {len(CASES) - failures}/{len(CASES)} key cases passed")
+
+    sys.exit(1 if failures else 0)
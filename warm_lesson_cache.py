@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Warm Lesson Cache
+Pre-generates every chapter lesson and chapter quiz in LESSON_CHAPTERS so the
+first student to open a chapter doesn't wait 10-30s for the AI.
+
+- Lessons go into the shared lesson cache (modules/lesson_cache.py)
+- Quizzes go into the chapter_quizzes table (same as get_or_generate_chapter_quiz)
+- Resumable: anything already cached is skipped, so re-run after an interruption
+- Bounded parallelism, per-item retry with backoff, progress + estimated cost report
+
+Usage:
+    python3 warm_lesson_cache.py                              # everything
+    python3 warm_lesson_cache.py --subject num_forge --grade 5
+    python3 warm_lesson_cache.py --workers 8 --characters everly,nova
+    python3 warm_lesson_cache.py --dry-run                    # count + estimate only
+
+Run it after a deploy (or after bumping LESSON_CONTENT_VERSION):
+    python3 run_startup_migrations.py && python3 warm_lesson_cache.py
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app, generate_chapter_quiz_ai, save_chapter_quiz
+from models import ChapterQuiz
+from modules.chapters_config import LESSON_CHAPTERS
+from modules.lesson_cache import get_cached_lesson, get_or_generate_lesson
+from modules.student_lessons import build_chapter_context, generate_student_lesson
+from scripts.cost_tracker import CostTracker
+
+# Default mentor for new sessions (see ensure_session_defaults)
+DEFAULT_CHARACTERS = ["everly"]
+ALL_CHARACTERS = ["everly", "jasmine", "lio", "theo", "nova"]
+
+# Rough per-item token usage for the cost estimate (lesson visuals not included)
+ESTIMATED_USAGE = {
+    "lesson": {"model": "gpt-4o", "input_tokens": 1100, "output_tokens": 2000},
+    "quiz": {"model": "gpt-4o-mini", "input_tokens": 350, "output_tokens": 900},
+}
+
+RETRY_BACKOFF_SECONDS = 5
+
+
+# ============================================================
+# WORK ITEMS
+# ============================================================
+
+def build_work_items(subject_filter=None, grade_filter=None, characters=None, include_quizzes=True):
+    """
+    Walk LESSON_CHAPTERS and list every lesson/quiz to warm.
+
+    Only numeric grades are warmed - lessons and quizzes are served for grades 1-12.
+    """
+    items = []
+    for subject, grades in LESSON_CHAPTERS.items():
+        if subject_filter and subject != subject_filter:
+            continue
+
+        for grade, grade_data in grades.items():
+            if not isinstance(grade, int):
+                continue
+            if grade_filter is not None and grade != grade_filter:
+                continue
+
+            for chapter in grade_data.get("chapters", []):
+                if include_quizzes:
+                    items.append(("quiz", subject, grade, chapter, None, None))
+                for topic in chapter.get("lessons", []):
+                    for character in characters:
+                        items.append(("lesson", subject, grade, chapter, topic, character))
+    return items
+
+
+def is_warm(item):
+    """True if the item is already cached (lets interrupted runs resume)"""
+    kind, subject, grade, chapter, topic, character = item
+    if kind == "lesson":
+        return get_cached_lesson(subject, grade, topic, character, chapter["id"]) is not None
+
+    return ChapterQuiz.query.filter_by(
+        subject=subject,
+        grade=str(grade),
+        chapter_id=chapter["id"]
+    ).first() is not None
+
+
+def warm_item(item):
+    """Generate one lesson or quiz. Returns True on success."""
+    kind, subject, grade, chapter, topic, character = item
+
+    if kind == "lesson":
+        result = get_or_generate_lesson(
+            subject,
+            grade,
+            topic,
+            character,
+            lambda: generate_student_lesson(
+                subject,
+                grade,
+                topic,
+                character,
+                chapter_id=chapter["id"],
+                chapter_context=build_chapter_context(chapter, topic)
+            ),
+            chapter_id=chapter["id"]
+        )
+        return bool(result.get("success"))
+
+    if is_warm(item):
+        return True
+    quiz_questions = generate_chapter_quiz_ai(subject, grade, chapter, raise_on_error=True)
+    if not quiz_questions:
+        return False
+    return save_chapter_quiz(subject, grade, chapter["id"], quiz_questions)
+
+
+def warm_item_with_retry(item, retries):
+    """Run warm_item in its own app context, retrying with backoff"""
+    with app.app_context():
+        last_error = None
+        for attempt in range(1, retries + 1):
+            try:
+                if warm_item(item):
+                    return True, None
+                last_error = "generation returned no content"
+            except Exception as e:
+                last_error = str(e)
+            if attempt < retries:
+                time.sleep(RETRY_BACKOFF_SECONDS * attempt)
+        return False, last_error
+
+
+def describe(item):
+    kind, subject, grade, chapter, topic, character = item
+    if kind == "lesson":
+        return f"lesson {subject}/{grade}/{chapter['id']}/{topic} ({character})"
+    return f"quiz   {subject}/{grade}/{chapter['id']}"
+
+
+# ============================================================
+# COST ESTIMATE
+# ============================================================
+
+def estimate_cost(counts):
+    """Estimated API spend for a {"lesson": n, "quiz": n} count"""
+    tracker = CostTracker()
+    total = 0.0
+    for kind, count in counts.items():
+        usage = ESTIMATED_USAGE[kind]
+        total += count * tracker.calculate_cost(usage["model"], usage["input_tokens"], usage["output_tokens"])
+    return total
+
+
+# ============================================================
+# MAIN
+# ============================================================
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pre-generate chapter lessons and quizzes")
+    parser.add_argument("--subject", help="Only warm one subject (e.g. num_forge)")
+    parser.add_argument("--grade", type=int, help="Only warm one grade (1-12)")
+    parser.add_argument("--characters", default=",".join(DEFAULT_CHARACTERS),
+                        help="Comma-separated mentors to warm lessons for, or 'all'")
+    parser.add_argument("--skip-quizzes", action="store_true", help="Only warm lessons")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel AI requests")
+    parser.add_argument("--batch-size", type=int, default=20, help="Items per progress batch")
+    parser.add_argument("--retries", type=int, default=3, help="Attempts per item")
+    parser.add_argument("--limit", type=int, help="Stop after this many items (for test runs)")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be generated")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    characters = ALL_CHARACTERS if args.characters == "all" else [
+        c.strip() for c in args.characters.split(",") if c.strip()
+    ]
+
+    with app.app_context():
+        print("🔥 Warming lesson + quiz cache...")
+        print("=" * 60)
+
+        all_items = build_work_items(args.subject, args.grade, characters, not args.skip_quizzes)
+        pending = [item for item in all_items if not is_warm(item)]
+        warm_count = len(all_items) - len(pending)
+        if args.limit:
+            pending = pending[:args.limit]
+
+        pending_counts = {"lesson": 0, "quiz": 0}
+        for item in pending:
+            pending_counts[item[0]] += 1
+
+        print(f"   Catalog items: {len(all_items)}")
+        print(f"   Already warm: {warm_count}")
+        print(f"   To generate: {pending_counts['lesson']} lessons, {pending_counts['quiz']} quizzes")
+        print(f"   Estimated cost: ${estimate_cost(pending_counts):.2f}")
+
+    if args.dry_run or not pending:
+        print("=" * 60)
+        raise SystemExit(0)
+
+    started = time.monotonic()
+    done_counts = {"lesson": 0, "quiz": 0}
+    failures = []
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            for start in range(0, len(pending), args.batch_size):
+                batch = pending[start:start + args.batch_size]
+                results = pool.map(lambda item: warm_item_with_retry(item, args.retries), batch)
+
+                for item, (ok, error) in zip(batch, results):
+                    if ok:
+                        done_counts[item[0]] += 1
+                    else:
+                        failures.append((item, error))
+                        print(f"   ❌ {describe(item)}: {error}")
+
+                finished = start + len(batch)
+                elapsed = time.monotonic() - started
+                rate = finished / elapsed if elapsed else 0
+                print(f"   [{finished}/{len(pending)}] {rate:.2f} items/s, "
+                      f"~${estimate_cost(done_counts):.2f} spent so far")
+    except KeyboardInterrupt:
+        print("\n⏸️  Interrupted - re-run the same command to resume")
+
+    print("\n" + "=" * 60)
+    print("📊 Warm-up Results:")
+    print(f"   ✅ Lessons generated: {done_counts['lesson']}")
+    print(f"   ✅ Quizzes generated: {done_counts['quiz']}")
+    print(f"   ❌ Failed: {len(failures)}")
+    print(f"   💰 Estimated cost: ${estimate_cost(done_counts):.2f}")
+    print(f"   ⏱️  Elapsed: {time.monotonic() - started:.0f}s")
+    print("=" * 60)
+
+    if failures:
+        print("\n⚠️  Some items failed - re-run to retry just those.")